@@ -0,0 +1,94 @@
+import asyncio
+import logging
+from typing import Callable, Iterable, Union
+
+from lib.pipelineStats import PipelineStats
+
+
+class BroadcastHub:
+    """Fans out live messages to the websocket clients on the server's event loop.
+
+    Messages are handed over from other threads (e.g. the MQTT thread) with
+    `publish`. Each client has a bounded queue drained by its own sender task,
+    so a slow client only loses its own oldest messages and never blocks the
+    other clients or the publishing thread.
+    """
+
+    def __init__(self, subscribers: Callable[[str], Iterable[Iterable]],
+                 queue_size: int = 100,
+                 stats: Union[PipelineStats, None] = None):
+        """
+        Args:
+            subscribers (Callable): returns the groups (e.g. sets) of clients
+                subscribed to an acp_id, called on the hub loop
+            queue_size (int): maximum number of queued messages per client
+        """
+        self.subscribers = subscribers
+        self.queue_size = queue_size
+        self.stats = stats
+        self.loop: Union[asyncio.AbstractEventLoop, None] = None
+        self.queues = dict()  # client -> asyncio.Queue
+        self.senders = dict()  # client -> sender task
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Binds the hub to the event loop that owns the websockets.
+
+        Args:
+            loop (asyncio.AbstractEventLoop): running loop of the server
+        """
+        self.loop = loop
+
+    def register(self, client):
+        """Starts the queue and sender task of a client. Must be called on the hub loop."""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.queues[client] = queue
+        self.senders[client] = asyncio.get_running_loop().create_task(
+            self._sender(client, queue))
+
+    def unregister(self, client):
+        """Stops the sender task of a client. Must be called on the hub loop."""
+        self.queues.pop(client, None)
+        sender = self.senders.pop(client, None)
+        if sender is not None and sender is not asyncio.current_task():
+            sender.cancel()
+
+    def publish(self, acp_id: str, text: str):
+        """Hands a message over to the hub loop. Safe to call from any thread.
+
+        Args:
+            acp_id (str): sensor of the message, selects the subscribed clients
+            text (str): message already encoded, sent as is to every client
+        """
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            self._count("not_bound")
+            return
+        loop.call_soon_threadsafe(self._dispatch, acp_id, text)
+
+    def _dispatch(self, acp_id: str, text: str):
+        for clients in self.subscribers(acp_id):
+            for client in clients:
+                queue = self.queues.get(client)
+                if queue is None:
+                    continue
+                if queue.full():
+                    # drop the oldest message, the client is not keeping up
+                    queue.get_nowait()
+                    self._count("ws_dropped")
+                queue.put_nowait(text)
+
+    async def _sender(self, client, queue: asyncio.Queue):
+        while True:
+            text = await queue.get()
+            try:
+                await client.send(text)
+                self._count("ws_sent")
+            except Exception as e:
+                # the endpoint removes the client when its receive loop ends
+                logging.info(f"Stopping sender of a websocket client: {e}")
+                self.unregister(client)
+                return
+
+    def _count(self, stage: str):
+        if self.stats is not None:
+            self.stats.count(stage)
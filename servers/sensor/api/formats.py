@@ -0,0 +1,76 @@
+import json
+import struct
+from typing import Dict, Union
+
+import numpy as np
+import pandas as pd
+
+
+def encode_columnar(data: Union[pd.DataFrame, None], acp_id: str):
+    """Encodes history data as one JSON object of columns, built straight
+    from the DataFrame columns.
+
+    ```
+    {"acp_id": "sensor_1", "acp_ts": [1623345600, ...], "temperature": [20.1, ...], ...}
+    ```
+
+    Args:
+        data (pd.DataFrame): history data with integer acp_ts and no NaN
+        acp_id (str): acp_id of the sensor
+    """
+    columns = {"acp_id": acp_id, "acp_ts": []}
+    if data is not None:
+        for column in data.columns:
+            if column != "acp_id":
+                columns[column] = data[column].tolist()
+    return json.dumps(columns, separators=(",", ":")).encode()
+
+
+def encode_columnar_batch(batch: Dict[str, Union[pd.DataFrame, None]]):
+    """Encodes the history data of several sensors as one JSON object of
+    acp_id -> columns (as encode_columnar), null for sensors without data.
+
+    Args:
+        batch (Dict[str, pd.DataFrame]): history data of each acp_id
+    """
+    parts = [json.dumps(acp_id).encode() + b":" +
+             (b"null" if data is None else encode_columnar(data, acp_id))
+             for acp_id, data in batch.items()]
+    return b"{" + b",".join(parts) + b"}"
+
+
+def encode_binary(data: Union[pd.DataFrame, None], acp_id: str):
+    """Encodes the numeric history columns as packed little-endian float64
+    arrays, for charts (e.g. a Float64Array per column in the browser).
+
+    Layout: uint32 (little-endian) length of a JSON header, the header, then
+    one array of `rows` float64 values per header column, in header order.
+    The header is padded with spaces so the arrays start at a multiple of 8
+    bytes. Columns that are not numeric are listed in the header as
+    `skipped`.
+
+    Args:
+        data (pd.DataFrame): history data with integer acp_ts and no NaN
+        acp_id (str): acp_id of the sensor
+    """
+    numeric = []
+    skipped = []
+    if data is not None:
+        for column in data.columns:
+            if column == "acp_id":
+                continue
+            if pd.api.types.is_numeric_dtype(data[column]):
+                numeric.append(column)
+            else:
+                skipped.append(column)
+    rows = 0 if data is None else len(data)
+
+    header = json.dumps({"acp_id": acp_id, "rows": rows, "dtype": "<f8",
+                         "columns": numeric, "skipped": skipped},
+                        separators=(",", ":")).encode()
+    header += b" " * (-(4 + len(header)) % 8)
+
+    values = np.empty((len(numeric), rows), dtype="<f8")
+    for i, column in enumerate(numeric):
+        values[i] = data[column].to_numpy(dtype="<f8")
+    return struct.pack("<I", len(header)) + header + values.tobytes()
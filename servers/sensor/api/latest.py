@@ -0,0 +1,44 @@
+import threading
+import time
+from typing import Union
+
+
+class LatestStore:
+    """Latest reading of each sensor, kept in memory.
+
+    Updated by the live ingest and warmed at startup from the archive, so the
+    latest readings are served without reading any day file.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.readings = dict()  # acp_id -> reading in payload format
+
+    def update(self, reading: dict):
+        """Stores a reading unless a newer one is already stored.
+
+        Args:
+            reading (dict): reading in payload format (acp_id, acp_ts, payload)
+        """
+        acp_id = reading.get("acp_id")
+        acp_ts = reading.get("acp_ts")
+        if acp_id is None or acp_ts is None:
+            return
+        with self.lock:
+            current = self.readings.get(acp_id)
+            if current is None or current["acp_ts"] <= acp_ts:
+                self.readings[acp_id] = dict(reading)
+
+    def get(self, acp_id: str, max_age: Union[float, None] = None):
+        """Returns the latest reading of a sensor, or None if there is none
+        or it is older than max_age seconds."""
+        reading = self.readings.get(acp_id)
+        if reading is None:
+            return None
+        if max_age is not None and self.age(reading) > max_age:
+            return None
+        return reading
+
+    def age(self, reading: dict):
+        """Seconds since the reading was taken."""
+        return time.time() - reading["acp_ts"]
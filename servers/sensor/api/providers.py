@@ -1,5 +1,7 @@
 # import random
 import random
+import json
+import math
 from typing import Literal
 
 from fastapi import WebSocket
@@ -10,7 +12,11 @@ import numpy as np
 from .config import ALL_SENSORS
 import logging
 from etl.decoders.decoder import Decoder
-import asyncio
+from lib.pipelineStats import PipelineStats
+from .broadcast import BroadcastHub
+from .latest import LatestStore
+from .formats import encode_binary, encode_columnar, encode_columnar_batch
+from lib.downsample import lttb
 from typing import Union
 
 
@@ -32,21 +38,13 @@ class Client:
 
         return acp_config.split(",")
 
-    async def send(self, msg: dict):
-        """Sends a message to the client.
+    async def send(self, text: str):
+        """Sends an encoded message to the client.
 
         Args:
-            msg (dict): message to send to the client
+            text (str): JSON encoded message to send to the client
         """
-        acp_id = msg.get("acp_id", None)
-        if acp_id is None:
-            return
-        if self.acp_list is None:
-            await self.websocket.send_json(msg)
-        else:
-            if acp_id in self.acp_list:
-                await self.websocket.send_json(msg)
-        return
+        await self.websocket.send_text(text)
 
 
 class ApiProvider():
@@ -56,6 +54,21 @@ class ApiProvider():
         basic_config = io.getBasicConfig()
         self.all_sensors = ALL_SENSORS
         self.connected_clients = set[Client]()  # set of connected clients
+        # acp_id -> clients subscribed to that sensor, and clients of /ws/
+        # subscribed to every sensor
+        self.subscriptions = dict[str, set[Client]]()
+        self.wildcard_clients = set[Client]()
+        # per-stage counters of the live messages, logged periodically
+        self.stats = PipelineStats(
+            "API", logger=logging.getLogger(),
+            report_sec=basic_config.get("stats_report_sec", 60),
+            sample_sec=basic_config.get("stats_sample_sec", 10))
+        # live messages are broadcast on the server loop (bound at startup)
+        self.api_config = basic_config.get("api", {})
+        self.hub = BroadcastHub(
+            self.get_subscribers,
+            queue_size=self.api_config.get("ws_queue_size", 100),
+            stats=self.stats)
 
         # ETL to handle http requests
         self.http_etl = ETL(basic_config, basic_config["etl_default"],
@@ -69,38 +82,193 @@ class ApiProvider():
         self.ws_etl.handle_message = lambda msg, topic: self.handle_message(
             msg, topic)
 
+        # latest reading of each sensor, updated by handle_message
+        self.latest = LatestStore()
+        self.warm_latest()
+
     def add_client(self, client: Client):
         """Adds a client to the connected clients set."""
 
         logging.info("Adding new client")
         self.connected_clients.add(client)
+        if client.acp_list is None:
+            self.wildcard_clients.add(client)
+        else:
+            for acp_id in client.acp_list:
+                self.subscriptions.setdefault(acp_id, set()).add(client)
+        self.hub.register(client)
         number = len(self.connected_clients)
         logging.info(f"Number of connected clients: {number}")
 
     def remove_client(self, client: Client):
         """Removes a client from the connected clients set."""
+        self.hub.unregister(client)
         self.connected_clients.remove(client)
-
-    def get_historical_data(self, acp_id: str, start_time: str, end_time: str,
-                            return_type: Literal["dict", "df"] = "dict"):
+        self.wildcard_clients.discard(client)
+        for acp_id in client.acp_list or []:
+            clients = self.subscriptions.get(acp_id)
+            if clients is not None:
+                clients.discard(client)
+                if not clients:
+                    del self.subscriptions[acp_id]
+
+    def get_subscribers(self, acp_id: str):
+        """Returns the sets of clients subscribed to a sensor."""
+        clients = self.subscriptions.get(acp_id)
+        if clients is None:
+            return (self.wildcard_clients,)
+        return (self.wildcard_clients, clients)
+
+    def get_historical_data(self, acp_id: str,
+                            start_time: Union[str, float],
+                            end_time: Union[str, float],
+                            return_type: Literal["dict", "df", "columnar",
+                                                 "binary"] = "dict",
+                            limit: Union[int, None] = None,
+                            order: Literal["asc", "desc"] = "asc",
+                            bucket: Union[str, None] = None,
+                            agg: Literal["mean", "min", "max", "last"] = "mean",
+                            max_points: Union[int, None] = None):
         """
         Gets historical data from the database for a given acp_id and time range.
 
         Args:
             acp_id (str): acp_id of the sensor
-            start_time (str): start time of the time range in DD/MM/YYYY format
-            end_time (str): end time of the time range in DD/MM/YYYY format
-            return_type (Literal["dict", "df"], optional): return type of the data. Defaults to "dict".
+            start_time (Union[str, float]): start of the time range, DD/MM/YYYY or
+                ISO 8601 string, or epoch seconds
+            end_time (Union[str, float]): end of the time range, same formats (a
+                date alone includes that whole day)
+            return_type (Literal["dict", "df", "columnar", "binary"], optional): return type of the data.
+                "columnar" and "binary" return the encoded bytes (see api.formats). Defaults to "dict".
+            limit (int, optional): only the most recent readings. Defaults to None (all).
+            order (Literal["asc", "desc"], optional): time order of the data. Defaults to "asc".
+            bucket (str, optional): aggregates the readings in buckets of this length
+                (e.g. "1m", "15m", "1h"), limit then counts buckets. Defaults to None (raw readings).
+            agg (Literal["mean", "min", "max", "last"], optional): aggregation of the buckets. Defaults to "mean".
+            max_points (int, optional): reduces the data to at most max_points rows keeping
+                the shape of each parameter (LTTB). Defaults to None (all rows).
+        """
+        query = {
+            "acp_id": acp_id,
+            "from": start_time,
+            "to": end_time,
+            "parameters": ["all"],
+            "limit": limit,
+            "order": order,
+            "bucket": bucket,
+            "agg": agg
+        }
+
+        data = self._prepare_history(self.http_etl.read(query))
+        if data is not None and max_points is not None:
+            data = lttb(data, max_points)
+
+        if return_type == "columnar":
+            return encode_columnar(data, acp_id)
+        if return_type == "binary":
+            return encode_binary(data, acp_id)
+
+        if data is None:
+            return None
+
+        if return_type == "df":
+            return data
+        else:
+            return self._to_payloads(data)
+
+    def get_batch_historical_data(self, acp_ids: list[str],
+                                  start_time: Union[str, float],
+                                  end_time: Union[str, float],
+                                  return_type: Literal["dict", "df",
+                                                       "columnar"] = "dict",
+                                  limit: Union[int, None] = None,
+                                  order: Literal["asc", "desc"] = "asc",
+                                  bucket: Union[str, None] = None,
+                                  agg: Literal["mean", "min", "max",
+                                               "last"] = "mean",
+                                  max_points: Union[int, None] = None):
+        """
+        Gets historical data of several sensors over the same time range. The
+        day files of all the sensors are read together (see DBManager.read_batch).
+        Returns acp_id -> data as returned by get_historical_data (None for
+        sensors without data), or for "columnar" one JSON object of acp_id ->
+        columns.
+
+        Args:
+            acp_ids (list[str]): acp_ids of the sensors
+            other arguments: same as get_historical_data, applied to every sensor
+        """
+        query = {
+            "acp_ids": acp_ids,
+            "from": start_time,
+            "to": end_time,
+            "parameters": ["all"],
+            "limit": limit,
+            "order": order,
+            "bucket": bucket,
+            "agg": agg
+        }
+
+        batch = dict()
+        for acp_id, data in self.http_etl.read_batch(query).items():
+            data = self._prepare_history(data)
+            if data is not None and max_points is not None:
+                data = lttb(data, max_points)
+            batch[acp_id] = data
+
+        if return_type == "columnar":
+            return encode_columnar_batch(batch)
+        if return_type == "df":
+            return batch
+        return {acp_id: None if data is None else self._to_payloads(data)
+                for acp_id, data in batch.items()}
+
+    def stream_historical_data(self, acp_id: str,
+                               start_time: Union[str, float],
+                               end_time: Union[str, float],
+                               limit: Union[int, None] = None,
+                               order: Literal["asc", "desc"] = "asc",
+                               bucket: Union[str, None] = None,
+                               agg: Literal["mean", "min", "max",
+                                            "last"] = "mean"):
+        """
+        Yields the historical data as NDJSON, one reading in payload format
+        per line, decoding one day file at a time.
+        Queries with limit or order=desc are read at once (they only read
+        the end of the day files). Buckets are aggregated per day file,
+        max_points is not supported as it needs the whole range.
+
+        Args:
+            same as get_historical_data
         """
         query = {
             "acp_id": acp_id,
             "from": start_time,
             "to": end_time,
-            "parameters": ["all"]
+            "parameters": ["all"],
+            "limit": limit,
+            "order": order,
+            "bucket": bucket,
+            "agg": agg
         }
 
-        data = self.http_etl.read(query)
+        if limit is None and order == "asc":
+            chunks = self.http_etl.read_iter(query)
+        else:
+            chunks = [self.http_etl.read(query)]
+
+        for data in chunks:
+            # NaN values are removed per chunk: a parameter missing in
+            # another day does not remove the rows of this one
+            data = self._prepare_history(data)
+            if data is None or data.empty:
+                continue
+            lines = [json.dumps(d) for d in self._to_payloads(data)]
+            yield ("\n".join(lines) + "\n").encode()
 
+    def _prepare_history(self, data):
+        """Converts acp_ts to integer seconds and removes the rows with NaN
+        values. Returns None if there is no data."""
         if data is None:
             return None
         if data.get("acp_ts") is None:
@@ -110,55 +278,84 @@ class ApiProvider():
             np.int64) // 10 ** 9
 
         # remove NaN values
-        data = data.dropna()
+        return data.dropna()
 
-        if return_type == "df":
-            return data
-        else:
-            data_dict = data.to_dict(orient='records')
-            data = [self._convert_to_payload_format(d) for d in data_dict]
-            return data
+    def _to_payloads(self, data: pd.DataFrame):
+        """Converts history data to a list of readings in payload format."""
+        return [self._convert_to_payload_format(d)
+                for d in data.to_dict(orient='records')]
 
-    def get_latest_data(self):
-        """Gets the latest data from the database for all sensors."""
-        today = pd.Timestamp.now().strftime("%d/%m/%Y")
+    def get_latest_data(self, max_age: Union[float, None] = None,
+                        staleness: bool = False):
+        """Gets the latest reading of each sensor from the in-memory store.
 
-        yesterday = (
-            pd.Timestamp.now() - pd.Timedelta(
-                days=2)).strftime("%d/%m/%Y")
+        Args:
+            max_age (float, optional): skip readings older than max_age seconds.
+            staleness (bool, optional): add the age of each reading in seconds
+                as "staleness". Defaults to False.
+        """
         result = []
 
         for acp_id in self.all_sensors:
-            historical_data = self.get_historical_data(
-                acp_id, yesterday, today, return_type="df")
-
-            if historical_data is None:
+            reading = self.latest.get(acp_id, max_age)
+            if reading is None:
                 continue
 
-            # remove any rows with NaN values
-            historical_data = historical_data.dropna()
-            if historical_data.empty:
-                continue
-
-            latest_data = historical_data.iloc[[-1]
-                                               ].to_dict(orient='records')[0]
-
-            latest_data = self._convert_to_payload_format(latest_data)
+            latest_data = dict(reading)
+            latest_data["acp_ts"] = int(reading["acp_ts"])
+            if staleness:
+                latest_data["staleness"] = self.latest.age(reading)
 
             result.append(latest_data)
 
         return result
 
+    def get_stats(self):
+        """Gets the query cache and live pipeline counters."""
+        return {
+            "query_cache": self.http_etl.db_manager.cache_stats(),
+            "store": self.http_etl.db_manager.store_stats(),
+            "pipeline": self.stats.snapshot()
+        }
+
+    def close(self):
+        """Writes the live messages still queued for the history database."""
+        self.http_etl.close()
+        self.ws_etl.close()
+
+    def warm_latest(self):
+        """Loads the latest reading of each sensor from the tail of its
+        newest day file."""
+        for acp_id in self.all_sensors:
+            try:
+                data = self.http_etl.db_manager.read_latest(acp_id)
+            except KeyError as e:
+                logging.warning(f"No latest reading for {acp_id}: {e}")
+                continue
+            if data is None or data.get("acp_ts") is None:
+                continue
+
+            latest_data = data.iloc[[-1]].to_dict(orient='records')[0]
+            # keep only the parameters carried by the reading
+            latest_data = {
+                key: value for key, value in latest_data.items()
+                if not (isinstance(value, float) and math.isnan(value))}
+
+            self.latest.update(self._convert_to_payload_format(latest_data))
+
     def handle_message(self, msg, topic):
-        """Handles a message received from the MQTT broker and broadcasts it to all connected clients."""
+        """Handles a message received from the MQTT broker and broadcasts it to all connected clients.
+        Called from the MQTT thread, the sends run on the server loop (see BroadcastHub)."""
 
+        self.stats.count("received")
         transformed_message = Decoder.transform(msg, topic)
-        logging.info(transformed_message)
 
         if (transformed_message):
+            self.stats.sample("decoded", "%s", transformed_message)
             filtered_message = self.ws_etl.rt_manager.filterParametersFromSensorMessage(
                 transformed_message)
         else:
+            self.stats.count("dropped")
             return
 
         gateway = transformed_message.get("gateway")
@@ -168,6 +365,12 @@ class ApiProvider():
             return
 
         filtered_message = self._convert_to_payload_format(filtered_message)
+        self.latest.update(filtered_message)
+        # queued for the history database (written behind in batches, if
+        # it persists live messages), cached windows covering today are
+        # outdated now
+        self.http_etl.db_manager.store(transformed_message, msg)
+        self.http_etl.db_manager.invalidate(filtered_message["acp_id"])
         filtered_message["gateway"] = gateway
         filtered_message["data_connector"] = data_connector
         # payload: dict = filtered_message["payload"]
@@ -183,14 +386,17 @@ class ApiProvider():
 
         filtered_message["location"] = location
 
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            # Broadcast the message to all connected clients
-            for client in self.connected_clients:
-                loop.run_until_complete(client.send(filtered_message))
-        finally:
-            loop.close()
+        acp_id = filtered_message.get("acp_id")
+        if acp_id is None:
+            return
+
+        # Broadcast the message to the subscribed clients, without waiting
+        # for the sends (runs on the MQTT thread). The message is encoded
+        # once, as send_json would, and the same text is sent to everyone
+        text = json.dumps(filtered_message, separators=(",", ":"),
+                          ensure_ascii=False)
+        self.hub.publish(acp_id, text)
+        self.stats.count("broadcast")
 
     def subscribe_all(self):
         """Subscribes to all sensors in the MQTT broker."""
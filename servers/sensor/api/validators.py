@@ -1,11 +1,63 @@
-from pydantic import BaseModel, validator
+from fnmatch import fnmatchcase
+from typing import List, Literal, Union
+
+from pydantic import BaseModel, root_validator, validator
 from .config import ALL_SENSORS
+from lib.downsample import parse_bucket
+
+
+def check_bucket(v):
+    if v is not None:
+        parse_bucket(v)
+    return v
+
+
+def check_max_points(v):
+    if v is not None and v < 3:
+        raise ValueError("max_points must be at least 3")
+    return v
+
+
+class TimeRangeBody(BaseModel):
+    # DD/MM/YYYY or ISO 8601 strings (a date alone in end_time includes
+    # that whole day), or epoch seconds in start_ts/end_ts, which take
+    # precedence and skip the string parsing
+    start_time: Union[str, None] = None
+    end_time: Union[str, None] = None
+    start_ts: Union[float, None] = None
+    end_ts: Union[float, None] = None
+
+    @root_validator(skip_on_failure=True)
+    def time_range_must_be_set(cls, values):
+        if values.get("start_time") is None and values.get("start_ts") is None:
+            raise ValueError("start_time or start_ts is required")
+        if values.get("end_time") is None and values.get("end_ts") is None:
+            raise ValueError("end_time or end_ts is required")
+        return values
 
+    def time_range(self):
+        """Returns the start and end bounds of the query (epoch seconds or
+        strings)."""
+        return (self.start_time if self.start_ts is None else self.start_ts,
+                self.end_time if self.end_ts is None else self.end_ts)
 
-class HistoricalDataRequestBody(BaseModel):
+
+class HistoricalDataRequestBody(TimeRangeBody):
     acp_id: str
-    start_time: str
-    end_time: str
+    # optional: only the most recent readings, newest first with order=desc
+    limit: Union[int, None] = None
+    order: Literal["asc", "desc"] = "asc"
+    # optional: "ndjson" streams one reading per line as the days are read
+    # (a last {"error": ...} line if the read times out), "columnar" returns
+    # one list per parameter, "binary" packed float64 arrays (see api.formats)
+    format: Literal["json", "ndjson", "columnar", "binary"] = "json"
+    # optional: aggregates the readings in buckets that divide a day (e.g.
+    # "1m", "15m", "1h", "1d")
+    bucket: Union[str, None] = None
+    agg: Literal["mean", "min", "max", "last"] = "mean"
+    # optional: about max_points rows keeping the shape of the data (LTTB),
+    # not supported with format=ndjson
+    max_points: Union[int, None] = None
 
     # validate acp_id in ALL_SENSORS
     @validator('acp_id')
@@ -13,3 +65,45 @@ class HistoricalDataRequestBody(BaseModel):
         if v not in ALL_SENSORS:
             raise ValueError(f"acp_id must be in {ALL_SENSORS}")
         return v
+
+    @validator('bucket')
+    def bucket_must_be_valid(cls, v):
+        return check_bucket(v)
+
+    @validator('max_points')
+    def max_points_must_be_at_least_3(cls, v):
+        return check_max_points(v)
+
+
+class BatchHistoricalDataRequestBody(TimeRangeBody):
+    # acp_ids or sensor-type wildcards, e.g. ["enl-iaqco3-*"] or
+    # ["enl-iaqc-085e9a", "enl-iaqco3-0837d7"]
+    acp_ids: List[str]
+    # optional, applied to every sensor (see HistoricalDataRequestBody)
+    limit: Union[int, None] = None
+    order: Literal["asc", "desc"] = "asc"
+    format: Literal["json", "columnar"] = "json"
+    bucket: Union[str, None] = None
+    agg: Literal["mean", "min", "max", "last"] = "mean"
+    max_points: Union[int, None] = None
+
+    # expand the wildcards, every entry must match ALL_SENSORS
+    @validator('acp_ids')
+    def acp_ids_must_match_all_sensors(cls, v):
+        acp_ids = []
+        for pattern in v:
+            matches = [acp_id for acp_id in ALL_SENSORS
+                       if fnmatchcase(acp_id, pattern)]
+            if not matches:
+                raise ValueError(
+                    f"{pattern} does not match any sensor in {ALL_SENSORS}")
+            acp_ids.extend(m for m in matches if m not in acp_ids)
+        return acp_ids
+
+    @validator('bucket')
+    def bucket_must_be_valid(cls, v):
+        return check_bucket(v)
+
+    @validator('max_points')
+    def max_points_must_be_at_least_3(cls, v):
+        return check_max_points(v)
@@ -0,0 +1,53 @@
+'''
+Lines per second of JSONReader.read_day_file on one day file of the sample archive (benchmarks.sampleArchive):
+the archive fast path (read_archive_lines) against the per-line Decoder.transform path.
+
+    python -m benchmarks.bench_day_file [--path /tmp/sample_archive] [--interval 30] [--repeat 3] [--tree PATH]
+
+--tree reads with the lib/etl modules of another checkout (its servers/sensor directory). Checkouts without the fast
+path only have the per-line one.
+'''
+import os
+import sys
+import time
+import inspect
+import argparse
+from benchmarks import sampleArchive
+
+
+def best_of(repeat, reader):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        reader.read_day_file()
+        best = min(best, time.perf_counter() - start)
+    return best, reader.df
+
+
+if __name__ == "__main__":
+    argParser = argparse.ArgumentParser(description="JSONReader day file decode throughput")
+    argParser.add_argument("--path", default="/tmp/sample_archive", help="Sample archive directory")
+    argParser.add_argument("--interval", type=int, default=30, help="Seconds between uplinks in the sample archive")
+    argParser.add_argument("--repeat", type=int, default=3, help="Reads per path (the fastest one is reported)")
+    argParser.add_argument("--tree", help="servers/sensor directory of another checkout to read with")
+    args = argParser.parse_args(sys.argv[1:])
+
+    path = sampleArchive.archive_path(args.path, args.interval)
+    acp_id, = sampleArchive.write_archive(path, 1, 1, args.interval)
+    sensor_path = os.path.join(path, acp_id)
+    fpath = os.path.join(sensor_path, sorted(name for name in os.listdir(sensor_path) if name.endswith(".txt"))[-1])
+    with open(fpath, "rb") as day_file:
+        lines = sum(1 for _ in day_file)
+    if (args.tree): sys.path.insert(0, os.path.abspath(args.tree))
+    import logging
+    logging.disable(logging.WARNING)
+    from lib.jsonReader import JSONReader
+    import lib.jsonReader
+    print("JSONReader:", lib.jsonReader.__file__)
+    print("day file: %s, %d lines, %.1f MB" % (fpath, lines, os.path.getsize(fpath) / 2**20))
+
+    paths = [("fast", True), ("per-line", False)] if "fast" in inspect.signature(JSONReader).parameters else [("per-line", None)]
+    for name, fast in paths:
+        reader = JSONReader(fpath, sampleArchive.PARAMETERS) if fast is None else JSONReader(fpath, sampleArchive.PARAMETERS, fast=fast)
+        elapsed, df = best_of(args.repeat, reader)
+        print("%-8s  %6d rows x %2d columns  %6.3f s  %8.0f lines/s" % (name, len(df), len(df.columns), elapsed, lines / elapsed))
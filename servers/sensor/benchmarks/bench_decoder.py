@@ -0,0 +1,63 @@
+'''
+Throughput of the Enlink payload decoder: decode_enlink per payload and decode_enlink_batch (columns).
+
+    python -m benchmarks.bench_decoder [--archive /media/acp/mqtt_ttn/sensors/enl-iaqco3-081622] [--payloads 20000] [--repeat 5]
+
+Payloads are the frm_payloads of the day files under --archive, or the archive frames of tests/fixtures/enlink_golden.json.
+'''
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+import lib.dayArchive as archive
+from etl.decoders.decoder_ttn import Decoder_TTN
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests", "fixtures", "enlink_golden.json")
+
+
+def archive_frames(archive_path, n):
+    frames = list()
+    for root, _, files in os.walk(archive_path):
+        for name in sorted(files):
+            if (not archive.is_day_file(name)): continue
+            for line in archive.read_lines(os.path.join(root, name)):
+                try:
+                    frames.append(base64.b64decode(json.loads(line)["uplink_message"]["frm_payload"]))
+                except (ValueError, KeyError, TypeError):
+                    continue
+                if (len(frames) >= n): return frames
+    return frames
+
+
+def golden_frames(n):
+    with open(GOLDEN_PATH) as golden_file:
+        frames = [bytes.fromhex(case["frame"]) for case in json.load(golden_file) if case["name"].startswith("archive frame")]
+    return (frames * (n // len(frames) + 1))[:n]
+
+
+def best_of(repeat, func, *args):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    argParser = argparse.ArgumentParser(description="Enlink decoder throughput")
+    argParser.add_argument("--archive", help="Directory of day files to take the payloads from")
+    argParser.add_argument("--payloads", type=int, default=20000, help="Number of payloads")
+    argParser.add_argument("--repeat", type=int, default=5, help="Runs per measure (the best one is kept)")
+    args = argParser.parse_args(sys.argv[1:])
+
+    frames = archive_frames(args.archive, args.payloads) if args.archive else golden_frames(args.payloads)
+    if (not frames): argParser.error("no payloads found")
+    decoder = Decoder_TTN()
+    print("payloads: %d (%d distinct lengths)" % (len(frames), len({len(frame) for frame in frames})))
+    elapsed = best_of(args.repeat, lambda: [decoder.decode_enlink(frame) for frame in frames])
+    print("decode_enlink       %8.0f payloads/s" % (len(frames) / elapsed))
+    elapsed = best_of(args.repeat, decoder.decode_enlink_batch, frames)
+    print("decode_enlink_batch %8.0f payloads/s" % (len(frames) / elapsed))
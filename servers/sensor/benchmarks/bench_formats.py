@@ -0,0 +1,62 @@
+'''
+Size and encode time of the /history/ response formats (api.formats) for the history of one sensor of the sample
+archive (benchmarks.sampleArchive): json (list of readings in payload format, as FastAPI encodes the returned list),
+columnar and binary.
+
+    python -m benchmarks.bench_formats [--path /tmp/sample_archive] [--interval 300] [--days 1 7 30 365] [--repeat 5]
+
+The history (the parameters of the IAQ frames, rows with NaN removed as for the API) is read once per range, the encode
+times leave the read out. gzip is the size with Content-Encoding gzip.
+'''
+import sys
+import gzip
+import time
+import logging
+import argparse
+from datetime import date, timedelta
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from benchmarks import sampleArchive
+
+logging.disable(logging.WARNING)
+from api.formats import encode_binary, encode_columnar
+from api.providers import ApiProvider
+from etl.DBManager import DBManager
+
+
+def best_of(repeat, func):
+    best, body = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = func()
+        best = min(best, time.perf_counter() - start)
+    return best, body
+
+
+if __name__ == "__main__":
+    argParser = argparse.ArgumentParser(description="/history/ response formats: size and encode time")
+    argParser.add_argument("--path", default="/tmp/sample_archive", help="Sample archive directory")
+    argParser.add_argument("--interval", type=int, default=300, help="Seconds between uplinks in the sample archive")
+    argParser.add_argument("--days", type=int, nargs="+", default=[1, 7, 30, 365], help="Days of history (up to yesterday)")
+    argParser.add_argument("--repeat", type=int, default=5, help="Encodes per format (the fastest one is reported)")
+    args = argParser.parse_args(sys.argv[1:])
+
+    path = sampleArchive.archive_path(args.path, args.interval)
+    acp_id, = sampleArchive.write_archive(path, 1, max(args.days), args.interval)
+    api_provider = ApiProvider()
+    api_provider.http_etl.db_manager = DBManager({"db_type": "file", "fs_data_paths": [path], "fs_cache_path": None})
+    encoders = {
+        "json": lambda df: JSONResponse(jsonable_encoder(api_provider._to_payloads(df))).body,
+        "columnar": lambda df: encode_columnar(df, acp_id),
+        "binary": lambda df: encode_binary(df, acp_id),
+    }
+    yesterday = date.today() - timedelta(days=1)
+    for days in args.days:
+        first = yesterday - timedelta(days=days-1)
+        #the short frames of the sample archive (co2e_ppm only) would leave no row without NaN
+        query = {"acp_id": acp_id, "from": first.strftime("%d/%m/%Y"), "to": yesterday.strftime("%d/%m/%Y"), "parameters": sampleArchive.PARAMETERS[:-1]}
+        df = api_provider._prepare_history(api_provider.http_etl.read(query))
+        print("%d days: %d rows x %d columns" % (days, len(df), len(df.columns)))
+        for name, encode in encoders.items():
+            elapsed, body = best_of(args.repeat, lambda: encode(df))
+            print("  %-8s  %11d bytes  gzip %10d bytes  %9.2f ms" % (name, len(body), len(gzip.compress(body, 6)), elapsed * 1e3))
@@ -0,0 +1,55 @@
+'''
+Time and peak memory of FileManager.read over the last 90 and 365 days of one sensor of the sample archive
+(benchmarks.sampleArchive), without the day cache and the read pool.
+
+    python -m benchmarks.bench_read [--path /tmp/sample_archive] [--days 90 365] [--interval 300] [--tree PATH]
+
+--tree reads with the etl/lib modules of another checkout (its servers/sensor directory), to compare before/after.
+Peak memory is the tracemalloc peak of the read (NumPy and pandas buffers included).
+'''
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+from datetime import date, timedelta
+from benchmarks import sampleArchive
+
+
+def measure(file_manager, query, traced=False):
+    #tracemalloc slows the allocations down, the time and the peak memory are measured in separate reads
+    if (traced): tracemalloc.start()
+    start = time.perf_counter()
+    df = file_manager.read(dict(query, parameters=list(query["parameters"])))
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] if traced else None
+    if (traced): tracemalloc.stop()
+    return df, elapsed, peak
+
+
+if __name__ == "__main__":
+    argParser = argparse.ArgumentParser(description="FileManager read time and peak memory over many day files")
+    argParser.add_argument("--path", default="/tmp/sample_archive", help="Sample archive directory")
+    argParser.add_argument("--days", type=int, nargs="+", default=[90, 365], help="Days read (up to yesterday)")
+    argParser.add_argument("--interval", type=int, default=300, help="Seconds between uplinks in the sample archive")
+    argParser.add_argument("--repeat", type=int, default=1, help="Reads per range (the fastest one is reported)")
+    argParser.add_argument("--tree", help="servers/sensor directory of another checkout to read with")
+    args = argParser.parse_args(sys.argv[1:])
+
+    path = sampleArchive.archive_path(args.path, args.interval)
+    acp_id, = sampleArchive.write_archive(path, 1, max(args.days), args.interval)
+    if (args.tree): sys.path.insert(0, os.path.abspath(args.tree))
+    import logging
+    logging.disable(logging.INFO)
+    from etl.FileManager import FileManager
+    import etl.FileManager
+    print("FileManager:", etl.FileManager.__file__)
+
+    file_manager = FileManager({"fs_data_paths": [path], "fs_cache_path": None, "fs_read_workers": 0})
+    yesterday = date.today() - timedelta(days=1)
+    for days in args.days:
+        first = yesterday - timedelta(days=days-1)
+        query = {"acp_id": acp_id, "from": first.strftime("%d/%m/%Y"), "to": yesterday.strftime("%d/%m/%Y"), "parameters": sampleArchive.PARAMETERS}
+        df, elapsed, _ = min((measure(file_manager, query) for _ in range(args.repeat)), key=lambda run: run[1])
+        peak = measure(file_manager, query, traced=True)[2]
+        print("%4d days: %8d rows x %2d columns  %7.2f s  %8.0f rows/s  peak %7.1f MB" % (days, len(df), len(df.columns), elapsed, len(df) / elapsed, peak / 2**20))
@@ -0,0 +1,77 @@
+'''
+Cost of storing live messages on the MQTT thread: the backend store called for each message (synchronous) against
+DBManager.store, which only queues the message for the write-behind thread (lib.writeBehind).
+
+    python -m benchmarks.bench_store [--messages 20000] [--sensors 10] [--queue-size 10000] [--path /tmp/bench_store]
+
+Both backends are measured: the file store (raw lines appended to day files in fs_store_path) and SQLite (sql_path).
+Reports the time of each store call on the calling thread (p50/p99/max) and the messages per second until everything
+is written (close drains the queue). The messages are stored in one burst, the write-behind queue drops those that
+do not fit in --queue-size.
+'''
+import os
+import sys
+import time
+import shutil
+import random
+import logging
+import argparse
+from datetime import datetime, timedelta
+from benchmarks import sampleArchive
+from benchmarks.load_ws import percentile
+
+logging.disable(logging.WARNING)
+from etl.decoders.decoder import Decoder
+from etl.DBManager import DBManager
+
+
+def messages(n, sensors):
+    rng = random.Random(1)
+    acp_ids = sampleArchive.acp_ids(sensors)
+    start = (datetime.now() - timedelta(days=1)).timestamp()
+    lines = list()
+    for i in range(n):
+        acp_id = acp_ids[i % len(acp_ids)]
+        line = sampleArchive.ttn_line(acp_id, start + i * 30 / len(acp_ids), sampleArchive.enlink_frame(rng))
+        lines.append((Decoder.transform(line, "v3/app/devices/" + acp_id + "/up"), line))
+    return lines
+
+
+def run(store, close, lines):
+    times = list()
+    start = time.perf_counter()
+    for message, raw in lines:
+        call = time.perf_counter()
+        store(message, raw)
+        times.append(time.perf_counter() - call)
+    close()
+    return times, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    argParser = argparse.ArgumentParser(description="Live message store cost and throughput")
+    argParser.add_argument("--messages", type=int, default=20000, help="Number of messages stored")
+    argParser.add_argument("--sensors", type=int, default=10, help="Number of sensors")
+    argParser.add_argument("--queue-size", type=int, default=10000, help="store_queue_size, messages beyond it are dropped")
+    argParser.add_argument("--path", default="/tmp/bench_store", help="Directory of the stores (emptied)")
+    args = argParser.parse_args(sys.argv[1:])
+
+    lines = messages(args.messages, args.sensors)
+    backends = {"file": {"db_type": "file", "fs_store_path": os.path.join(args.path, "store"), "fs_cache_path": None},
+                "sql": {"db_type": "sql", "sql_path": os.path.join(args.path, "readings.sqlite")}}
+    print("%d messages of %d sensors" % (len(lines), args.sensors))
+    for name, db_cfg in backends.items():
+        for mode in ("synchronous", "write-behind"):
+            shutil.rmtree(args.path, ignore_errors=True)
+            os.makedirs(args.path)
+            #fs_data_paths is a new list each time, FileManager removes the paths that do not exist from it
+            db_manager = DBManager(dict(db_cfg, fs_data_paths=[], store_queue_size=args.queue_size))
+            if (mode == "synchronous"):
+                #the backend written on the calling thread, one message at a time
+                times, elapsed = run(lambda message, raw: db_manager.db.store_many([message], [raw]), db_manager.close, lines)
+                written = len(lines)
+            else:
+                times, elapsed = run(db_manager.store, db_manager.close, lines)
+                written = db_manager.store_stats()["written"]
+            print("%-4s %-12s  store p50 %6.1f us  p99 %6.1f us  max %6.1f ms  %8.0f messages/s  %d dropped" % (
+                name, mode, 1e6 * percentile(times, 50), 1e6 * percentile(times, 99), 1e3 * max(times), written / elapsed, len(lines) - written))
@@ -0,0 +1,111 @@
+'''
+Live websocket latency while /history/ queries run: the API (main.app) served by uvicorn with the history read from
+the sample archive (benchmarks.sampleArchive), websocket clients and live messages as in benchmarks.load_ws.
+
+    python -m benchmarks.load_history [--clients 50] [--rate 100] [--seconds 10] [--readers 8] [--days 30] [--tree PATH]
+
+The live messages are sent twice for --seconds: alone, then while --readers threads post /history/ queries of --days
+days (random ranges of the last 365 days, the query cache disabled) in a loop. The latency should stay flat.
+--tree serves the API of another checkout (its servers/sensor directory, run from it for its cfg/).
+'''
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import logging
+import threading
+import urllib.request
+from datetime import date, timedelta
+from benchmarks import sampleArchive
+from benchmarks.load_ws import percentile, start_server, publish, client
+
+
+def read_history(port, acp_id, days, stop, durations, errors):
+    #one client of /history/, posting queries until stop is set
+    rng = random.Random(threading.get_ident())
+    yesterday = date.today() - timedelta(days=1)
+    while (not stop.is_set()):
+        first = yesterday - timedelta(days=rng.randrange(365 - days))
+        body = {"acp_id": acp_id, "start_time": (first - timedelta(days=days-1)).strftime("%d/%m/%Y"), "end_time": first.strftime("%d/%m/%Y")}
+        request = urllib.request.Request("http://127.0.0.1:%d/history/" % port, data=json.dumps(body).encode(),
+                                         headers={"Content-Type": "application/json"})
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=120) as response:
+                response.read()
+            durations.append(time.perf_counter() - start)
+        except OSError:
+            errors.append(body)
+
+
+async def live(api_provider, port, args, acp_ids, history_id, readers):
+    sent, handle_times = dict(), list()
+    clients = [{"acp_id": None if i % 3 == 0 else acp_ids[i % len(acp_ids)], "latencies": list(), "received": [0]} for i in range(args.clients)]
+    ready = asyncio.Semaphore(0)
+    tasks = [asyncio.create_task(client("ws://127.0.0.1:%d/ws/%s" % (port, c["acp_id"] or ""), port, sent, c["latencies"], c["received"], False, ready))
+             for c in clients]
+    for _ in clients:
+        await ready.acquire()
+    while (len(api_provider.connected_clients) < len(clients)):
+        await asyncio.sleep(0.05)
+
+    stop, durations, errors = threading.Event(), list(), list()
+    threads = [threading.Thread(target=read_history, args=(port, history_id, args.days, stop, durations, errors)) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    publisher = threading.Thread(target=publish, args=(api_provider, acp_ids, args.rate, args.seconds, sent, handle_times))
+    publisher.start()
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, publisher.join)
+    await asyncio.sleep(1)
+    stop.set()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    for thread in threads:
+        await loop.run_in_executor(None, thread.join)
+
+    latencies = [latency for c in clients for latency in c["latencies"]]
+    expected = sum(len(handle_times) if c["acp_id"] is None else len(handle_times) / len(acp_ids) for c in clients)
+    print("%2d history readers: latency p50 %7.3f ms  p99 %7.3f ms  max %7.3f ms  missed %d" % (
+        readers, 1e3 * percentile(latencies, 50), 1e3 * percentile(latencies, 99), 1e3 * max(latencies), expected - len(latencies)))
+    if (readers):
+        print("                    %d history queries of %d days: p50 %.2f s  max %.2f s, %d failed" % (
+            len(durations), args.days, percentile(durations, 50), max(durations, default=float("nan")), len(errors)))
+
+
+if __name__ == "__main__":
+    argParser = argparse.ArgumentParser(description="Live websocket latency under concurrent history queries")
+    argParser.add_argument("--path", default="/tmp/sample_archive", help="Sample archive directory")
+    argParser.add_argument("--interval", type=int, default=300, help="Seconds between uplinks in the sample archive")
+    argParser.add_argument("--clients", type=int, default=50, help="Number of websocket clients")
+    argParser.add_argument("--sensors", type=int, default=10, help="Number of sensors publishing")
+    argParser.add_argument("--rate", type=float, default=100, help="Live messages per second (all sensors)")
+    argParser.add_argument("--seconds", type=float, default=10, help="Duration of each run")
+    argParser.add_argument("--readers", type=int, default=8, help="Concurrent /history/ clients")
+    argParser.add_argument("--days", type=int, default=30, help="Days per history query")
+    argParser.add_argument("--port", type=int, default=8766, help="Port of the test server")
+    argParser.add_argument("--tree", help="servers/sensor directory of another checkout to serve")
+    args = argParser.parse_args(sys.argv[1:])
+
+    path = sampleArchive.archive_path(args.path, args.interval)
+    history_id, = sampleArchive.write_archive(path, 1, 365, args.interval)
+    if (args.tree): sys.path.insert(0, os.path.abspath(args.tree))
+    logging.disable(logging.WARNING)
+    import main
+    from etl.DBManager import DBManager
+    print("API:", main.__file__)
+    main.api_provider.http_etl.db_manager = DBManager({"db_type": "file", "fs_data_paths": [path], "fs_cache_path": None})
+    acp_ids = sampleArchive.acp_ids(args.sensors)
+    main.api_provider.all_sensors.extend(acp_id for acp_id in acp_ids if acp_id not in main.api_provider.all_sensors)
+    main.api_provider.ws_etl.rt_manager.subscribe_query({"sensors": [{"acp_id": acp_id, "parameters": ["all"]} for acp_id in acp_ids]})
+
+    server, thread = start_server(main.app, args.port)
+    print("clients: %d, sensors: %d, %.0f live messages/s for %.0f s" % (args.clients, args.sensors, args.rate, args.seconds))
+    asyncio.run(live(main.api_provider, args.port, args, acp_ids, history_id, 0))
+    asyncio.run(live(main.api_provider, args.port, args, acp_ids, history_id, args.readers))
+    server.should_exit = True
+    thread.join(5)
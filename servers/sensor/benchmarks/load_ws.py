@@ -0,0 +1,139 @@
+'''
+Load test of the live websockets: the API (main.app) served by uvicorn, hundreds of /ws/ clients, and live messages
+handed over from a publisher thread as the MQTT thread does (ApiProvider.handle_message).
+
+    python -m benchmarks.load_ws [--clients 300] [--slow 5] [--sensors 10] [--rate 200] [--seconds 10] [--tree PATH]
+
+A third of the clients are on /ws/ (every sensor), the others on /ws/<acp_id> of one sensor. The slow clients (on /ws/)
+stop reading after their first message (with small socket buffers), the server must drop their messages
+without delaying the others.
+Reports the handle_message time on the publishing thread, the latency from handle_message to the client (p50/p99/max),
+and the messages missed per client. The clients run in this process, their latency includes their own decoding.
+--tree serves the API of another checkout (its servers/sensor directory, run from it for its cfg/), to compare before/after.
+'''
+import os
+import sys
+import json
+import socket
+import time
+import random
+import asyncio
+import argparse
+import logging
+import threading
+import uvicorn
+import websockets
+from benchmarks import sampleArchive
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] if values else float("nan")
+
+
+def start_server(app, port):
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", ws_ping_interval=None))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while (not server.started):
+        time.sleep(0.05)
+    return server, thread
+
+
+def publish(api_provider, acp_ids, rate, seconds, sent, handle_times):
+    #the MQTT thread: decodes each uplink and hands it over to the server loop
+    rng = random.Random(1)
+    start = time.perf_counter()
+    base_ts = int(time.time())
+    for seq in range(int(rate * seconds)):
+        delay = start + seq / rate - time.perf_counter()
+        if (delay > 0): time.sleep(delay)
+        acp_id = acp_ids[seq % len(acp_ids)]
+        line = sampleArchive.ttn_line(acp_id, base_ts + seq, sampleArchive.enlink_frame(rng))
+        sent[(acp_id, base_ts + seq)] = time.perf_counter()
+        api_provider.handle_message(line, "v3/app/devices/" + acp_id + "/up")
+        handle_times.append(time.perf_counter() - sent[(acp_id, base_ts + seq)])
+
+
+def small_socket(port):
+    #a small receive buffer, so that a client that stops reading pushes back on the server after a few messages
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    sock.connect(("127.0.0.1", port))
+    sock.setblocking(False)
+    return sock
+
+
+async def client(uri, port, sent, latencies, received, slow, ready):
+    options = {"max_queue": 1, "read_limit": 4096, "sock": small_socket(port)} if slow else {"max_queue": 1024}
+    async with websockets.connect(uri, ping_interval=None, **options) as ws:
+        ready.release()
+        try:
+            async for text in ws:
+                now = time.perf_counter()
+                message = json.loads(text)
+                latencies.append(now - sent[(message["acp_id"], message["acp_ts"])])
+                received[0] += 1
+                if (slow): await asyncio.sleep(3600)
+        except websockets.ConnectionClosed:
+            pass
+
+
+async def run(args, port):
+    acp_ids = sampleArchive.acp_ids(args.sensors)
+    sent, handle_times = dict(), list()
+    clients = list()
+    ready = asyncio.Semaphore(0)
+    for i in range(args.clients):
+        slow = i < args.slow
+        acp_id = None if slow or i % 3 == 0 else acp_ids[i % len(acp_ids)]
+        clients.append({"acp_id": acp_id, "slow": slow, "latencies": list(), "received": [0]})
+    tasks = [asyncio.create_task(client("ws://127.0.0.1:%d/ws/%s" % (port, c["acp_id"] or ""), port, sent, c["latencies"], c["received"], c["slow"], ready))
+             for c in clients]
+    for _ in clients:
+        await ready.acquire()
+    while (len(main.api_provider.connected_clients) < len(clients)):
+        await asyncio.sleep(0.05)
+
+    publisher = threading.Thread(target=publish, args=(main.api_provider, acp_ids, args.rate, args.seconds, sent, handle_times))
+    publisher.start()
+    await asyncio.get_running_loop().run_in_executor(None, publisher.join)
+    await asyncio.sleep(1)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    published = len(handle_times)
+    per_sensor = published / len(acp_ids)
+    fast = [c for c in clients if not c["slow"]]
+    latencies = [latency for c in fast for latency in c["latencies"]]
+    missed = [(published if c["acp_id"] is None else per_sensor) - c["received"][0] for c in fast]
+    print("clients: %d (%d slow), sensors: %d, published: %d messages in %.0f s" % (len(clients), args.slow, len(acp_ids), published, args.seconds))
+    print("handle_message:  p50 %6.3f ms  p99 %6.3f ms  max %6.3f ms" % tuple(1e3 * v for v in (percentile(handle_times, 50), percentile(handle_times, 99), max(handle_times))))
+    print("latency:         p50 %6.3f ms  p99 %6.3f ms  max %6.3f ms  (%d deliveries)" % (1e3 * percentile(latencies, 50), 1e3 * percentile(latencies, 99), 1e3 * max(latencies), len(latencies)))
+    print("missed by the other clients: %d (max %d per client)" % (sum(missed), max(missed)))
+    print("slow clients received: %s" % [c["received"][0] for c in clients if c["slow"]])
+    print("counters:", main.api_provider.stats.snapshot())
+
+
+if __name__ == "__main__":
+    argParser = argparse.ArgumentParser(description="Live websocket load test")
+    argParser.add_argument("--clients", type=int, default=300, help="Number of websocket clients")
+    argParser.add_argument("--slow", type=int, default=5, help="Clients (on /ws/) that stop reading")
+    argParser.add_argument("--sensors", type=int, default=10, help="Number of sensors publishing")
+    argParser.add_argument("--rate", type=float, default=200, help="Messages per second (all sensors)")
+    argParser.add_argument("--seconds", type=float, default=10, help="Duration of the publishing")
+    argParser.add_argument("--port", type=int, default=8765, help="Port of the test server")
+    argParser.add_argument("--tree", help="servers/sensor directory of another checkout to serve")
+    args = argParser.parse_args(sys.argv[1:])
+
+    if (args.tree): sys.path.insert(0, os.path.abspath(args.tree))
+    logging.disable(logging.WARNING)
+    import main
+    print("API:", main.__file__)
+
+    server, thread = start_server(main.app, args.port)
+    main.api_provider.ws_etl.rt_manager.subscribe_query({"sensors": [{"acp_id": acp_id, "parameters": ["all"]} for acp_id in sampleArchive.acp_ids(args.sensors)]})
+    asyncio.run(run(args, args.port))
+    server.should_exit = True
+    thread.join(5)
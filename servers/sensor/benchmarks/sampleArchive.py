@@ -0,0 +1,86 @@
+'''
+Synthetic archive of Enlink (TTN v3) day files for the benchmarks, in the layout of fs_data_paths:
+<path>/<acp_id>/<acp_id>_YYYY-MM-DD.txt, one uplink every interval seconds (+/- 10 s).
+
+    python -m benchmarks.sampleArchive --path /tmp/sample_archive --days 90 [--sensors 2] [--interval 30]
+
+Days already written are kept, so the benchmarks can share one archive.
+'''
+import os
+import sys
+import json
+import base64
+import struct
+import random
+import argparse
+from datetime import date, datetime, timedelta, timezone
+
+ACP_TYPE = "enl-iaqco3"
+#columns of the readings of the frames below, as requested to FileManager
+PARAMETERS = ["acp_id", "acp_ts", "temperature", "humidity", "co2_ppm", "bvoc", "O3_ppb", "batt_v", "batt_mv", "co2e_ppm"]
+
+
+def acp_ids(sensors):
+    return [ACP_TYPE + "-%06x" % (0x081600 + i) for i in range(sensors)]
+
+
+def enlink_frame(rng):
+    #IAQ + O3 frame, and a shorter frame now and then (two layouts per day file, as in the archive)
+    if (rng.random() < 0.2):
+        return b"\x01" + struct.pack(">h", rng.randint(150, 300)) + b"\x3f" + struct.pack(">f", rng.random() * 900)
+    return (b"\x01" + struct.pack(">h", rng.randint(150, 300)) + b"\x02" + bytes([rng.randint(20, 80)]) +
+            b"\x08" + struct.pack(">H", rng.randint(400, 1200)) + b"\x12" + struct.pack(">f", rng.random() * 3) +
+            b"\x61\x23" + struct.pack(">f", rng.random() * 50) + b"\x42" + struct.pack(">H", 3600))
+
+
+def ttn_line(acp_id, acp_ts, frame):
+    #uplinks of the archive carry the (here empty) output of the TTN payload formatter
+    received_at = datetime.fromtimestamp(acp_ts, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f") + "123Z"
+    return json.dumps({"end_device_ids": {"device_id": acp_id, "application_ids": {"application_id": "app"}, "dev_eui": "0011"},
+                       "received_at": received_at,
+                       "uplink_message": {"frm_payload": base64.b64encode(frame).decode(), "received_at": received_at,
+                                          "rx_metadata": [{"gateway_ids": {"gateway_id": "gw1"}, "rssi": -80, "timestamp": 1}],
+                                          "settings": {"timestamp": 1}, "decoded_payload": {"data": {}}}}) + "\n"
+
+
+def write_day(fpath, acp_id, day, interval=30, seed=5):
+    rng = random.Random(str(seed) + acp_id + day.isoformat())
+    start = datetime(day.year, day.month, day.day).timestamp()
+    end = start + 86400
+    acp_ts = start + rng.uniform(0, interval)
+    with open(fpath + ".tmp", "w") as day_file:
+        while (acp_ts < end):
+            day_file.write(ttn_line(acp_id, acp_ts, enlink_frame(rng)))
+            acp_ts += interval + rng.uniform(-10, 10)
+    os.replace(fpath + ".tmp", fpath)
+
+
+def write_archive(path, sensors=1, days=90, interval=30, last_day=None):
+    '''
+    Writes the day files of sensors over the days up to last_day (default: yesterday), returns the acp_ids.
+    '''
+    last_day = last_day or date.today() - timedelta(days=1)
+    ids = acp_ids(sensors)
+    for acp_id in ids:
+        os.makedirs(os.path.join(path, acp_id), exist_ok=True)
+        for d in range(days):
+            day = last_day - timedelta(days=d)
+            fpath = os.path.join(path, acp_id, acp_id + "_" + day.isoformat() + ".txt")
+            if (not os.path.exists(fpath)): write_day(fpath, acp_id, day, interval)
+    return ids
+
+
+def archive_path(path, interval):
+    #one archive per interval, the day files of another interval are not mixed in
+    return os.path.join(path, "interval_" + str(interval))
+
+
+if __name__ == "__main__":
+    argParser = argparse.ArgumentParser(description="Writes a synthetic archive of Enlink day files")
+    argParser.add_argument("--path", default="/tmp/sample_archive", help="Archive directory")
+    argParser.add_argument("--sensors", type=int, default=1, help="Number of sensors")
+    argParser.add_argument("--days", type=int, default=90, help="Days up to yesterday")
+    argParser.add_argument("--interval", type=int, default=30, help="Seconds between uplinks")
+    args = argParser.parse_args(sys.argv[1:])
+    path = archive_path(args.path, args.interval)
+    print(path, write_archive(path, args.sensors, args.days, args.interval))
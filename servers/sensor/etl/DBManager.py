@@ -1,4 +1,6 @@
 import logging
+import atexit
+import threading
 from etl.FileManager import FileManager
 from etl.SQLManager import SQLManager
 import pathlib
@@ -6,6 +8,9 @@ import sys
 import os
 #sys.path.append(os.path.join(pathlib.Path(__file__).parent.absolute(), 'lib/'))
 import lib.iolibs as io
+from lib.queryCache import QueryCache
+from lib.writeBehind import WriteBehind
+from datetime import datetime
 
 
 class DBManager:
@@ -16,18 +21,62 @@ class DBManager:
         self.init_db(sensor_parameters_path)
 
     def init_db(self, sensor_parameters_path):
+        self.sensor_parameters = io.readJSON(sensor_parameters_path)
+
         if(self.db_cfg["db_type"]=="file"):
-            self.db=FileManager(self.db_cfg, logger=self.logger)
+            self.db=FileManager(self.db_cfg, logger=self.logger, sensor_parameters=self.sensor_parameters)
         if(self.db_cfg["db_type"]=="sql"):
             self.db=SQLManager(self.db_cfg, logger=self.logger)
-        
-        self.sensor_parameters = io.readJSON(sensor_parameters_path)
+
+        #results of repeated queries are kept in memory (disabled if query_cache_bytes is not configured)
+        self.query_cache=None
+        if(self.db_cfg.get("query_cache_bytes")):
+            self.query_cache=QueryCache(self.db_cfg["query_cache_bytes"], self.db_cfg.get("query_cache_ttl_sec", 60), logger=self.logger)
         #self.logger.info(self.sensor_parameters)
+
+        #stored messages are written behind, in batches, by a background thread (only if the backend persists them:
+        #the SQL store, or the file archive if fs_store_path or fs_ring_path is set). The thread is started by the
+        #first stored message, instances that only read (e.g., the websocket ETL) have none
+        self.persists=self.db_cfg["db_type"]=="sql" or bool(self.db_cfg.get("fs_store_path") or self.db_cfg.get("fs_ring_path"))
+        self.write_behind=None
+        self.write_behind_lock=threading.Lock()
+        self.closed=False
         
         
-    def store(self, message):
-        #self.logger.info("Message: " + str(message))
-        self.db.store(message)
+    def store(self, message, raw=None):
+        #called on the MQTT thread: the message (and its raw line for the file archive) is only queued
+        if(not self.persists or not message): return
+        write_behind=self.write_behind or self.start_write_behind()
+        if(write_behind is not None): write_behind.put((message, raw))
+
+    def start_write_behind(self):
+        with self.write_behind_lock:
+            if(self.write_behind is None and not self.closed):
+                self.write_behind=WriteBehind(self.write_messages, self.db_cfg.get("store_queue_size", 10000), self.db_cfg.get("store_batch_size", 500),
+                                              self.db_cfg.get("store_flush_sec", 5), logger=self.logger)
+                atexit.register(self.close)
+            return self.write_behind
+
+    def write_messages(self, batch):
+        #write-behind thread
+        self.db.store_many([message for message, _ in batch], [raw for _, raw in batch])
+        #cached live windows may have been read before the messages were written
+        for acp_id in {message["sensor"]["acp_id"] for message, _ in batch if message.get("sensor") and "acp_id" in message["sensor"]}:
+            self.invalidate(acp_id)
+
+    def flush(self):
+        if(self.write_behind is not None): self.write_behind.flush()
+
+    def close(self):
+        #drains the messages not written yet
+        with self.write_behind_lock:
+            if(self.closed): return
+            self.closed=True
+        if(self.write_behind is not None): self.write_behind.close()
+        if(hasattr(self.db, "close")): self.db.close()
+
+    def store_stats(self):
+        return self.write_behind.stats() if self.write_behind is not None else None
 
     def read(self, query):
         '''
@@ -37,11 +86,108 @@ class DBManager:
         - {"acp_id": "enl_iaqco3_123456", "from": "01/03/2023", "to": "now", "parameters": ["pm", "openv"]}
         # this includes all parameters in the sensor
         - {"acp_id": "enl_iaqco3_123456", "from": "01/03/2023", "to": "now", "parameters": ["all"]} 
+        # the 10 most recent readings, newest first (limit alone keeps them oldest first), only the end of the day files is read
+        - {"acp_id": "enl_iaqco3_123456", "from": "01/03/2023", "to": "now", "parameters": ["all"], "limit": 10, "order": "desc"}
+        # bounds can also be ISO strings or epoch seconds, a date alone in "to" includes that whole day
+        - {"acp_id": "enl_iaqco3_123456", "from": 1677628800, "to": "2023-03-01T12:00:00", "parameters": ["all"]}
         '''
-        query = self.expand_query(query)
+        open_end = self.is_open_end(query)
+        query = self.parse_time_range(self.expand_query(query))
         self.logger.info("DBManager.read => Query: ")
         self.logger.info(query)
-        return self.db.read(query)
+        if(self.query_cache is None or not hasattr(self.db, "getTimeRange")): return self.db.read(query)
+
+        key, live = self.cache_key(query, open_end)
+        df = self.query_cache.get(key)
+        if(df is not None): return df
+        generation = self.query_cache.generation(query["acp_id"])
+        df = self.db.read(query)
+        if(df is not None): self.query_cache.put(key, df, query["acp_id"], live, generation)
+        return df
+
+    def read_batch(self, query):
+        '''
+        Reads several sensors over the same window, returns acp_id -> df (None for sensors without data).
+        Same queries as read with a list of acp_ids instead of acp_id, e.g.:
+        - {"acp_ids": ["enl_iaqco3_123456", "enl_iaqc_654321"], "from": "01/03/2023", "to": "08/03/2023", "parameters": ["all"]}
+        Parameters are expanded per sensor type. Sensors in the query cache are not read again, the day files
+        of the others are decoded together.
+        '''
+        open_end=self.is_open_end(query)
+        batch_query=self.parse_time_range(dict(query))
+        queries=list()
+        for acp_id in query["acp_ids"]:
+            sensor_query={k: v for k, v in batch_query.items() if k!="acp_ids"}
+            sensor_query["acp_id"]=acp_id
+            sensor_query["parameters"]=list(query.get("parameters", ["all"]))
+            queries.append(self.expand_query(sensor_query))
+        self.logger.info("DBManager.read_batch => " + str(len(queries)) + " sensors")
+
+        results=dict()
+        pending=list()
+        keys=dict()
+        for sensor_query in queries:
+            if(self.query_cache is not None and hasattr(self.db, "getTimeRange")):
+                key, live = self.cache_key(sensor_query, open_end)
+                df = self.query_cache.get(key)
+                if(df is not None):
+                    results[sensor_query["acp_id"]]=df
+                    continue
+                keys[sensor_query["acp_id"]]=(key, live, self.query_cache.generation(sensor_query["acp_id"]))
+            pending.append(sensor_query)
+
+        if(hasattr(self.db, "read_batch")): read=self.db.read_batch(pending)
+        else: read={sensor_query["acp_id"]: self.db.read(sensor_query) for sensor_query in pending}
+        for acp_id, df in read.items():
+            if(df is not None and acp_id in keys):
+                key, live, generation = keys[acp_id]
+                self.query_cache.put(key, df, acp_id, live, generation)
+            results[acp_id]=df
+        return {acp_id: results.get(acp_id) for acp_id in query["acp_ids"]}
+
+    def read_iter(self, query):
+        '''
+        Same queries as read (without limit/order), the data is yielded in chunks (e.g., one per day file) oldest first.
+        '''
+        query = self.parse_time_range(self.expand_query(query))
+        return self.db.read_iter(query)
+
+    def parse_time_range(self, query):
+        #from/to are parsed once per query: the cache key and the database get datetimes
+        if(hasattr(self.db, "getTimeRange")): query["from"], query["to"] = self.db.getTimeRange(query)
+        return query
+
+    def is_open_end(self, query):
+        #a window without "to" (or "now") ends whenever it is read, taken before parse_time_range resolves it
+        return query.get("to") is None or query.get("to")=="now"
+
+    def cache_key(self, query, open_end=False):
+        '''
+        Normalised query for the query cache: same sensor, time range, parameters, limit, order and buckets.
+        A range reaching today is live: its result changes as new data arrives.
+        '''
+        dt_from, dt_to = self.db.getTimeRange(query)
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        live = open_end or dt_to >= today
+        #only open ends share one entry (until it expires or is invalidated), other windows are keyed on their end
+        key = (query.get("acp_id"), dt_from, "now" if open_end else dt_to, tuple(query["parameters"]), query.get("limit"), str(query.get("order", "asc")),
+               query.get("bucket"), query.get("agg") if query.get("bucket") is not None else None)
+        return key, live
+
+    def invalidate(self, acp_id):
+        #new data of a sensor arrived
+        if(self.query_cache is not None): self.query_cache.invalidate(acp_id)
+
+    def cache_stats(self):
+        return self.query_cache.stats() if self.query_cache is not None else None
+
+    def read_latest(self, acp_id, parameters=None, n=1, days=2):
+        '''
+        Reads the last n readings of a sensor, looking back at most days before today.
+        Only the tail of the newest day files is decoded.
+        '''
+        query = self.expand_query({"acp_id": acp_id, "parameters": list(parameters) if parameters else ["all"]})
+        return self.db.read_latest(acp_id, query["parameters"], n, days)
 
     def expand_query(self, query):
         if ("from" in query and query["from"] == "start"):
@@ -51,7 +197,7 @@ class DBManager:
         if (not "parameters" in query): query["parameters"] = ["all"]
         if("all" in query["parameters"]):
             sensor_type = self.extractSensorTypeFromID(query)
-            query["parameters"] = self.sensor_parameters[sensor_type]
+            query["parameters"] = self.sensor_parameters[sensor_type].copy()
         if ("pm" in query["parameters"]):
             sensor_type = self.extractSensorTypeFromID(query)
             query["parameters"].remove("pm")
@@ -3,22 +3,74 @@ import os
 from os import path
 import sys
 import pathlib
-from datetime import datetime
-import dateutil
+import time
+import threading
+import multiprocessing
+import json
+from bisect import bisect_left, bisect_right
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+import numpy as np
 import pandas as pd
 #sys.path.append(os.path.join(pathlib.Path(__file__).parent.absolute(), 'lib/'))
 import lib.iolibs as io
+import lib.dayArchive as archive
 from lib.jsonReader import JSONReader
+from lib.dayCache import DayCache
+from lib.ringBuffer import RingBuffer
+from lib.downsample import aggregate, aggregate_chunks
+from lib.dateParser import parse_file_date
+from etl.QueryOptions import QueryOptions
+from etl.decoders.decoder_ttn import ENLINK_INTEGER_FIELDS
 
-class FileManager:
-    def __init__(self, filedb_cfg, logger=logging.getLogger()):
+
+def decode_day_file(fpath, parameters, fast=True, rollup=None, window=None, logger=logging.getLogger()):
+    #module level so it can be sent to the read process pool
+    #rollup (bucket_sec, agg) aggregates the day in the worker, only the buckets are sent back
+    #window (ts_from, ts_to) only decodes (and keeps) the readings of that part of the day
+    json_reader = JSONReader(fpath, parameters, logger=logger, fast=fast)
+    json_reader.read_day_file(*(window or (None, None)))
+    df = trim_frame(json_reader.df, window)
+    if(rollup is not None): return aggregate(df, *rollup)
+    return df
+
+
+def trim_frame(df, window):
+    #readings of a day frame with ts_from <= acp_ts <= ts_to (epoch)
+    if(window is None or df.empty or "acp_ts" not in df.columns): return df
+    acp_ts=df["acp_ts"].astype("float").to_numpy()
+    return df[(acp_ts >= window[0]) & (acp_ts <= window[1])]
+
+
+def window_frame(df, parameters):
+    #the same frame whether a window was trimmed from a cached day or decoded on its own: columns follow their first
+    #appearance in the lines read and integer fields are only int64 without missing values in the lines read, so
+    #columns are put in the order of parameters, integer fields cast again and rows numbered from 0
+    columns=[name for name in parameters if name in df.columns] + [name for name in df.columns if name not in parameters]
+    df=df[columns]
+    for name in df.columns:
+        if(name in ENLINK_INTEGER_FIELDS and df[name].dtype!="int64" and not df[name].isna().any()): df[name]=df[name].astype("int64")
+    return df if "dp_ts" in df.columns else df.reset_index(drop=True)
+
+
+class FileManager(QueryOptions):
+    def __init__(self, filedb_cfg, logger=logging.getLogger(), sensor_parameters=None):
         self.logger=logger
         self.filedb_cfg=filedb_cfg
+        self.sensor_parameters=sensor_parameters or dict() #sensor type -> parameters, for the ring files
         self.init_db()
         
     def init_db(self):
         self.default_start_date = datetime(2020, 1, 1, 0, 0) #default start date
         
+        #live messages are appended as raw lines to day files in fs_store_path (not stored if not configured),
+        #the archive layout <fs_store_path>/<acp_id>/<acp_id>_YYYY-MM-DD.txt can be listed in fs_data_paths
+        #(created here, data paths that do not exist are not listed)
+        self.store_path=self.filedb_cfg.get("fs_store_path") or None
+        if(self.store_path is not None): os.makedirs(self.store_path, exist_ok=True)
+
         data_paths = self.filedb_cfg["fs_data_paths"]
         if(not isinstance(data_paths, list)):
            data_paths=[self.filedb_cfg["fs_data_paths"]]
@@ -30,61 +82,478 @@ class FileManager:
         self.filedb_cfg["fs_data_paths"]=data_paths
 
         self.sensor_paths, self.sensor_list=self.getSensorPaths(self.filedb_cfg["fs_data_paths"])
+
+        #in-memory index of sensor -> sorted day files, refreshed by checking directory mtimes
+        self.index_refresh_sec=self.filedb_cfg.get("fs_index_refresh_sec", 60)
+        self.index_lock=threading.Lock()
+        self.file_dates=dict() #file name -> date, names are only parsed the first time they are listed
+        self.build_index()
+
+        #decoded closed day files are cached in fs_cache_path (disabled if not configured)
+        self.day_cache=None
+        if(self.filedb_cfg.get("fs_cache_path")):
+            self.day_cache=DayCache(self.filedb_cfg["fs_cache_path"], logger=self.logger)
+
+        #archived lines are read through the JSONReader fast path unless disabled
+        self.fast_reader=self.filedb_cfg.get("fs_fast_reader", True)
+
+        #day files are decoded in a process pool when a query needs at least fs_parallel_min_files of them
+        self.read_workers=self.filedb_cfg.get("fs_read_workers", 0)
+        self.read_chunksize=self.filedb_cfg.get("fs_read_chunksize", 1)
+        self.parallel_min_files=self.filedb_cfg.get("fs_parallel_min_files", 4)
+        self.read_pool=None
+        self.read_pool_lock=threading.Lock()
+
+        #recent readings of each sensor are also kept in a memory-mapped ring file in fs_ring_path (fs_ring_records
+        #per sensor), filled by the live messages and read first for recent windows (disabled if not configured)
+        self.ring_path=self.filedb_cfg.get("fs_ring_path") or None
+        self.ring_records=self.filedb_cfg.get("fs_ring_records", 8640)
+        self.rings=dict()
+        self.rings_lock=threading.Lock()
         
     def check_path_in_fs(self, dpath):
         return path.exists(dpath) and path.isdir(dpath)
 
 
-    def store(self, message):
-        #self.logger.info("Message: " + str(message))
-        pass
+    def store(self, message, raw=None):
+        self.store_many([message], [raw])
+
+    def store_many(self, messages, raws=None):
+        if(self.ring_path is not None): self.store_rings(messages)
+        #raw lines are grouped by day file, each file is opened once per batch
+        if(self.store_path is None or raws is None): return
+        lines=dict()
+        for message, raw in zip(messages, raws):
+            sensor=(message or dict()).get("sensor") or dict()
+            if(raw is None or "acp_id" not in sensor or sensor.get("acp_ts") is None): continue
+            if(isinstance(raw, bytes)): raw=raw.decode("utf-8", errors="replace")
+            elif(not isinstance(raw, str)): raw=json.dumps(raw)
+            day=datetime.fromtimestamp(float(sensor["acp_ts"])).strftime("%Y-%m-%d")
+            fpath=path.join(self.store_path, sensor["acp_id"], sensor["acp_id"] + "_" + day + ".txt")
+            lines.setdefault(fpath, []).append(raw.replace("\n", " ").strip() + "\n")
+        for fpath, day_lines in lines.items():
+            try:
+                os.makedirs(path.dirname(fpath), exist_ok=True)
+                with open(fpath, "a") as day_file:
+                    day_file.writelines(day_lines)
+            except OSError as e:
+                self.logger.error("FileManager.store_many - Could not append " + str(len(day_lines)) + " lines to " + fpath + ": " + str(e))
 
 
     def read(self, query):
+        self.refresh_index()
+        if(not self.check_sensor_in_fs(query)): return
+        dt_from, dt_to = self.getTimeRange(query)
+        self.logger.info("Request made from " + str(dt_from) + " to " + str(dt_to))
+
+        limit, order = self.getLimitOrder(query)
+        rollup = self.getRollup(query)
+        df=self.read_from_ring(query["acp_id"], dt_from, dt_to, query["parameters"], limit, order, rollup)
+        if(df is not None): return df
+        if(rollup is not None):
+            #buckets of the days (cached per day file), limit and order apply to the buckets
+            df=self.readFromFS(self.sensor_paths[query["acp_id"]], query["acp_id"], dt_from, dt_to, query["parameters"], rollup)
+            return self.limit_order(df, limit, order)
+        if(limit is None and order=="asc"):
+            return self.readFromFS(self.sensor_paths[query["acp_id"]], query["acp_id"], dt_from, dt_to, query["parameters"])
+
+        #most recent readings first: only the tails of the newest day files are decoded
+        df=self.read_tail(query["acp_id"], dt_from, dt_to, query["parameters"], limit, ts_from=dt_from.timestamp())
+        return df.iloc[::-1] if order=="desc" else df
+
+    def read_from_ring(self, acp_id, dt_from, dt_to, parameters, limit, order, rollup):
+        #recent windows are read from the ring file of the sensor, if it has all the readings since dt_from
+        #(None otherwise, the day files are then read)
+        df=self.read_ring(acp_id, dt_from, dt_to, parameters, limit if rollup is None else None)
+        if(df is None): return None
+        if(rollup is not None): df=aggregate(df, *rollup)
+        return self.limit_order(df, limit, order)
+
+    def read_batch(self, queries):
+        #reads the queries of several sensors (e.g., a floor) at once: the index is refreshed once and the day files
+        #of all the sensors are decoded together, so the read pool works across sensors. Returns acp_id -> df
+        self.refresh_index()
+        results=dict()
+        plans=dict() #(parameters, rollup) -> [(acp_id, dates, fp_data_files, windows, limit, order)]
+        for query in queries:
+            if(not self.check_sensor_in_fs(query)):
+                results[query.get("acp_id")]=None
+                continue
+            dt_from, dt_to = self.getTimeRange(query)
+            limit, order = self.getLimitOrder(query)
+            rollup = self.getRollup(query)
+            df=self.read_from_ring(query["acp_id"], dt_from, dt_to, query["parameters"], limit, order, rollup)
+            if(df is not None):
+                results[query["acp_id"]]=df
+                continue
+            if(rollup is None and (limit is not None or order=="desc")):
+                #the tail reads only decode the end of the day files
+                df=self.read_tail(query["acp_id"], dt_from, dt_to, query["parameters"], limit, ts_from=dt_from.timestamp())
+                results[query["acp_id"]]=df.iloc[::-1] if order=="desc" else df
+                continue
+            dates, fp_data_files = self.file_index.get(query["acp_id"], ([], []))
+            first, last = bisect_left(dates, self.day_start(dt_from)), bisect_right(dates, dt_to)
+            windows=[self.day_window(file_date, dt_from, dt_to) for file_date in dates[first:last]]
+            plans.setdefault((tuple(query["parameters"]), rollup), []).append((query["acp_id"], dates[first:last], fp_data_files[first:last], windows, limit, order))
+
+        for (parameters, rollup), sensors in plans.items():
+            fpaths=[fpath for sensor in sensors for fpath in sensor[2]]
+            file_dates=[file_date for sensor in sensors for file_date in sensor[1]]
+            windows=[window for sensor in sensors for window in sensor[3]]
+            day_frames=self.read_day_files(fpaths, file_dates, list(parameters), rollup, windows)
+            start=0
+            for acp_id, dates, _, _, limit, order in sensors:
+                df=self.concat_days(day_frames[start:start+len(dates)])
+                start+=len(dates)
+                if(rollup is not None): df=aggregate(df, *rollup)
+                results[acp_id]=self.limit_order(df, limit, order)
+        return results
+
+    def read_iter(self, query):
+        #yields the data of each day file in range (oldest first), a long range is never held in memory at once
+        self.refresh_index()
+        if(not self.check_sensor_in_fs(query)): return
+        dt_from, dt_to = self.getTimeRange(query)
+        rollup = self.getRollup(query)
+        chunks=self.read_days(query["acp_id"], dt_from, dt_to, query["parameters"], rollup)
+        #buckets spanning two day files are completed with the next day before they are yielded
+        if(rollup is not None): chunks=aggregate_chunks(chunks, *rollup)
+        for f_data in chunks:
+            if(not f_data.empty): yield f_data
+
+    def read_days(self, acp_id, dt_from, dt_to, parameters, rollup=None):
+        #frame of each day file in range, sorted by time (buckets only for the days they tile, see day_rollup)
+        dates, fp_data_files = self.file_index.get(acp_id, ([], []))
+        first, last = bisect_left(dates, self.day_start(dt_from)), bisect_right(dates, dt_to)
+        for i in range(first, last):
+            f_data=self.read_day_file(fp_data_files[i], dates[i], parameters, self.day_rollup(dates[i], rollup), self.day_window(dates[i], dt_from, dt_to))
+            if(f_data.empty): continue
+            f_data['acp_ts']=f_data['acp_ts'].astype('float')
+            f_data.sort_values(by='acp_ts', inplace = True)
+            yield f_data
+
+    def check_sensor_in_fs(self, query):
         if(not ("acp_id" in query and query["acp_id"] in self.sensor_list)):
             if(not "acp_id" in query):
-                self.logger.warnign("FileManager.read - Sensor acp_id missing")
+                self.logger.warning("FileManager.read - Sensor acp_id missing")
             else: self.logger.warn("FileManager.read - Sensor acp_id not in file system: " + str(query["acp_id"]))
             self.logger.warn("FileManager.read - Sensor list in FS: " + str(self.sensor_list))
-            return
-        dt_from, dt_to = self.getTimeRange(query)
-        self.logger.info("Request made from " + str(dt_from) + " to " + str(dt_to))
+            return False
+        return True
+
+    def readFromFS(self, sensor_path, acp_id, dt_from, dt_to, parameters, rollup=None):
+        dates, fp_data_files = self.file_index.get(acp_id, ([], []))
+        min_date = dates[0] if dates else -1
+        max_date = dates[-1] if dates else -1
+        #the index is sorted by date, so the files in range are a contiguous slice
+        #day frames are collected first and concatenated once (concat in the loop is quadratic)
+        first, last = bisect_left(dates, self.day_start(dt_from)), bisect_right(dates, dt_to)
+        windows=[self.day_window(file_date, dt_from, dt_to) for file_date in dates[first:last]]
+        day_frames=self.read_day_files(fp_data_files[first:last], dates[first:last], parameters, rollup, windows)
+        df=self.concat_days(day_frames)
+        if(rollup is not None): df=aggregate(df, *rollup)
+        if(df.empty):
+            self.logger.warn("NO DATA RETRIEVED FOR " + str(acp_id) + " from " + str(dt_from) + " to " + str(dt_to) + " in " + str(sensor_path) + " with parameters " + str(parameters))
+            self.logger.warn("AVAILABLE DATA between " + str(min_date) + " and " + str(max_date))
+
+        return df
+
+
+    def read_latest(self, acp_id, parameters, n=1, days=2):
+        #last n readings of a sensor in its day files of the last days (and today)
+        self.refresh_index()
+        dt_to=datetime.now()
+        dt_from=self.day_start(dt_to)-timedelta(days=days)
+        df=self.read_ring(acp_id, dt_from, dt_to, parameters, n)
+        if(df is not None): return self.limit_order(df, n, "asc")
+        return self.read_tail(acp_id, dt_from, dt_to, parameters, n)
+
+    def get_ring(self, acp_id, writer=False):
+        #ring file of a sensor, None if there is none (readers) or its sensor type has no parameters (writer)
+        with self.rings_lock:
+            ring=self.rings.get(acp_id)
+            fpath=path.join(self.ring_path, acp_id + ".ring")
+            if(ring is not None and ring.writer): return ring
+            if(ring is not None and not writer and self.file_inode(fpath)==ring.inode): return ring
+            ring=None
+            try:
+                if(writer):
+                    parameters=self.sensor_parameters.get("-".join(acp_id.split("-")[:2]))
+                    if(not parameters): return None
+                    ring=RingBuffer(fpath, parameters, self.ring_records, writer=True, logger=self.logger)
+                elif(path.exists(fpath)): ring=RingBuffer(fpath, logger=self.logger)
+            except (OSError, ValueError) as e:
+                self.logger.error("FileManager.get_ring - Could not open " + fpath + ": " + str(e))
+                return None
+            if(ring is not None): self.rings[acp_id]=ring
+            return ring
+
+    def store_rings(self, messages):
+        rows=dict()
+        for message in messages:
+            sensor=(message or dict()).get("sensor") or dict()
+            if("acp_id" not in sensor or sensor.get("acp_ts") is None): continue
+            rows.setdefault(sensor["acp_id"], []).append(message)
+        for acp_id, sensor_messages in rows.items():
+            ring=self.get_ring(acp_id, writer=True)
+            if(ring is None): continue
+            json_reader=JSONReader(None, ring.parameters, logger=self.logger)
+            ring.append([(float(message["sensor"]["acp_ts"]), json_reader.filter_message(message) or dict()) for message in sensor_messages])
 
-        return self.readFromFS(self.sensor_paths[query["acp_id"]], query["acp_id"], dt_from, dt_to, query["parameters"])
-
-    def readFromFS(self, sensor_path, acp_id, dt_from, dt_to, parameters):
-        data_files, fp_data_files=io.ls(sensor_path, recursive=True, ls_type="file")
-        #self.logger.info("data_files - " + str(len(data_files)) + " - " + str(len(fp_data_files)))
-        #self.logger.info(data_files)
-        #to do: add file data into a df only if in time range
-        # check lib/jsonReader 
-        df=pd.DataFrame()
-        min_date=-1
-        max_date=-1
-        for i, f in enumerate(data_files):
-            file_date=self.extract_datetime_from_filename(f)
-            if(min_date==-1 or min_date>file_date): min_date=file_date
-            if(max_date==-1 or max_date<file_date): max_date=file_date
-
-            fileinrange=self.data_fileInRange(f, dt_from, dt_to)
-            #self.logger.debug(f + " - in [" + str(dt_from) + ", " + str(dt_to) + "]: "  + str(fileinrange))
-            if(fileinrange):
-                #json_reader = JSONReader(fp_data_file[i], logger=self.logger)
-                json_reader = JSONReader(fp_data_files[i], parameters, logger=self.logger)
-                json_reader.read_day_file()
-                f_data = json_reader.df
-                #self.logger.debug(f_data)
-                df=pd.concat([df,f_data])
+    def read_ring(self, acp_id, dt_from, dt_to, parameters, n=None):
+        #frame as read from the day files, None if the ring does not hold every reading of the window
+        #(with n, only the last n readings are needed and the ring is enough if it has them)
+        if(self.ring_path is None): return None
+        ring=self.get_ring(acp_id)
+        if(ring is None): return None
+        names=[p for p in parameters if p not in ("acp_id", "acp_ts")]
+        if(not names or any(name not in ring.columns for name in names)): return None
+        records, valid_from = ring.read(dt_from.timestamp(), dt_to.timestamp())
+        if(records is None): return None
+        #every reading is kept, also those without any requested parameter (NaN), as in the day files
+        records=records[records["acp_ts"] >= valid_from]
+        if(dt_from.timestamp() < valid_from and (n is None or len(records) < n)): return None
+        if(n is not None): records=records[len(records)-min(n, len(records)):]
+
+        df=pd.DataFrame({"acp_ts": records["acp_ts"]})
+        for name in names:
+            #float32 values back to the 3 decimals of the decoded payloads
+            df[name]=np.round(ring.values(records, name).astype(np.float64), 3)
+        df=df.dropna(axis=1, how="all")
+        for name in df.columns:
+            if(name in ENLINK_INTEGER_FIELDS and not df[name].isna().any()): df[name]=df[name].astype("int64")
+        df.insert(0, "acp_id", acp_id)
+        return df
+
+    def read_tail(self, acp_id, dt_from, dt_to, parameters, n, ts_from=None):
+        #walks the day files in range from the newest one and only reads their tails until n readings are found
+        #(n None for no limit), or until a reading older than ts_from (epoch). Readings after dt_to are skipped
+        dates, fp_data_files = self.file_index.get(acp_id, ([], []))
+        first, last = bisect_left(dates, self.day_start(dt_from)), bisect_right(dates, dt_to)
+        day_frames=list()
+        found=0
+        for i in reversed(range(first, last)):
+            if(n is not None and found>=n): break
+            if(n is None and (ts_from is None or dates[i].timestamp()>=ts_from)):
+                #without limit the whole day is needed, the bulk (and cached) path is faster
+                f_data, reached_ts_from = self.read_day_file(fp_data_files[i], dates[i], parameters, window=self.day_window(dates[i], dates[i], dt_to)), False
+            else:
+                def read_file_tail(fpath):
+                    json_reader = JSONReader(fpath, parameters, logger=self.logger, fast=self.fast_reader)
+                    reached_ts_from=json_reader.read_day_file_tail(None if n is None else n-found, ts_from, ts_to=dt_to.timestamp())
+                    return json_reader.df, reached_ts_from
+                f_data, reached_ts_from = self.retry_reindexed(read_file_tail, fp_data_files[i], dates[i]) or (pd.DataFrame(), False)
+            if(not f_data.empty):
+                day_frames.insert(0, f_data)
+                found+=len(f_data)
+            if(reached_ts_from): break
+        return self.concat_days(day_frames)
+
+    def concat_days(self, day_frames):
+        #one frame sorted by time from the frames of several day files
+        day_frames=[f_data for f_data in day_frames if not f_data.empty]
+        df=pd.concat(day_frames) if day_frames else pd.DataFrame()
         if(not df.empty):
             df['acp_ts']=df['acp_ts'].astype('float')
             df.sort_values(by='acp_ts', inplace = True)
-            #self.logger.info(df)
+        return df
+
+    def read_day_files(self, fpaths, file_dates, parameters, rollup=None, windows=None):
+        #returns one frame per day file, in the same order as fpaths
+        #windows (ts_from, ts_to) per file for the days only partly in range (see day_window), None for whole days
+        #the days the buckets do not tile are returned raw (see day_rollup), the caller aggregates the concatenation
+        windows=windows or [None]*len(fpaths)
+        rollups=[self.day_rollup(file_date, rollup) for file_date in file_dates]
+        if(self.read_workers<=1 or len(fpaths)<self.parallel_min_files):
+            return [self.read_day_file(fpath, file_date, parameters, day_rollup, window) for fpath, file_date, day_rollup, window in zip(fpaths, file_dates, rollups, windows)]
+
+        frames=[None]*len(fpaths)
+        for i, fpath in enumerate(fpaths):
+            if(windows[i] is not None):
+                #the partial days at the ends of the range are read on their own
+                frames[i]=self.read_day_file(fpath, file_dates[i], parameters, rollups[i], windows[i])
+                continue
+            if(not self.is_cacheable(file_dates[i])): continue
+            frames[i]=self.day_cache.load(fpath, parameters, self.rollup_variant(rollups[i]))
+            if(frames[i] is None and rollups[i] is not None):
+                #new rollup of a day already decoded
+                stat=self.file_stat(fpath)
+                f_data=self.day_cache.load(fpath, parameters)
+                if(f_data is not None):
+                    frames[i]=aggregate(f_data, *rollups[i])
+                    self.day_cache.store(fpath, parameters, frames[i], stat, self.rollup_variant(rollups[i]))
+        pending=[i for i, f_data in enumerate(frames) if f_data is None]
+
+        if(len(pending)<self.parallel_min_files):
+            for i in pending: frames[i]=self.read_day_file(fpaths[i], file_dates[i], parameters, rollups[i])
+            return frames
+
+        #the cache entries are keyed on the day files as they were before they were decoded
+        stats={i: self.file_stat(fpaths[i]) for i in pending if self.is_cacheable(file_dates[i])}
+        try:
+            decoded=self.get_read_pool().map(decode_day_file, [fpaths[i] for i in pending], repeat(parameters), repeat(self.fast_reader), [rollups[i] for i in pending], chunksize=self.read_chunksize)
+            for i, f_data in zip(pending, decoded):
+                frames[i]=f_data
+                if(i in stats): self.day_cache.store(fpaths[i], parameters, f_data, stats[i], self.rollup_variant(rollups[i]))
+        except BrokenProcessPool as bpe:
+            self.logger.error("FileManager.read_day_files - Read pool failed, decoding sequentially: " + str(bpe))
+            with self.read_pool_lock:
+                if(self.read_pool is not None): self.read_pool.shutdown(wait=False, cancel_futures=True)
+                self.read_pool=None
+            for i in pending:
+                if(frames[i] is None): frames[i]=self.read_day_file(fpaths[i], file_dates[i], parameters, rollups[i])
+        except OSError as e:
+            #a day file was removed or renamed since the index was built, read_day_file lists its sensor again
+            self.logger.warning("FileManager.read_day_files - Could not read a day file, decoding the rest sequentially: " + str(e))
+            for i in pending:
+                if(frames[i] is None): frames[i]=self.read_day_file(fpaths[i], file_dates[i], parameters, rollups[i])
+        return frames
+
+    def read_day_file(self, fpath, file_date, parameters, rollup=None, window=None):
+        f_data = self.retry_reindexed(lambda fpath: self.decode_day(fpath, file_date, parameters, rollup, window), fpath, file_date)
+        return pd.DataFrame() if f_data is None else f_data
+
+    def retry_reindexed(self, read, fpath, file_date):
+        #read(fpath), or read(day file of the same date) after listing the sensor again if fpath can not be read:
+        #day files are removed or renamed (e.g., compacted) between two refreshes of the index. None if the day is gone
+        try:
+            return read(fpath)
+        except OSError as e:
+            self.logger.warning("FileManager.retry_reindexed - Could not read " + fpath + ", listing its sensor again: " + str(e))
+            fpath = self.reindexed_path(fpath, file_date)
+            return None if fpath is None else read(fpath)
+
+    def reindexed_path(self, fpath, file_date):
+        #day file of file_date once the sensor of fpath is listed again, None if it has none
+        acp_id = path.basename(fpath).rsplit("_", 1)[0]
+        if(acp_id not in self.sensor_paths): return None
+        with self.index_lock:
+            self.index_sensor(acp_id)
+        dates, fp_data_files = self.file_index.get(acp_id, ([], []))
+        i = bisect_left(dates, file_date)
+        return fp_data_files[i] if i < len(dates) and dates[i]==file_date else None
+
+    def decode_day(self, fpath, file_date, parameters, rollup=None, window=None):
+        cacheable = self.is_cacheable(file_date)
+        if(window is not None):
+            #part of the day, not cached: a cached whole day is trimmed, otherwise only the window is decoded
+            f_data = self.day_cache.load(fpath, parameters) if cacheable else None
+            if(f_data is not None): f_data = trim_frame(f_data, window)
+            else: f_data = decode_day_file(fpath, parameters, self.fast_reader, window=window, logger=self.logger)
+            f_data = window_frame(f_data, parameters)
+            return f_data if rollup is None else aggregate(f_data, *rollup)
+
+        variant = self.rollup_variant(rollup)
+        if(cacheable):
+            f_data = self.day_cache.load(fpath, parameters, variant)
+            if(f_data is not None): return f_data
+            #taken before decoding: lines appended during the decode must invalidate the cache entry
+            stat = os.stat(fpath)
+
+        if(rollup is not None):
+            #rollups are built from the decoded day, which is cached on its own
+            f_data = aggregate(self.read_day_file(fpath, file_date, parameters), *rollup)
         else:
-            self.logger.warn("NO DATA RETRIEVED FOR " + str(acp_id) + " from " + str(dt_from) + " to " + str(dt_to) + " in " + str(sensor_path) + " with parameters " + str(parameters))
-            self.logger.warn("AVAILABLE DATA between " + str(min_date) + " and " + str(max_date))
+            f_data = decode_day_file(fpath, parameters, self.fast_reader, logger=self.logger)
+        if(cacheable): self.day_cache.store(fpath, parameters, f_data, stat, variant)
+        return f_data
 
-        return df
+    def day_window(self, file_date, dt_from, dt_to):
+        #(ts_from, ts_to) of a day file only partly in [dt_from, dt_to], None if the range covers the whole day
+        day_end=file_date+timedelta(days=1)-timedelta(microseconds=1)
+        if(dt_from <= file_date and dt_to >= day_end): return None
+        return dt_from.timestamp(), dt_to.timestamp()
+
+    def day_rollup(self, file_date, rollup):
+        #buckets are aligned to the epoch and day files split at local midnight: a day file is only aggregated
+        #(and its buckets cached) on its own if the buckets tile it, otherwise its buckets may span two days
+        if(rollup is None): return None
+        day_from, day_to = file_date.timestamp(), (file_date+timedelta(days=1)).timestamp()
+        return rollup if day_from % rollup[0]==0 and day_to % rollup[0]==0 else None
+
+    def rollup_variant(self, rollup):
+        #day cache key of the rollups (e.g., rollup-900-mean)
+        return None if rollup is None else "rollup-" + str(rollup[0]) + "-" + rollup[1]
+
+    def is_cacheable(self, file_date):
+        #only closed days are cached, today's file is still growing
+        return self.day_cache is not None and file_date.date() < datetime.now().date()
 
+    def get_read_pool(self):
+        with self.read_pool_lock:
+            if(self.read_pool is None):
+                #workers are forked from a fork server process that runs no threads (it imports this module once):
+                #forking the API itself (MQTT, write-behind and history threads running) could copy a lock held by
+                #another thread into a worker. As with spawn, workers also import the __main__ module when they start
+                context=multiprocessing.get_context("forkserver")
+                context.set_forkserver_preload(["etl.FileManager"])
+                self.read_pool=ProcessPoolExecutor(max_workers=self.read_workers, mp_context=context)
+            return self.read_pool
+
+    def build_index(self):
+        self.file_index=dict()
+        self.dir_mtimes=dict()
+        for acp_id in self.sensor_list:
+            self.index_sensor(acp_id)
+        self.data_path_mtimes={dpath: self.dir_mtime(dpath) for dpath in self.filedb_cfg["fs_data_paths"]}
+        self.index_checked_at=time.time()
+
+    def index_sensor(self, acp_id):
+        entries=list()
+        dir_mtimes=dict()
+        pending=[self.sensor_paths[acp_id]]
+        while pending:
+            dpath=pending.pop()
+            try:
+                dir_mtimes[dpath]=self.dir_mtime(dpath)
+                with os.scandir(dpath) as it:
+                    for entry in it:
+                        if(entry.is_dir()): pending.append(entry.path)
+                        elif(entry.is_file()):
+                            if(not archive.is_day_file(entry.name)): continue
+                            file_date=self.file_dates.get(entry.name)
+                            if(file_date is None):
+                                file_date=self.extract_datetime_from_filename(entry.name)
+                                if(file_date is None): continue
+                                self.file_dates[entry.name]=file_date
+                            entries.append((file_date, entry.path))
+            except OSError as e:
+                self.logger.warning("FileManager.index_sensor - Could not list " + dpath + ": " + str(e))
+        entries.sort()
+        self.file_index[acp_id]=([e[0] for e in entries], [e[1] for e in entries])
+        self.dir_mtimes[acp_id]=dir_mtimes
+
+    def refresh_index(self):
+        #new day files (and new sensors) change the mtime of their parent directory
+        if(time.time()-self.index_checked_at < self.index_refresh_sec): return
+        with self.index_lock:
+            if(time.time()-self.index_checked_at < self.index_refresh_sec): return
+            if(any(self.dir_mtime(dpath)!=mtime for dpath, mtime in self.data_path_mtimes.items())):
+                self.sensor_paths, self.sensor_list=self.getSensorPaths(self.filedb_cfg["fs_data_paths"])
+                self.data_path_mtimes={dpath: self.dir_mtime(dpath) for dpath in self.filedb_cfg["fs_data_paths"]}
+            for acp_id in self.sensor_list:
+                dir_mtimes=self.dir_mtimes.get(acp_id)
+                if(dir_mtimes is None or any(self.dir_mtime(dpath)!=mtime for dpath, mtime in dir_mtimes.items())):
+                    self.index_sensor(acp_id)
+            self.index_checked_at=time.time()
+
+    def file_stat(self, fpath):
+        try:
+            return os.stat(fpath)
+        except OSError:
+            return None
+
+    def file_inode(self, fpath):
+        try:
+            return os.stat(fpath).st_ino
+        except OSError:
+            return None
+
+    def dir_mtime(self, dpath):
+        try:
+            return os.stat(dpath).st_mtime_ns
+        except OSError:
+            return None
 
     def getSensorPaths(self, data_paths):
         sensor_paths_list=list()
@@ -101,35 +570,10 @@ class FileManager:
         
         return sensor_paths, sensor_list
 
-    def getTimeRange(self, query):
-        datetime_from = self.default_start_date
-        datetime_to=datetime.now()
-        if("from" in query):
-            try:
-                datetime_from=dateutil.parser.parse(query["from"],dayfirst=True)
-                #print(query["from"], datetime_from)
-            except ValueError as ve:
-                self.logger.warn(ve)
-                datetime_from = self.default_start_date
-    
-        if("to" in query):
-            if(query["to"]=="now"): datetime_to=datetime.now()
-            else:
-                try:
-                    datetime_to=dateutil.parser.parse(query["to"],dayfirst=True)
-                    #print(query["to"], datetime_to)
-                except ValueError as ve:
-                    self.logger.warn(ve)
-                    datetime_to=datetime.now()
-        return datetime_from, datetime_to       
-
     def extract_datetime_from_filename(self, file_name):
-        #expected file_name format acp_id_YYYY-MM-DD.txt - e.g., 'enl-iaqco3-081622_2023-04-03.txt'
-        file_date_str=file_name.split("_")[-1].split(".")[0] #should get the following format YYYY-MM-DD
-        try:
-            file_date=datetime.strptime(file_date_str, '%Y-%m-%d')
-        except ValueError as ve:
-            self.logger.error("Error while extracting the datetime from filename: " + file_name)
+        #expected file_name format acp_id_YYYY-MM-DD.txt[.gz|.zst] - e.g., 'enl-iaqco3-081622_2023-04-03.txt'
+        file_date=parse_file_date(file_name)
+        if(file_date is None): self.logger.error("Error while extracting the datetime from filename: " + file_name)
         return file_date
                     
     def data_fileInRange(self, file_name, dt_from, dt_to):
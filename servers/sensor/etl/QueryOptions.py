@@ -0,0 +1,66 @@
+import logging
+from datetime import datetime
+
+from lib.downsample import parse_bucket, AGGREGATIONS
+from lib.dateParser import parse_datetime
+
+
+class QueryOptions:
+    #query options shared by the database managers (time range, limit/order and buckets)
+    default_start_date = datetime(2020, 1, 1, 0, 0)
+    logger = logging.getLogger()
+
+    def getTimeRange(self, query):
+        datetime_from = self.default_start_date
+        datetime_to=datetime.now()
+        #bounds are DD/MM/YYYY or ISO strings, epoch seconds or datetimes (see lib.dateParser)
+        #a date alone in "to" includes that whole day
+        if("from" in query):
+            try:
+                datetime_from=parse_datetime(query["from"])
+            except ValueError as ve:
+                self.logger.warn(ve)
+                datetime_from = self.default_start_date
+    
+        if("to" in query):
+            if(query["to"]=="now"): datetime_to=datetime.now()
+            else:
+                try:
+                    datetime_to=parse_datetime(query["to"], end_of_day=True)
+                except ValueError as ve:
+                    self.logger.warn(ve)
+                    datetime_to=datetime.now()
+        return datetime_from, datetime_to       
+
+    def day_start(self, dt):
+        #day files are dated at midnight, a range starting during a day includes the file of that day
+        return datetime(dt.year, dt.month, dt.day)
+
+    def getLimitOrder(self, query):
+        limit=None
+        if(query.get("limit") is not None):
+            try:
+                limit=max(int(query["limit"]), 0)
+            except ValueError as ve:
+                self.logger.warn(ve)
+        order="desc" if str(query.get("order", "asc")).lower()=="desc" else "asc"
+        return limit, order
+
+    def getRollup(self, query):
+        #(bucket_sec, agg) if the query asks for aggregated buckets, None for the raw readings
+        if(query.get("bucket") is None): return None
+        try:
+            bucket_sec=parse_bucket(query["bucket"])
+        except ValueError as ve:
+            self.logger.warn(ve)
+            return None
+        agg=str(query.get("agg") or "mean").lower()
+        if(agg not in AGGREGATIONS):
+            self.logger.warn("Aggregation not valid: " + agg + ", using mean")
+            agg="mean"
+        return bucket_sec, agg
+
+    def limit_order(self, df, limit, order):
+        #df sorted oldest first, limit keeps the most recent rows
+        if(limit is not None): df=df.iloc[len(df)-min(limit, len(df)):]
+        return df.iloc[::-1] if order=="desc" else df
@@ -1,11 +1,22 @@
 import os
 import sys
 import pathlib
+import time
+import sqlite3
+import threading
+from datetime import datetime, timedelta
 #sys.path.append(os.path.join(pathlib.Path(__file__).parent.absolute(), 'lib/'))
 import lib.iolibs as io
 import logging
+import pandas as pd
+from lib.downsample import aggregate, aggregate_chunks
+from etl.QueryOptions import QueryOptions
 
-class SQLManager:
+#sensor fields that are not stored as reading columns (acp_id/acp_ts are the key, payloads are decoded into the parameters)
+SKIPPED_FIELDS = {"acp_id", "acp_ts", "sensor_id", "encoded_payload", "decoded_payload", "cooked_payload"}
+
+
+class SQLManager(QueryOptions):
 
     def __init__(self, filedb_cfg, logger=logging.getLogger()):
         self.logger=logger
@@ -13,25 +24,182 @@ class SQLManager:
         self.init_db()
 
     def init_db(self):
-        self.database = dict()
+        '''
+        SQLite store: one wide row per reading in readings, primary key (acp_id, acp_ts), with one column per
+        parameter (added the first time a parameter is seen), plus the last seen gateways and data connectors.
+        Stored messages are written in one transaction per store_many call (batched by DBManager).
+        '''
+        self.db_path=self.filedb_cfg.get("sql_path", "./db/readings.sqlite")
+        if(os.path.dirname(self.db_path)): os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+
+        #one writer connection, readers get their own connection per thread (WAL lets them read while writing)
+        self.write_lock=threading.Lock()
+        self.connection=self.connect()
+        self.local=threading.local()
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS readings (acp_id TEXT NOT NULL, acp_ts REAL NOT NULL, PRIMARY KEY (acp_id, acp_ts)) WITHOUT ROWID')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS gateways (gateway_id TEXT PRIMARY KEY, gateway_ts REAL, acp_id TEXT)')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS data_connectors (data_connector_id TEXT NOT NULL, data_connector_dev_eui TEXT NOT NULL, data_connector_ts REAL, acp_id TEXT, PRIMARY KEY (data_connector_id, data_connector_dev_eui))')
+        self.columns=self.readColumns()
+
+        self.pending_readings=list()
+        self.pending_gateways=dict()
+        self.pending_data_connectors=dict()
+
+    def connect(self):
+        connection=sqlite3.connect(self.db_path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def reader(self):
+        connection=getattr(self.local, "connection", None)
+        if(connection is None):
+            connection=self.local.connection=self.connect()
+        return connection
 
+    def readColumns(self):
+        return [row[1] for row in self.connection.execute("PRAGMA table_info(readings)")][2:]
 
     def updateSensor(self, sensor_data):
-        pass
+        if(not sensor_data or "acp_id" not in sensor_data or sensor_data.get("acp_ts") is None): return
+        reading={k: v for k, v in sensor_data.items() if k not in SKIPPED_FIELDS}
+        #payload fields merged as in JSONReader.filter_message: decoded payload, then cooked payload
+        decoded=sensor_data.get("decoded_payload")
+        if(isinstance(decoded, dict)): reading.update(decoded["data"] if isinstance(decoded.get("data"), dict) else decoded)
+        if(isinstance(sensor_data.get("cooked_payload"), dict)): reading.update(sensor_data["cooked_payload"])
+        reading={k: v for k, v in reading.items() if isinstance(v, (int, float, str)) or v is None}
+        self.pending_readings.append((sensor_data["acp_id"], float(sensor_data["acp_ts"]), reading))
+
+    def updateGateway(self, gateway_data, acp_id=None):
+        if(not gateway_data or gateway_data.get("gateway_id") is None): return
+        self.pending_gateways[gateway_data["gateway_id"]]=(gateway_data["gateway_id"], gateway_data.get("gateway_ts"), acp_id)
+
+    def updateDataConnector(self, data_connector_data, acp_id=None):
+        if(not data_connector_data or data_connector_data.get("data_connector_id") is None): return
+        key=(data_connector_data["data_connector_id"], data_connector_data.get("data_connector_dev_eui", ""))
+        self.pending_data_connectors[key]=key+(data_connector_data.get("data_connector_ts"), acp_id)
 
-    def updateGateway(self, gateway_data):
-        pass
-    def updateDataConnector(self, data_connector_data):
-        pass
-    
     def updateService(self, service_data):
+        #service messages (notifiers) are not persisted
         pass
 
     def store(self, message):
-        self.updateSensor(message["sensor"])
-        self.updateGateway(message["gateway"])
-        self.updateDataConnector(message["data_connector"])
-        self.updateService(message["service"])
+        self.store_many([message])
+
+    def store_many(self, messages, raws=None):
+        #messages are transformed messages (Decoder.transform), the raw lines are not needed
+        with self.write_lock:
+            for message in messages:
+                if(not message): continue
+                sensor=message.get("sensor") or dict()
+                self.updateSensor(sensor)
+                self.updateGateway(message.get("gateway"), sensor.get("acp_id"))
+                self.updateDataConnector(message.get("data_connector"), sensor.get("acp_id"))
+                self.updateService(message.get("service"))
+            self.write_pending()
+
+    def store_frame(self, acp_id, df):
+        #readings of a decoded day file (JSONReader frame with acp_ts and parameter columns), in one transaction
+        if(df is None or df.empty): return 0
+        parameters=[c for c in df.columns if c not in ("acp_id", "acp_ts")]
+        data=df[parameters].astype(object).where(df[parameters].notna(), None)
+        rows=[(acp_id, float(ts), dict(zip(parameters, values))) for ts, values in zip(df["acp_ts"], data.itertuples(index=False, name=None))]
+        with self.write_lock:
+            self.pending_readings.extend(rows)
+            self.write_pending()
+        return len(rows)
+
+    def close(self):
+        with self.write_lock:
+            self.connection.close()
+
+    def write_pending(self):
+        #the write lock must be held
+        if(not self.pending_readings and not self.pending_gateways and not self.pending_data_connectors): return
+        readings, self.pending_readings = self.pending_readings, list()
+        gateways, self.pending_gateways = self.pending_gateways, dict()
+        data_connectors, self.pending_data_connectors = self.pending_data_connectors, dict()
+        try:
+            with self.connection:
+                self.addColumns({k for _, _, reading in readings for k in reading})
+                #readings with the same parameters share one statement
+                groups=dict()
+                for acp_id, acp_ts, reading in readings:
+                    groups.setdefault(tuple(reading), []).append((acp_id, acp_ts) + tuple(reading.values()))
+                for names, rows in groups.items():
+                    columns=", ".join(self.quote(c) for c in ("acp_id", "acp_ts") + names)
+                    #a reading stored again only updates the parameters it has, the others are kept
+                    update=("DO UPDATE SET " + ", ".join(self.quote(c) + "=excluded." + self.quote(c) for c in names)) if names else "DO NOTHING"
+                    self.connection.executemany("INSERT INTO readings (" + columns + ") VALUES (" + ", ".join("?"*(len(names)+2)) + ") ON CONFLICT (acp_id, acp_ts) " + update, rows)
+                self.connection.executemany("INSERT OR REPLACE INTO gateways VALUES (?, ?, ?)", list(gateways.values()))
+                self.connection.executemany("INSERT OR REPLACE INTO data_connectors VALUES (?, ?, ?, ?)", list(data_connectors.values()))
+        except sqlite3.Error as e:
+            self.logger.error("SQLManager.write_pending - Could not write " + str(len(readings)) + " readings: " + str(e))
+            self.columns=self.readColumns()
+
+    def addColumns(self, names):
+        for name in sorted(set(names)-set(self.columns)):
+            self.connection.execute("ALTER TABLE readings ADD COLUMN " + self.quote(name))
+            self.columns.append(name)
+
+    def quote(self, name):
+        return '"' + str(name).replace('"', '""') + '"'
 
     def read(self, query):
-        pass
+        '''
+        Same queries and DataFrame as FileManager.read: every reading in range with acp_id, acp_ts and the requested
+        parameters that have values, sorted by acp_ts. The range is read from the (acp_id, acp_ts) primary key.
+        '''
+        if(not "acp_id" in query):
+            self.logger.warning("SQLManager.read - Sensor acp_id missing")
+            return
+        dt_from, dt_to = self.getTimeRange(query)
+        limit, order = self.getLimitOrder(query)
+        rollup = self.getRollup(query)
+        self.logger.info("Request made from " + str(dt_from) + " to " + str(dt_to))
+        if(rollup is not None):
+            df=self.select(query["acp_id"], query["parameters"], dt_from.timestamp(), dt_to.timestamp())
+            return self.limit_order(aggregate(df, *rollup), limit, order)
+        df=self.select(query["acp_id"], query["parameters"], dt_from.timestamp(), dt_to.timestamp(), limit)
+        return df.iloc[::-1] if order=="desc" else df
+
+    def read_iter(self, query):
+        #one chunk per day, oldest first (buckets spanning two days are completed with the next day)
+        if(not "acp_id" in query): return
+        dt_from, dt_to = self.getTimeRange(query)
+        rollup = self.getRollup(query)
+        chunks=self.select_days(query["acp_id"], query["parameters"], dt_from, dt_to)
+        if(rollup is not None): chunks=aggregate_chunks(chunks, *rollup)
+        for df in chunks:
+            if(not df.empty): yield df
+
+    def select_days(self, acp_id, parameters, dt_from, dt_to):
+        day=self.day_start(dt_from)
+        while(day <= dt_to):
+            ts_from, ts_to = max(day, dt_from).timestamp(), min(day+timedelta(days=1), dt_to).timestamp()
+            yield self.select(acp_id, parameters, ts_from, ts_to, exclude_to=day+timedelta(days=1) <= dt_to)
+            day+=timedelta(days=1)
+
+    def read_latest(self, acp_id, parameters, n=1, days=2):
+        dt_from=self.day_start(datetime.now())-timedelta(days=days)
+        return self.select(acp_id, parameters, dt_from.timestamp(), time.time(), n)
+
+    def select(self, acp_id, parameters, ts_from, ts_to, limit=None, exclude_to=False):
+        #readings of a sensor between ts_from and ts_to (epoch), the last limit ones if limit is set, oldest first
+        names=[p for p in parameters if p not in ("acp_id", "acp_ts") and p in self.columns]
+        sql="SELECT " + ", ".join(self.quote(p) for p in ["acp_id", "acp_ts"]+names) + " FROM readings WHERE acp_id = ? AND acp_ts >= ? AND acp_ts " + ("<" if exclude_to else "<=") + " ?"
+        args=[acp_id, ts_from, ts_to]
+        if(limit is not None):
+            sql="SELECT * FROM (" + sql + " ORDER BY acp_ts DESC LIMIT ?) ORDER BY acp_ts"
+            args.append(limit)
+        else: sql+=" ORDER BY acp_ts"
+        try:
+            rows=self.reader().execute(sql, args).fetchall()
+        except sqlite3.Error as e:
+            self.logger.error("SQLManager.select - " + str(e))
+            return pd.DataFrame()
+        if(not rows): return pd.DataFrame()
+        df=pd.DataFrame.from_records(rows, columns=["acp_id", "acp_ts"]+names)
+        #parameters without any value in the range are left out, as in the day files
+        return df.dropna(axis=1, how="all")
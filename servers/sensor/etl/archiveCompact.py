@@ -0,0 +1,129 @@
+'''
+Compresses the closed day files of the archive (fs_data_paths) into gzip (or zstd) files made of independent blocks,
+with a block index of the time range of each block (lib.dayArchive), so FileManager only decompresses the blocks
+of the range it reads. acp_id_YYYY-MM-DD.txt becomes acp_id_YYYY-MM-DD.txt.gz (+ .txt.gz.idx), the plain file is
+moved aside while it is compacted and removed once the compressed one is in place. Lines appended later to a
+compacted day (or while it is compacted) go to a new plain file, merged by the next run.
+
+    python -m etl.archiveCompact --cfg ./cfg/basic.cfg [--sensors enl-iaqc-085e9a ...] [--from 01/01/2023] [--to 31/01/2023] [--format gz]
+
+The archive paths are read from the db_cfg of etl_default. Today's files are never compacted.
+'''
+import os
+import sys
+import time
+import logging
+import argparse
+from datetime import datetime
+from bisect import bisect_left, bisect_right
+import lib.iolibs as io
+import lib.dayArchive as archive
+from lib.jsonReader import JSONReader
+from etl.FileManager import FileManager
+
+
+def line_timestamps(lines, logger=logging.getLogger()):
+    #acp_ts of each line (None if it has none), read as in the archive fast path
+    probe=JSONReader(None, ["acp_ts"], logger=logger)
+    timestamps=list()
+    for line in lines:
+        try:
+            timestamps.append(float((probe.read_archive_line(line) or dict())["acp_ts"]))
+        except (KeyError, ValueError, TypeError):
+            timestamps.append(None)
+    return timestamps
+
+
+def compact_day(fpath, method="gz", block_size=131072, logger=logging.getLogger()):
+    #compresses a plain day file (merged with the compressed file of that day, if any), returns (bytes in, bytes out)
+    #the plain file is moved aside first (.tmp files are not day files): lines appended while it is compacted go to a
+    #new plain file, merged by the next run. A FileManager that still lists the plain file lists the sensor again
+    #when it can not open it (FileManager.retry_reindexed): it reads the compressed file once it is in place, and
+    #the previous compressed file, or no reading, for that day while it is compacted
+    target=fpath + "." + method
+    previous=[fpath + suffix for suffix in archive.COMPRESSIONS if os.path.isfile(fpath + suffix)]
+    compacting=fpath + "." + str(os.getpid()) + ".compact.tmp"
+    os.rename(fpath, compacting)
+    try:
+        previous_content, size_in = b"", 0
+        for previous_path in previous:
+            previous_content+=archive.read_bytes(previous_path)
+            size_in+=os.path.getsize(previous_path)
+        while True:
+            size=os.path.getsize(compacting)
+            content=previous_content + archive.read_bytes(compacting)
+            lines=[line if line.endswith(b"\n") else line + b"\n" for line in content.splitlines(keepends=True) if line.strip()]
+            timestamps=line_timestamps(lines, logger)
+            #lines are kept sorted by time (late lines merged from the plain file), lines without acp_ts stay after the previous one
+            keys, last_ts = list(), float("-inf")
+            for ts in timestamps:
+                last_ts=ts if ts is not None else last_ts
+                keys.append(last_ts)
+            order=sorted(range(len(lines)), key=keys.__getitem__)
+            archive.write_archive(target, [lines[i] for i in order], [timestamps[i] for i in order], method, block_size)
+            #a writer that opened the plain file before it was moved may still have appended to it
+            if(os.path.getsize(compacting)==size): break
+    except (OSError, ValueError):
+        restore_day(compacting, fpath, logger)
+        raise
+    os.remove(compacting)
+    for previous_path in previous:
+        #a day compacted before with the other format
+        if(previous_path!=target):
+            os.remove(previous_path)
+            if(os.path.isfile(previous_path + archive.INDEX_SUFFIX)): os.remove(previous_path + archive.INDEX_SUFFIX)
+    return size_in + size, os.path.getsize(target)
+
+
+def restore_day(compacting, fpath, logger=logging.getLogger()):
+    #puts back a plain day file that could not be compacted, unless new lines were appended to a new one meanwhile
+    try:
+        os.link(compacting, fpath)
+        os.remove(compacting)
+    except OSError as e:
+        logger.error("archiveCompact - Could not restore " + fpath + ", its lines are kept in " + compacting + ": " + str(e))
+
+
+def compact(db_cfg, sensors=None, dt_range=None, method="gz", block_size=131072, logger=logging.getLogger()):
+    file_manager=FileManager(dict(db_cfg, fs_cache_path=None), logger=logger)
+    dt_from, dt_to = file_manager.getTimeRange(dt_range or dict())
+    today=file_manager.day_start(datetime.now())
+    total_in, total_out = 0, 0
+    for acp_id in (sensors or file_manager.sensor_list):
+        dates, fp_data_files = file_manager.file_index.get(acp_id, ([], []))
+        first, last = bisect_left(dates, file_manager.day_start(dt_from)), bisect_right(dates, dt_to)
+        start, count, size_in, size_out = time.time(), 0, 0, 0
+        for file_date, fpath in zip(dates[first:last], fp_data_files[first:last]):
+            if(file_date >= today or archive.compression(fpath) is not None): continue
+            try:
+                day_in, day_out = compact_day(fpath, method, block_size, logger)
+            except OSError as e:
+                logger.error("archiveCompact - Could not compact " + fpath + ": " + str(e))
+                continue
+            count+=1
+            size_in+=day_in
+            size_out+=day_out
+        if(count):
+            logger.info("archiveCompact - " + acp_id + ": " + str(count) + " day files, " + str(size_in) + " -> " + str(size_out) + " bytes in " + str(round(time.time()-start, 1)) + "s")
+        total_in+=size_in
+        total_out+=size_out
+    return total_in, total_out
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    argParser = argparse.ArgumentParser(description="Compresses the closed day files of the archive with a block index")
+    argParser.add_argument("-c", "--cfg", default="./cfg/basic.cfg", help="Configuration file path")
+    argParser.add_argument("-s", "--sensors", nargs="*", help="acp_ids to compact (default: all sensors in the archive)")
+    argParser.add_argument("--from", dest="dt_from", help="First day to compact (DD/MM/YYYY or ISO)")
+    argParser.add_argument("--to", dest="dt_to", help="Last day to compact (DD/MM/YYYY or ISO, default: yesterday)")
+    argParser.add_argument("--format", default="gz", choices=["gz", "zst"], help="Compression (zst needs zstandard)")
+    argParser.add_argument("--block-size", type=int, default=131072, help="Bytes of lines per compressed block")
+    args = argParser.parse_args(sys.argv[1:])
+
+    if(args.format=="zst" and archive.zstandard is None):
+        argParser.error("zst compression needs the zstandard package")
+    basic_cfg = io.getBasicConfig(args.cfg)
+    dt_range = {k: v for k, v in (("from", args.dt_from), ("to", args.dt_to)) if v is not None}
+    total_in, total_out = compact(basic_cfg["etl_default"]["db_cfg"], args.sensors, dt_range, args.format, args.block_size)
+    logging.info("archiveCompact - " + str(total_in) + " bytes compacted into " + str(total_out))
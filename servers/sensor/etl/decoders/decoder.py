@@ -11,6 +11,39 @@ from etl.decoders.decoder_ttn import Decoder_TTN
 from etl.decoders.decoder_notifier import Decoder_Notifier
 
 class Decoder():
+    # Registered vendor decoders as (name, decoder class, match function), checked in order: the first match decodes the message.
+    # A match function receives (message, topic) and returns True if the decoder handles the message.
+    registry = list()
+    # One decoder instance per registered name, created on first use
+    instances = dict()
+
+    @staticmethod
+    def register(name, decoder_class, match, before=None):
+        '''
+        Registers a vendor decoder without editing the dispatcher, e.g.:
+        Decoder.register("elsys", Decoder_Elsys, lambda message, topic: topic is not None and "/elsys-" in topic, before="ttn")
+        decoder_class(logger=...) must provide decode(message, topic) returning (sensor, gateway, data_connector[, service]).
+        '''
+        Decoder.unregister(name)
+        position = len(Decoder.registry)
+        for i, (registered_name, _, _) in enumerate(Decoder.registry):
+            if (registered_name == before): position = i
+        Decoder.registry.insert(position, (name, decoder_class, match))
+
+    @staticmethod
+    def unregister(name):
+        Decoder.registry = [entry for entry in Decoder.registry if entry[0] != name]
+        Decoder.instances.pop(name, None)
+
+    @staticmethod
+    def get_decoder(name, logger=logging.getLogger()):
+        decoder = Decoder.instances.get(name)
+        if (decoder is None):
+            for (registered_name, decoder_class, _) in Decoder.registry:
+                if (registered_name == name):
+                    decoder = Decoder.instances[name] = decoder_class(logger=logger)
+        return decoder
+
     @staticmethod
     def transform(msg, topic=None, logger=logging.getLogger()):
         transformed_msg=dict()
@@ -44,30 +77,27 @@ class Decoder():
         sensor_data = dict()
         gateway_data = dict()
         data_connector_data = dict()
-        decoders={
-            "monnit" : Decoder_Monnit(logger=logger),
-            "ifmbms" : Decoder_IFMBMS(logger=logger),
-            "ttn" : Decoder_TTN(logger=logger),
-            "notifier" : Decoder_Notifier(logger=logger)
-        }
         if(message):
             if ("msg_type" in message and message["msg_type"]=="rt_data" and "request_data" in message): #when data from ACP WS
                 message=message["request_data"][0]
                 topic=None
                 #logger.debug("======", message)
 
-            if (topic and "notifier" in topic):
-                #sensor_data, gateway_data, data_connector_data = self.extractTTNData(message, topic)
-                sensor_data, gateway_data, data_connector_data, service_data = decoders["notifier"].decode(message, topic)
-            if ((topic and "monnit" in topic) or "monnit_gw" in message):
-                #sensor_data, gateway_data, data_connector_data = self.extractMonnitData(message, topic)
-                sensor_data, gateway_data, data_connector_data = decoders["monnit"].decode(message, topic)
-            if ((topic and "IfM-BMS" in topic) or "point_id" in message):
-                #sensor_data, gateway_data, data_connector_data = self.extractIfMBMSData(message, topic)
-                sensor_data, gateway_data, data_connector_data = decoders["ifmbms"].decode(message, topic)
-            if ((topic and "ttn" in topic) or "end_device_ids" in message):
-                #sensor_data, gateway_data, data_connector_data = self.extractTTNData(message, topic)
-                sensor_data, gateway_data, data_connector_data = decoders["ttn"].decode(message, topic)
-
+            for (name, _, match) in Decoder.registry:
+                if (match(message, topic)):
+                    decoded = Decoder.get_decoder(name, logger=logger).decode(message, topic)
+                    #only the notifier decoder returns service data
+                    if (len(decoded) == 4):
+                        sensor_data, gateway_data, data_connector_data, service_data = decoded
+                    else:
+                        sensor_data, gateway_data, data_connector_data = decoded
+                    break
 
         return sensor_data, gateway_data, data_connector_data, service_data
+
+
+# Dispatch order keeps the precedence of the former chain of independent ifs, where the last matching decoder won
+Decoder.register("ttn", Decoder_TTN, lambda message, topic: (topic and "ttn" in topic) or "end_device_ids" in message)
+Decoder.register("ifmbms", Decoder_IFMBMS, lambda message, topic: (topic and "IfM-BMS" in topic) or "point_id" in message)
+Decoder.register("monnit", Decoder_Monnit, lambda message, topic: (topic and "monnit" in topic) or "monnit_gw" in message)
+Decoder.register("notifier", Decoder_Notifier, lambda message, topic: topic and "notifier" in topic)
@@ -1,7 +1,6 @@
 import logging
 import pathlib
 import json
-import pandas as pd
 from datetime import datetime
 import sys
 import os
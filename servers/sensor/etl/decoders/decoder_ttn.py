@@ -1,7 +1,6 @@
 import logging
 import pathlib
 import json
-import pandas as pd
 from datetime import datetime
 import sys
 import os
@@ -12,6 +11,165 @@ from etl.decoders.decoder_abs import Decoder_Abstract
 DEBUG = False
 
 import base64
+import math
+import struct
+import numpy as np
+
+# Return gas name from gas type byte
+GAS_NAMES = {
+    0x17: "HCHO_CH2O", # Formaldehyde
+    0x18: "VOCs", # vocs
+    0x19: "CO", # Carbon Monoxide
+    0x1A: "CL2", # Chlorine
+    0x1B: "H2", # Hydrogen
+    0x1C: "H2S", # Hydrogen Sulphide
+    0x1D: "HCl", # Hydrogen Chloride
+    0x1E: "HCN", # Hydrogen Cyanide
+    0x1F: "HF", # Hydrogen Fluoride
+    0x20: "NH3", # Ammonia
+    0x21: "NO2", # Nitrogen Dioxide
+    0x22: "O2", # Oxygen
+    0x23: "O3", # Ozone
+    0x24: "SO2", # Sulfur Dioxide (IUPAC) SO2
+}
+
+ENLINK_COUNTER = 0x0E
+ENLINK_MB_EXCEPTION = 0x0F
+ENLINK_MB_INTERVAL = 0x10
+ENLINK_MB_CUMULATIVE = 0x11
+ENLINK_COS_STATUS = 0x15
+ENLINK_LIQUID_LEVEL_STATUS = 0x16
+ENLINK_LEAK_DETECT_EVT = 0x31
+ENLINK_CPU_TEMP_DEP = 0x40
+ENLINK_GAS_PPB = 0x61
+ENLINK_GAS_UGM3 = 0x66
+ENLINK_CRN_THK = 0x62
+ENLINK_CRN_MIN_THK = 0x63
+ENLINK_CRN_MAX_THK = 0x64
+ENLINK_CRN_PERC = 0x65
+
+U8 = struct.Struct(">B")
+S8 = struct.Struct(">b")
+U16 = struct.Struct(">H")
+S16 = struct.Struct(">h")
+U32 = struct.Struct(">I")
+F32 = struct.Struct(">f")
+
+# Enlink scalar fields: type byte -> (value layout, ((field name, scale), ...))
+# The value follows the type byte; a scale of None keeps the raw integer, F32 values are rounded to 3 decimals.
+ENLINK_FIELDS = {
+    0x01: (S16, (("temperature", 10),)),
+    0x02: (U8, (("humidity", None),)),
+    0x03: (U16, (("lux", None),)),
+    0x04: (U16, (("pressure", None),)),
+    0x05: (U16, (("iaq", None),)), # Indoor Air Quality (0-500)
+    0x06: (U8, (("o2perc", 10),)),
+    0x07: (U16, (("co_ppm", 100),)),
+    0x08: (U16, (("co2_ppm", None),)),
+    0x09: (U16, (("ozone_ppm", 10000), ("ozone_ppb", 10))),
+    0x0A: (U16, (("pollutants_kohm", 10),)),
+    0x0B: (U16, (("pm2_5", None),)),
+    0x0C: (U16, (("pm10", None),)),
+    0x0D: (U16, (("h2s_ppm", 100),)),
+    0x12: (F32, (("bvoc", None),)), # Breath VOC Estimate equivalent
+    0x13: (U32, (("det_count", None),)),
+    0x14: (U32, (("occ_time_s", None),)),
+    0x17: (S16, (("temp_probe_1", 10),)),
+    0x18: (S16, (("temp_probe_2", 10),)),
+    0x19: (S16, (("temp_probe_3", 10),)),
+    0x1A: (U32, (("temp_probe_in_band_duration_s_1", None),)),
+    0x1B: (U32, (("temp_probe_in_band_duration_s_2", None),)),
+    0x1C: (U32, (("temp_probe_in_band_duration_s_3", None),)),
+    0x1D: (U16, (("temp_probe_in_band_alarm_count_1", None),)),
+    0x1E: (U16, (("temp_probe_in_band_alarm_count_2", None),)),
+    0x1F: (U16, (("temp_probe_in_band_alarm_count_3", None),)),
+    0x20: (U32, (("temp_probe_low_duration_s_1", None),)),
+    0x21: (U32, (("temp_probe_low_duration_s_2", None),)),
+    0x22: (U32, (("temp_probe_low_duration_s_3", None),)),
+    0x23: (U16, (("temp_probe_low_alarm_count_1", None),)),
+    0x24: (U16, (("temp_probe_low_alarm_count_2", None),)),
+    0x25: (U16, (("temp_probe_low_alarm_count_3", None),)),
+    0x26: (U32, (("temp_probe_high_duration_s_1", None),)),
+    0x27: (U32, (("temp_probe_high_duration_s_2", None),)),
+    0x28: (U32, (("temp_probe_high_duration_s_3", None),)),
+    0x29: (U16, (("temp_probe_high_alarm_count_1", None),)),
+    0x2A: (U16, (("temp_probe_high_alarm_count_2", None),)),
+    0x2B: (U16, (("temp_probe_high_alarm_count_3", None),)),
+    0x2C: (F32, (("dp_pa", None),)), # +/- 5000 Pa
+    0x2D: (F32, (("af_mps", None),)), # 0 -> 100m/s
+    0x2E: (U16, (("adc_v", 1000),)), # 0 to 10.000 V
+    0x2F: (U16, (("adc_ma", 1000),)), # 0 to 20.000 mA
+    0x30: (U16, (("adc_kohm", 10),)), # 0 to 6553.5 kOhm
+    0x3F: (F32, (("co2e_ppm", None),)), # CO2e Estimate Equivalent
+    0x50: (F32, (("sound_min_dba", None),)),
+    0x51: (F32, (("sound_avg_dba", None),)),
+    0x52: (F32, (("sound_max_dba", None),)),
+    0x53: (U16, (("no_ppm", 100),)), # Nitric Oxide
+    0x54: (U16, (("no2_ppm", 10000),)), # Nitrogen Dioxide scaled at 0-5ppm
+    0x55: (U16, (("no2_20_ppm", 1000),)), # Nitrogen Dioxide scaled at 0-20ppm
+    0x56: (U16, (("so2_ppm", 1000),)), # Sulphur Dioxide 0-20ppm
+    0x57: (F32, (("mc_pm1_0", None),)),
+    0x58: (F32, (("mc_pm2_5", None),)),
+    0x59: (F32, (("mc_pm4_0", None),)),
+    0x5A: (F32, (("mc_pm10_0", None),)),
+    0x5B: (F32, (("nc_pm0_5", None),)),
+    0x5C: (F32, (("nc_pm1_0", None),)),
+    0x5D: (F32, (("nc_pm2_5", None),)),
+    0x5E: (F32, (("nc_pm4_0", None),)),
+    0x5F: (F32, (("nc_pm10_0", None),)),
+    0x60: (F32, (("pm_tps", None),)),
+    0x67: (U16, (("fast_aqi", None),)),
+    0x68: (U16, (("epa_aqi", None),)),
+    0x69: (F32, (("mc_pm0_1", None),)),
+    0x6A: (F32, (("mc_pm0_3", None),)),
+    0x6B: (F32, (("mc_pm0_5", None),)),
+    0x6C: (F32, (("mc_pm5_0", None),)),
+    0x6D: (F32, (("nc_pm0_1", None),)),
+    0x6E: (F32, (("nc_pm0_3", None),)),
+    0x6F: (F32, (("nc_pm5_0", None),)),
+    0x70: (U16, (("de_event", None),)), # Particle Detection Event, not yet identified
+    0x71: (U16, (("de_smoke", None),)), # Smoke particles identified
+    0x72: (U16, (("de_vape", None),)), # Vape particles identified
+    # Optional KPIs
+    0x41: (U8, (("batt_status", None),)),
+    0x42: (U16, (("batt_v", 1000), ("batt_mv", None))),
+    0x43: (S16, (("rx_rssi", None),)),
+    0x44: (S8, (("rx_snr", None),)),
+    0x45: (U16, (("rx_count", None),)),
+    0x46: (U16, (("tx_time_ms", None),)),
+    0x47: (S8, (("tx_power_dbm", None),)),
+    0x48: (U16, (("tx_count", None),)),
+    0x49: (U16, (("power_up_count", None),)),
+    0x4A: (U16, (("usb_in_count", None),)),
+    0x4B: (U16, (("login_ok_count", None),)),
+    0x4C: (U16, (("login_fail_count", None),)),
+    0x4D: (U32, (("fan_run_time_s", None),)),
+    0x4E: (S16, (("cpu_temp", 10),)), # New for April 2020 Ver: 4.9
+}
+
+# NumPy formats of the value layouts, used by the bulk decoder
+ENLINK_NP_FORMATS = {U8.format: "u1", S8.format: "i1", U16.format: ">u2", S16.format: ">i2", U32.format: ">u4", F32.format: ">f4"}
+
+# Fields decoded as integers by decode_enlink (raw integer layouts without scale)
+ENLINK_INTEGER_FIELDS = {name for (layout, names) in ENLINK_FIELDS.values() for (name, scale) in names if scale is None and layout is not F32}
+
+# Number of value bytes after the type byte for the fields that need custom decoding
+ENLINK_SPECIAL_SIZES = {
+    ENLINK_COUNTER: 5,
+    ENLINK_MB_EXCEPTION: 2,
+    ENLINK_MB_INTERVAL: 5,
+    ENLINK_MB_CUMULATIVE: 5,
+    ENLINK_COS_STATUS: 2,
+    ENLINK_LIQUID_LEVEL_STATUS: 1,
+    ENLINK_LEAK_DETECT_EVT: 1,
+    ENLINK_CPU_TEMP_DEP: 2,
+    ENLINK_GAS_PPB: 5,
+    ENLINK_GAS_UGM3: 5,
+    ENLINK_CRN_THK: 5,
+    ENLINK_CRN_MIN_THK: 3,
+    ENLINK_CRN_MAX_THK: 3,
+    ENLINK_CRN_PERC: 5,
+}
 
 class Decoder_TTN(Decoder_Abstract):
     def __init__(self, logger=logging.getLogger()):
@@ -111,714 +269,221 @@ class Decoder_TTN(Decoder_Abstract):
         return base64.b64decode(b64)  
     
     def decode_enlink(self, encoded_msg_bytes):
-        data = encoded_msg_bytes
-        warnings = []
-        errors = []
-
-        # Return gas name from gas type byte
-        GAS_HCHO_CH2O = 0x17 # Formaldehyde 
-        GAS_VOCs = 0x18 # vocs 
-        GAS_CO = 0x19 # Carbon Monoxide 
-        GAS_CL2 = 0x1A # Chlorine 
-        GAS_H2 = 0x1B # Hydrogen 
-        GAS_H2S = 0x1C # Hydrogen Sulphide
-        GAS_HCl = 0x1D # Hydrogen Chloride
-        GAS_HCN = 0x1E # Hydrogen Cyanide
-        GAS_HF = 0x1F # Hydrogen Fluoride
-        GAS_NH3 = 0x20 # Ammonia
-        GAS_NO2 = 0x21 # Nitrogen Dioxide
-        GAS_O2 = 0x22 # Oxygen
-        GAS_O3 = 0x23 # Ozone
-        GAS_SO2 = 0x24 # Sulfur Dioxide (IUPAC) SO2
-         
-        ENLINK_TEMP = 0x01
-        ENLINK_RH = 0x02
-        ENLINK_LUX = 0x03
-        ENLINK_PRESSURE = 0x04
-        ENLINK_VOC_IAQ = 0x05
-        ENLINK_O2PERC = 0x06
-        ENLINK_CO = 0x07
-        ENLINK_CO2 = 0x08
-        ENLINK_OZONE = 0x09
-        ENLINK_POLLUTANTS = 0x0A
-        ENLINK_PM25 = 0x0B
-        ENLINK_PM10 = 0x0C
-        ENLINK_H2S = 0x0D
-        ENLINK_COUNTER = 0x0E
-        ENLINK_MB_EXCEPTION = 0x0F
-        ENLINK_MB_INTERVAL = 0x10
-        ENLINK_MB_CUMULATIVE = 0x11
-        ENLINK_BVOC = 0x12
-        ENLINK_DETECTION_COUNT = 0x13
-        ENLINK_OCC_TIME = 0x14
-        ENLINK_COS_STATUS = 0x15
-        ENLINK_LIQUID_LEVEL_STATUS = 0x16
-        ENLINK_TEMP_PROBE1 = 0x17
-        ENLINK_TEMP_PROBE2 = 0x18
-        ENLINK_TEMP_PROBE3 = 0x19
-        ENLINK_TEMP_PROBE_IN_BAND_DURATION_S_1 = 0x1A
-        ENLINK_TEMP_PROBE_IN_BAND_DURATION_S_2 = 0x1B
-        ENLINK_TEMP_PROBE_IN_BAND_DURATION_S_3 = 0x1C
-        ENLINK_TEMP_PROBE_IN_BAND_ALARM_COUNT_1 = 0x1D
-        ENLINK_TEMP_PROBE_IN_BAND_ALARM_COUNT_2 = 0x1E
-        ENLINK_TEMP_PROBE_IN_BAND_ALARM_COUNT_3 = 0x1F
-        ENLINK_TEMP_PROBE_LOW_DURATION_S_1 = 0x20
-        ENLINK_TEMP_PROBE_LOW_DURATION_S_2 = 0x21
-        ENLINK_TEMP_PROBE_LOW_DURATION_S_3 = 0x22
-        ENLINK_TEMP_PROBE_LOW_ALARM_COUNT_1 = 0x23
-        ENLINK_TEMP_PROBE_LOW_ALARM_COUNT_2 = 0x24
-        ENLINK_TEMP_PROBE_LOW_ALARM_COUNT_3 = 0x25
-        ENLINK_TEMP_PROBE_HIGH_DURATION_S_1 = 0x26
-        ENLINK_TEMP_PROBE_HIGH_DURATION_S_2 = 0x27
-        ENLINK_TEMP_PROBE_HIGH_DURATION_S_3 = 0x28
-        ENLINK_TEMP_PROBE_HIGH_ALARM_COUNT_1 = 0x29
-        ENLINK_TEMP_PROBE_HIGH_ALARM_COUNT_2 = 0x2A
-        ENLINK_TEMP_PROBE_HIGH_ALARM_COUNT_3 = 0x2B
-    
-        ENLINK_DIFF_PRESSURE = 0X2C
-        ENLINK_AIR_FLOW = 0x2D
-        ENLINK_VOLTAGE = 0x2E
-        ENLINK_CURRENT = 0x2F
-        ENLINK_RESISTANCE = 0x30
-        ENLINK_LEAK_DETECT_EVT = 0x31
-        ENLINK_CO2E = 0x3F
-        
-        ENLINK_SOUND_MIN = 0x50
-        ENLINK_SOUND_AVG = 0x51
-        ENLINK_SOUND_MAX = 0x52
-        ENLINK_NO = 0x53
-        ENLINK_NO2 = 0x54
-        ENLINK_NO2_20 = 0x55
-        ENLINK_SO2 = 0x56
-        
-        ENLINK_MC_PM1_0 = 0x57
-        ENLINK_MC_PM2_5 = 0x58
-        ENLINK_MC_PM4_0 = 0x59
-        ENLINK_MC_PM10_0 = 0x5A
-        ENLINK_NC_PM0_5 = 0x5B
-        ENLINK_NC_PM1_0 = 0x5C
-        ENLINK_NC_PM2_5 = 0x5D
-        ENLINK_NC_PM4_0 = 0x5E
-        ENLINK_NC_PM10_0 = 0x5F
-        ENLINK_PM_TPS = 0x60
-
-        ENLINK_GAS_PPB = 0x61
-        ENLINK_GAS_UGM3 = 0x66
-
-        ENLINK_CRN_THK = 0x62
-        ENLINK_CRN_MIN_THK = 0x63
-        ENLINK_CRN_MAX_THK = 0x64
-        ENLINK_CRN_PERC = 0x65
-        ENLINK_FAST_AQI = 0x67
-        ENLINK_EPA_AQI = 0x68
-
-	# More Particulate Matter
-        ENLINK_MC_PM0_1 = 0x69
-        ENLINK_MC_PM0_3 = 0x6A
-        ENLINK_MC_PM0_5 = 0x6B
-        ENLINK_MC_PM5_0 = 0x6C
-
-        ENLINK_NC_PM0_1 = 0x6D
-        ENLINK_NC_PM0_3 = 0x6E
-        ENLINK_NC_PM5_0 = 0x6F
-	# IPS7100 Particulate Detection Events - type counts
-        ENLINK_DE_EVENT = 0x70
-        ENLINK_DE_SMOKE = 0x71
-        ENLINK_DE_VAPE = 0x72
-	# Optional KPI values that can be included in the message
-        ENLINK_CPU_TEMP_DEP = 0x40
-        ENLINK_BATT_STATUS = 0x41
-        ENLINK_BATT_VOLT = 0x42
-        ENLINK_RX_RSSI = 0x43
-        ENLINK_RX_SNR = 0x44
-        ENLINK_RX_COUNT = 0x45
-        ENLINK_TX_TIME = 0x46
-        ENLINK_TX_POWER = 0x47
-        ENLINK_TX_COUNT = 0x48
-        ENLINK_POWER_UP_COUNT = 0x49
-        ENLINK_USB_IN_COUNT = 0x4A
-        ENLINK_LOGIN_OK_COUNT = 0x4B
-        ENLINK_LOGIN_FAIL_COUNT = 0x4C
-        ENLINK_FAN_RUN_TIME = 0x4D
-        ENLINK_CPU_TEMP = 0x4E
-        
-        #cpn=0
-        #metal=0
+        '''
+        Decodes an Enlink payload (bytes) into {field name: value}.
+        An unknown type byte or a truncated value stops the decoding: the fields read before it are kept, with
+        obj["error"] = "Error at <offset> byte value <type byte>". The decoder before ENLINK_FIELDS raised IndexError
+        on truncated values, and skipped a truncated gas value with an unknown gas byte without an error
+        (tests/fixtures/enlink_golden.json has its output).
+        '''
+        data = memoryview(encoded_msg_bytes)
         obj = {}
-        i=0
+        i = 0
         while(i<len(data)):
-            # Parse Sensor Message Parts
-            if data[i] == ENLINK_TEMP: # Temperature
-                obj["temperature"] = ( self.S16( (data[i + 1] << 8) | (data[i + 2]) ) ) / 10
-		#obj["temperature_f"] = ((obj["temperature"] * 9 / 5) + 32)
-                i += 2
-
-            elif data[i] == ENLINK_RH: # Humidity %rH
-                obj["humidity"] = (data[i + 1])
-                i += 1
-
-            elif data[i] == ENLINK_LUX: # Light Level lux
-                obj["lux"] = self.U16((data[i + 1] << 8) | (data[i + 2]))
-                i += 2
-
-            elif data[i] == ENLINK_PRESSURE: # Barometric Pressure
-                obj["pressure"] = self.U16((data[i + 1] << 8) | (data[i + 2]))
-                i += 2
-
-            elif data[i] == ENLINK_VOC_IAQ: # Indoor Air Quality (0-500)
-                obj["iaq"] = self.U16((data[i + 1] << 8) | (data[i + 2]))
-                i += 2
-
-            elif data[i] == ENLINK_O2PERC: # O2 percentage
-                obj["o2perc"] = (data[i + 1]) / 10
-                i += 1
-                
-            elif data[i] == ENLINK_CO: # Carbon Monoxide
-                obj["co_ppm"] = self.U16((data[i + 1] << 8) | (data[i + 2])) / 100
-                i += 2
-                
-            elif data[i] == ENLINK_CO2: # Carbon Dioxide
-                obj["co2_ppm"] = self.U16((data[i + 1] << 8) | (data[i + 2]))
-                i += 2
-                
-            elif data[i] == ENLINK_OZONE: # Ozone ppm and ppb
-                obj["ozone_ppm"] = self.U16((data[i + 1] << 8) | (data[i + 2])) / 10000
-                obj["ozone_ppb"] = self.U16((data[i + 1] << 8) | (data[i + 2])) / 10
-                i += 2
-
-            elif data[i] == ENLINK_POLLUTANTS: # Pollutants kOhm
-                obj["pollutants_kohm"] = self.U16((data[i + 1] << 8) | (data[i + 2])) / 10
-                i += 2
-
-            elif data[i] == ENLINK_PM25: # Particulates @2.5
-                obj["pm2_5"] = self.U16((data[i + 1] << 8) | (data[i + 2]))
-                i += 2
-
-            elif data[i] == ENLINK_PM10: # Particulates @10
-                obj["pm10"] = self.U16((data[i + 1] << 8) | (data[i + 2]))
-                i += 2
-
-            elif data[i] == ENLINK_H2S: # Hydrogen Sulphide
-                obj["h2s_ppm"] = self.U16((data[i + 1] << 8) | (data[i + 2])) / 100
-                i += 2
-
-            elif data[i] == ENLINK_COUNTER:
-                inputN = data[i + 1]
-                pulseCount = (data[i + 2] << 24) | (data[i + 3] << 16) | (data[i + 4] << 8) | (data[i + 5])
-                if (inputN == 0x00): obj["pulse_ip1"] = pulseCount
-                if (inputN == 0x01): obj["pulse_ip2"] = pulseCount
-                if (inputN == 0x02): obj["pulse_ip3"] = pulseCount
-                i += 5
-
-            elif data[i] == ENLINK_MB_EXCEPTION: # Modbus Error Code
-                if (obj["mb_ex"]):
-                    obj["mb_ex"].append([data[i + 1], data[i + 2]])
-                else:
-                    obj["mb_ex"] = [[data[i + 1], data[i + 2]]]
-                i += 2
-                
-            elif data[i] == ENLINK_MB_INTERVAL: # Modbus Interval Read
-                if (obj["mb_int_val"]):
-                    obj["mb_int_val"].append([data[i + 1], self.fromF32(data[i + 2], data[i + 3], data[i + 4], data[i + 5])])
-                else:
-                    obj["mb_int_val"] = [[data[i + 1], self.fromF32(data[i + 2], data[i + 3], data[i + 4], data[i + 5])]]
-                i += 5
-
-            elif data[i] == ENLINK_MB_CUMULATIVE: # Modbus Cumulative Read
-                if (obj["mb_cum_val"]):
-                    obj["mb_cum_val"].append([data[i + 1], self.fromF32(data[i + 2], data[i + 3], data[i + 4], data[i + 5])])
-                else:
-                    obj["mb_cum_val"] = [[data[i + 1], self.fromF32(data[i + 2], data[i + 3], data[i + 4], data[i + 5])]]
-                i += 5
-                
-            elif data[i] == ENLINK_BVOC:     # Breath VOC Estimate equivalent
-                obj["bvoc"] = self.fromF32(data[i + 1], data[i + 2], data[i + 3], data[i + 4])
-                i += 4
-
-            elif data[i] == ENLINK_DETECTION_COUNT:
-                obj["det_count"] = self.U32((data[i + 1] << 24) | (data[i + 2] << 16) | (data[i + 3] << 8) | (data[i + 4]))
-                i += 4
-
-            elif data[i] == ENLINK_OCC_TIME: # Occupied time in seconds
-                obj["occ_time_s"] = self.U32((data[i + 1] << 24) | (data[i + 2] << 16) | (data[i + 3] << 8) | (data[i + 4]))
-                i += 4
-
-            elif data[i] == ENLINK_COS_STATUS: # Change-of-State U16
-                # Byte 1 = Triggered, Byte 2 = Input state
-                '''
-		obj["cos_trig_byte"] = '0x' + ('0' + (data[i + 1]).toString(16).toUpperIf Data[I] ==()).slice(-2)
-		if (data[i + 1] == 0):
-                    # Transmission was triggered with button press or ATI timeout
-		    # So it's a 'heartbeat'
-		    obj["cos_hb"] = 1
-		else:
-		'''
-                # If (data[i + 1] > 0) transmission was triggered with a Change of State
-                # Transition detected for Closed to Open
-                b = false
-                b = (data[i + 1] & 0x01) > 0
-                obj["cos_ip_1_hl"] = 1 if b else 0
-
-                b = (data[i + 1] & 0x02) > 0
-                obj["cos_ip_2_hl"] = 1 if b else 0
-
-                b = (data[i + 1] & 0x04) > 0
-                obj["cos_ip_3_hl"] = 1 if b else 0
-
-                # Transition detected for Open to Closed
-                b = (data[i + 1] & 0x10) > 0
-                obj["cos_ip_1_lh"] = 1 if b else 0
-
-                b = (data[i + 1] & 0x20) > 0
-                obj["cos_ip_2_lh"] = 1 if b else 0
-
-                b = (data[i + 1] & 0x40) > 0
-                obj["cos_ip_3_lh"] = 1 if b else 0
-
-                # Input State
-                #obj["state_byte"] = '0x' + ('0' + (data[i + 2]).toString(16).toUpperIf Data[I] ==()).slice(-2)
-                obj["state_ip_1"] = 1 if (data[i + 2] & 0x01) else 0
-                obj["state_ip_2"] = 1 if (data[i + 2] & 0x02) else 0
-                obj["state_ip_3"] = 1 if (data[i + 2] & 0x04) else 0
-                i += 2
-
-            elif data[i] == ENLINK_LIQUID_LEVEL_STATUS: # 1 byte U8, 1 or 0, liquid level status
-                obj["liquid_detected"] = True if (data[i + 1]) else False
-                i += 1
-
-            elif data[i] == ENLINK_TEMP_PROBE1:
-                obj["temp_probe_1"] = self.S16((data[i + 1] << 8 | data[i + 2])) / 10
-                i += 2
-
-            elif data[i] == ENLINK_TEMP_PROBE2:
-                obj["temp_probe_2"] = self.S16((data[i + 1] << 8 | data[i + 2])) / 10
-                i += 2
-
-            elif data[i] == ENLINK_TEMP_PROBE3:
-                obj["temp_probe_3"] = self.S16((data[i + 1] << 8 | data[i + 2])) / 10
-                i += 2
-
-            elif data[i] == ENLINK_TEMP_PROBE_IN_BAND_DURATION_S_1:
-                # Cumulative detection time u32
-                obj["temp_probe_in_band_duration_s_1"] = self.U32((data[i + 1] << 24) | (data[i + 2] << 16) | (data[i + 3] << 8) | (data[i + 4]))
-                i += 4
-
-            elif data[i] == ENLINK_TEMP_PROBE_IN_BAND_DURATION_S_2:
-                # Cumulative detection time u32
-                obj["temp_probe_in_band_duration_s_2"] = self.U32((data[i + 1] << 24) | (data[i + 2] << 16) | (data[i + 3] << 8) | (data[i + 4]))
-                i += 4
-
-            elif data[i] == ENLINK_TEMP_PROBE_IN_BAND_DURATION_S_3:
-                # Cumulative detection time u32
-                obj["temp_probe_in_band_duration_s_3"] = self.U32((data[i + 1] << 24) | (data[i + 2] << 16) | (data[i + 3] << 8) | (data[i + 4]))
-                i += 4
-
-            elif data[i] == ENLINK_TEMP_PROBE_IN_BAND_ALARM_COUNT_1:
-                # In band alarm events u16
-                obj["temp_probe_in_band_alarm_count_1"] = self.U16((data[i + 1] << 8) | (data[i + 2]))
-                i += 2
-
-            elif data[i] == ENLINK_TEMP_PROBE_IN_BAND_ALARM_COUNT_2:
-                # In band alarm events u16
-                obj["temp_probe_in_band_alarm_count_2"] = self.U16((data[i + 1] << 8) | (data[i + 2]))
-                i += 2
-
-            elif data[i] == ENLINK_TEMP_PROBE_IN_BAND_ALARM_COUNT_3:
-                # In band alarm events u16
-                obj["temp_probe_in_band_alarm_count_3"] = self.U16((data[i + 1] << 8) | (data[i + 2]))
-                i += 2
-
-            elif data[i] == ENLINK_TEMP_PROBE_LOW_DURATION_S_1:
-		# Cumulative detection time u32
-                obj["temp_probe_low_duration_s_1"] = self.U32((data[i + 1] << 24) | (data[i + 2] << 16) | (data[i + 3] << 8) | (data[i + 4]))
-                i += 4
-
-            elif data[i] == ENLINK_TEMP_PROBE_LOW_DURATION_S_2:
-                # Cumulative detection time u32
-                obj["temp_probe_low_duration_s_2"] = self.U32((data[i + 1] << 24) | (data[i + 2] << 16) | (data[i + 3] << 8) | (data[i + 4]))
-                i += 4
-
-            elif data[i] == ENLINK_TEMP_PROBE_LOW_DURATION_S_3:
-                # Cumulative detection time u32
-                obj["temp_probe_low_duration_s_3"] = self.U32((data[i + 1] << 24) | (data[i + 2] << 16) | (data[i + 3] << 8) | (data[i + 4]))
-                i += 4
-
-            elif data[i] == ENLINK_TEMP_PROBE_LOW_ALARM_COUNT_1:
-                # Low alarm events u16
-                obj["temp_probe_low_alarm_count_1"] = self.U16((data[i + 1] << 8) | (data[i + 2]))
-                i += 2
-
-            elif data[i] == ENLINK_TEMP_PROBE_LOW_ALARM_COUNT_2:
-                # Low alarm events u16
-                obj["temp_probe_low_alarm_count_2"] = self.U16((data[i + 1] << 8) | (data[i + 2]))
-                i += 2
-
-            elif data[i] == ENLINK_TEMP_PROBE_LOW_ALARM_COUNT_3:
-                # Low alarm events u16
-                obj["temp_probe_low_alarm_count_3"] = self.U16((data[i + 1] << 8) | (data[i + 2]))
-                i += 2
-
-            elif data[i] == ENLINK_TEMP_PROBE_HIGH_DURATION_S_1:
-                # Cumulative detection time u32
-                obj["temp_probe_high_duration_s_1"] = self.U32((data[i + 1] << 24) | (data[i + 2] << 16) | (data[i + 3] << 8) | (data[i + 4]))
-                i += 4
-
-            elif data[i] == ENLINK_TEMP_PROBE_HIGH_DURATION_S_2:
-                # Cumulative detection time u32
-                obj["temp_probe_high_duration_s_2"] = self.U32((data[i + 1] << 24) | (data[i + 2] << 16) | (data[i + 3] << 8) | (data[i + 4]))
-                i += 4
-
-            elif data[i] == ENLINK_TEMP_PROBE_HIGH_DURATION_S_3:
-                # Cumulative detection time u32
-                obj["temp_probe_high_duration_s_3"] = self.U32((data[i + 1] << 24) | (data[i + 2] << 16) | (data[i + 3] << 8) | (data[i + 4]))
-                i += 4
-
-            elif data[i] == ENLINK_TEMP_PROBE_HIGH_ALARM_COUNT_1:
-                # High alarm events u16
-                obj["temp_probe_high_alarm_count_1"] = self.U16((data[i + 1] << 8) | (data[i + 2]))
-                i += 2
-
-            elif data[i] == ENLINK_TEMP_PROBE_HIGH_ALARM_COUNT_2:
-                # High alarm events u16
-                obj["temp_probe_high_alarm_count_2"] = self.U16((data[i + 1] << 8) | (data[i + 2]))
-                i += 2
-
-            elif data[i] == ENLINK_TEMP_PROBE_HIGH_ALARM_COUNT_3:
-                # High alarm events u16
-                obj["temp_probe_high_alarm_count_3"] = self.U16((data[i + 1] << 8) | (data[i + 2]))
-                i += 2
-
-            elif data[i] == ENLINK_DIFF_PRESSURE: # 4 bytes F32, +/- 5000 Pa
-                obj["dp_pa"] = self.fromF32(data[i + 1], data[i + 2], data[i + 3], data[i + 4])
-                i += 4
-
-            elif data[i] == ENLINK_AIR_FLOW: # 4 bytes F32, 0 -> 100m/s
-                obj["af_mps"] = self.fromF32(data[i + 1], data[i + 2], data[i + 3], data[i + 4])
-                i += 4
-
-            elif data[i] == ENLINK_VOLTAGE: # 2 bytes U16, 0 to 10.000 V
-                obj["adc_v"] = self.U16((data[i + 1] << 8) | (data[i + 2])) / 1000
-                i += 2
-
-            elif data[i] == ENLINK_CURRENT: # 2 bytes U16, 0 to 20.000 mA
-                obj["adc_ma"] = self.U16((data[i + 1] << 8) | (data[i + 2])) / 1000
-                i += 2
-
-            elif data[i] == ENLINK_RESISTANCE: # 2 bytes U16, 0 to 6553.5 kOhm
-                obj["adc_kohm"] = self.U16((data[i + 1] << 8) | (data[i + 2])) / 10
-                i += 2
-
-            elif data[i] == ENLINK_LEAK_DETECT_EVT: # 1 byte U8, Leak status changed
-                obj["leak_detect_event"] = True if (data[i + 1]) else False
-                i += 1
-
-            elif data[i] == ENLINK_CO2E: # CO2e Estimate Equivalent
-                obj["co2e_ppm"] = self.fromF32(data[i + 1], data[i + 2], data[i + 3], data[i + 4])
-                i += 4
-
-            elif data[i] == ENLINK_SOUND_MIN:
-                obj["sound_min_dba"] = self.fromF32(data[i + 1], data[i + 2], data[i + 3], data[i + 4])
-                i += 4
-
-            elif data[i] == ENLINK_SOUND_AVG:
-                obj["sound_avg_dba"] = self.fromF32(data[i + 1], data[i + 2], data[i + 3], data[i + 4])
-                i += 4
-
-            elif data[i] == ENLINK_SOUND_MAX:
-                obj["sound_max_dba"] = self.fromF32(data[i + 1], data[i + 2], data[i + 3], data[i + 4])
-                i += 4
-
-            elif data[i] == ENLINK_NO: # Nitric Oxide
-                obj["no_ppm"] = self.U16((data[i + 1] << 8) | (data[i + 2])) / 100
-                i += 2
-
-            elif data[i] == ENLINK_NO2: # Nitrogen Dioxide scaled at 0-5ppm
-                obj["no2_ppm"] = self.U16((data[i + 1] << 8) | (data[i + 2])) / 10000
-                i += 2
-
-            elif data[i] == ENLINK_NO2_20: # Nitrogen Dioxide scaled at 0-20ppm
-                obj["no2_20_ppm"] = self.U16((data[i + 1] << 8) | (data[i + 2])) / 1000
-                i += 2
-
-            elif data[i] == ENLINK_SO2: # Sulphur Dioxide 0-20ppm
-                obj["so2_ppm"] = self.U16((data[i + 1] << 8) | (data[i + 2])) / 1000
-                i += 2
-
-            elif data[i] == ENLINK_MC_PM0_1:
-                obj["mc_pm0_1"] = self.fromF32(data[i + 1], data[i + 2], data[i + 3], data[i + 4])
-                i += 4
-
-            elif data[i] == ENLINK_MC_PM0_3:
-                obj["mc_pm0_3"] = self.fromF32(data[i + 1], data[i + 2], data[i + 3], data[i + 4])
-                i += 4
-
-            elif data[i] == ENLINK_MC_PM0_5:
-                obj["mc_pm0_5"] = self.fromF32(data[i + 1], data[i + 2], data[i + 3], data[i + 4])
-                i += 4
-
-            elif data[i] == ENLINK_MC_PM1_0:
-                obj["mc_pm1_0"] = self.fromF32(data[i + 1], data[i + 2], data[i + 3], data[i + 4])
-                i += 4
-
-            elif data[i] == ENLINK_MC_PM2_5:
-                obj["mc_pm2_5"] = self.fromF32(data[i + 1], data[i + 2], data[i + 3], data[i + 4])
-                i += 4
-
-            elif data[i] == ENLINK_MC_PM4_0:
-                obj["mc_pm4_0"] = self.fromF32(data[i + 1], data[i + 2], data[i + 3], data[i + 4])
-                i += 4
-
-            elif data[i] == ENLINK_MC_PM5_0:
-                obj["mc_pm5_0"] = self.fromF32(data[i + 1], data[i + 2], data[i + 3], data[i + 4])
-                i += 4
-
-            elif data[i] == ENLINK_MC_PM10_0:
-                obj["mc_pm10_0"] = self.fromF32(data[i + 1], data[i + 2], data[i + 3], data[i + 4])
-                i += 4
-
-            elif data[i] == ENLINK_NC_PM0_1:
-                obj["nc_pm0_1"] = self.fromF32(data[i + 1], data[i + 2], data[i + 3], data[i + 4])
-                i += 4
-
-            elif data[i] == ENLINK_NC_PM0_3:
-                obj["nc_pm0_3"] = self.fromF32(data[i + 1], data[i + 2], data[i + 3], data[i + 4])
-                i += 4
-
-            elif data[i] == ENLINK_NC_PM0_5:
-                obj["nc_pm0_5"] = self.fromF32(data[i + 1], data[i + 2], data[i + 3], data[i + 4])
-                i += 4
-
-            elif data[i] == ENLINK_NC_PM1_0:
-                obj["nc_pm1_0"] = self.fromF32(data[i + 1], data[i + 2], data[i + 3], data[i + 4])
-                i += 4
-
-            elif data[i] == ENLINK_NC_PM2_5:
-                obj["nc_pm2_5"] = self.fromF32(data[i + 1], data[i + 2], data[i + 3], data[i + 4])
-                i += 4
-
-            elif data[i] == ENLINK_NC_PM4_0:
-                obj["nc_pm4_0"] = self.fromF32(data[i + 1], data[i + 2], data[i + 3], data[i + 4])
-                i += 4
-
-            elif data[i] == ENLINK_NC_PM5_0:
-                obj["nc_pm5_0"] = self.fromF32(data[i + 1], data[i + 2], data[i + 3], data[i + 4])
-                i += 4
-
-            elif data[i] == ENLINK_NC_PM10_0:
-                obj["nc_pm10_0"] = self.fromF32(data[i + 1], data[i + 2], data[i + 3], data[i + 4])
-                i += 4
-
-            elif data[i] == ENLINK_PM_TPS:
-                obj["pm_tps"] = self.fromF32(data[i + 1], data[i + 2], data[i + 3], data[i + 4])
-                i += 4
-
-            elif data[i] == ENLINK_DE_EVENT:
-                # Particle Detection Event
-                # Event raised, not yet identified
-                obj["de_event"] = self.U16((data[i + 1] << 8) | (data[i + 2]))
-                i += 2
-
-            elif data[i] == ENLINK_DE_SMOKE:
-                #Smoke particles identified
-                obj["de_smoke"] = self.U16((data[i + 1] << 8) | (data[i + 2]))
-                i += 2
-
-            elif data[i] == ENLINK_DE_VAPE:
-                # Vape particles identified
-                obj["de_vape"] = self.U16((data[i + 1] << 8) | (data[i + 2]))
-                i += 2
-
-            elif data[i] == ENLINK_GAS_PPB:
-                if data[i+1] == GAS_HCHO_CH2O:
-                    obj["HCHO_CH2O_ppb"] = self.fromF32(data[i + 2], data[i + 3], data[i + 4], data[i + 5])
-                elif data[i+1] == GAS_VOCs:
-                    obj["VOCs_ppb"] = self.fromF32(data[i + 2], data[i + 3], data[i + 4], data[i + 5])
-                elif data[i+1] == GAS_CO:
-                    obj["CO_ppb"] = self.fromF32(data[i + 2], data[i + 3], data[i + 4], data[i + 5])
-                elif data[i+1] == GAS_CL2:
-                    obj["CL2_ppb"] = self.fromF32(data[i + 2], data[i + 3], data[i + 4], data[i + 5])
-                elif data[i+1] == GAS_H2:
-                    obj["H2_ppb"] = self.fromF32(data[i + 2], data[i + 3], data[i + 4], data[i + 5])
-                elif data[i+1] == GAS_H2S:
-                    obj["H2S_ppb"] = self.fromF32(data[i + 2], data[i + 3], data[i + 4], data[i + 5])
-                elif data[i+1] == GAS_HCl:
-                    obj["HCl_ppb"] = self.fromF32(data[i + 2], data[i + 3], data[i + 4], data[i + 5])
-                elif data[i+1] == GAS_HCN:
-                    obj["HCN_ppb"] = self.fromF32(data[i + 2], data[i + 3], data[i + 4], data[i + 5])
-                elif data[i+1] == GAS_HF:
-                    obj["HF_ppb"] = self.fromF32(data[i + 2], data[i + 3], data[i + 4], data[i + 5])
-                elif data[i+1] == GAS_NH3:
-                    obj["NH3_ppb"] = self.fromF32(data[i + 2], data[i + 3], data[i + 4], data[i + 5])
-                elif data[i+1] == GAS_NO2:
-                    obj["NO2_ppb"] = self.fromF32(data[i + 2], data[i + 3], data[i + 4], data[i + 5])
-                elif data[i+1] == GAS_O2:
-                    obj["O2_ppb"] = self.fromF32(data[i + 2], data[i + 3], data[i + 4], data[i + 5])
-                elif data[i+1] == GAS_O3:
-                    obj["O3_ppb"] = self.fromF32(data[i + 2], data[i + 3], data[i + 4], data[i + 5])
-                elif data[i+1] == GAS_SO2:
-                    obj["SO2_ppb"] = self.fromF32(data[i + 2], data[i + 3], data[i + 4], data[i + 5])
-                i += 5
-
-            elif data[i] == ENLINK_GAS_UGM3:
-                if data[i+1] == GAS_HCHO_CH2O:
-                    obj["HCHO_CH2O_ugm3"] = self.fromF32(data[i + 2], data[i + 3], data[i + 4], data[i + 5])
-                elif data[i+1] == GAS_VOCs:
-                    obj["VOCs_ugm3"] = self.fromF32(data[i + 2], data[i + 3], data[i + 4], data[i + 5])
-                elif data[i+1] == GAS_CO:
-                    obj["CO_ugm3"] = self.fromF32(data[i + 2], data[i + 3], data[i + 4], data[i + 5])
-                elif data[i+1] == GAS_CL2:
-                    obj["CL2_ugm3"] = self.fromF32(data[i + 2], data[i + 3], data[i + 4], data[i + 5])
-                elif data[i+1] == GAS_H2:
-                    obj["H2_ugm3"] = self.fromF32(data[i + 2], data[i + 3], data[i + 4], data[i + 5])
-                elif data[i+1] == GAS_H2S:
-                    obj["H2S_ugm3"] = self.fromF32(data[i + 2], data[i + 3], data[i + 4], data[i + 5])
-                elif data[i+1] == GAS_HCl:
-                    obj["HCl_ugm3"] = self.fromF32(data[i + 2], data[i + 3], data[i + 4], data[i + 5])
-                elif data[i+1] == GAS_HCN:
-                    obj["HCN_ugm3"] = self.fromF32(data[i + 2], data[i + 3], data[i + 4], data[i + 5])
-                elif data[i+1] == GAS_HF:
-                    obj["HF_ugm3"] = self.fromF32(data[i + 2], data[i + 3], data[i + 4], data[i + 5])
-                elif data[i+1] == GAS_NH3:
-                    obj["NH3_ugm3"] = self.fromF32(data[i + 2], data[i + 3], data[i + 4], data[i + 5])
-                elif data[i+1] == GAS_NO2:
-                    obj["NO2_ugm3"] = self.fromF32(data[i + 2], data[i + 3], data[i + 4], data[i + 5])
-                elif data[i+1] == GAS_O2:
-                    obj["O2_ugm3"] = self.fromF32(data[i + 2], data[i + 3], data[i + 4], data[i + 5])
-                elif data[i+1] == GAS_O3:
-                    obj["O3_ugm3"] = self.fromF32(data[i + 2], data[i + 3], data[i + 4], data[i + 5])
-                elif data[i+1] == GAS_SO2:
-                    obj["SO2_ugm3"] = self.fromF32(data[i + 2], data[i + 3], data[i + 4], data[i + 5])
-
-                i += 5
-
-            elif data[i] == ENLINK_CRN_THK:
-                # Coupon is either 1 or 2. Bit 7 set for Coupon 2
-                cpn = 1 if (data[i + 1] & 0x80) == 0 else 2
-                metal = self.GetCrnMetal(data[i + 1])
-                # Thickness in nanometres
-                thk_nm = self.fromF32(data[i + 2], data[i + 3], data[i + 4], data[i + 5])
-                # As Array
-                if (obj["crn_thk_nm"]):
-                    obj["crn_thk_nm"].append([cpn, metal, thk_nm])
-                else:
-                    obj["crn_thk_nm"] = [[cpn, metal, thk_nm]]
-
-                i += 5
-
-            elif data[i] == ENLINK_CRN_MIN_THK:
-                cpn = 1 if (data[i + 1] & 0x80) == 0 else 2
-                metal = self.GetCrnMetal(data[i + 1])
-                # Minimum thickness of metal
-                min_nm = self.U16((data[i + 2] << 8) | (data[i + 3]))
-                # As Array
-                if (obj["crn_min_nm"]):
-                    obj["crn_min_nm"].append([cpn, metal, min_nm])
-                else:
-                    obj["crn_min_nm"] = [[cpn, metal, min_nm]]
-                i += 3
-
-            elif data[i] == ENLINK_CRN_MAX_THK:
-                cpn = 1 if (data[i + 1] & 0x80) == 0 else 2
-                metal = self.GetCrnMetal(data[i + 1])
-                # Original thickness of metal
-                max_nm = self.U16((data[i + 2] << 8) | (data[i + 3]))
-                # As Array
-                if (obj["crn_max_nm"]):
-                    obj["crn_max_nm"].append([cpn, metal, max_nm])
-                else:
-                    obj["crn_max_nm"] = [[cpn, metal, max_nm]]
-                i += 3
-
-            elif data[i] == ENLINK_CRN_PERC:
-                cpn = 1 if (data[i + 1] & 0x80) == 0 else 2
-                metal = self.GetCrnMetal(data[i + 1])
-                # Corrosion of coupon in percentage from Max(0%) to Min(100%)
-                perc = self.fromF32(data[i + 2], data[i + 3], data[i + 4], data[i + 5])
-                # As Array
-                if (obj["crn_perc"]):
-                    obj["crn_perc"].append([cpn, metal, perc])
-                else:
-                    obj["crn_perc"] = [[cpn, metal, perc]]
-                i += 5
-
-            elif data[i] == ENLINK_FAST_AQI:
-                obj["fast_aqi"] = self.U16((data[i + 1] << 8) | (data[i + 2]))
-                i += 2
-
-            elif data[i] == ENLINK_EPA_AQI:
-                obj["epa_aqi"] = self.U16((data[i + 1] << 8) | (data[i + 2]))
-                i += 2
-
-	    # < -------------------------------------------------------------------------------->
-	    # Optional KPIs
-            elif data[i] == ENLINK_CPU_TEMP_DEP:    # Optional from April 2020
-                obj["cpu_temp_dep"] = data[i + 1] + (round(data[i + 2] * 100 / 256) / 100)
-                i += 2
-
-            elif data[i] == ENLINK_CPU_TEMP:    # New for April 2020 Ver: 4.9
-                obj["cpu_temp"] = (self.S16((data[i + 1] << 8) | (data[i + 2]))) / 10
-                i += 2
-
-            elif data[i] == ENLINK_BATT_STATUS:
-                obj["batt_status"] = data[i + 1]
-                i += 1
-
-            elif data[i] == ENLINK_BATT_VOLT:
-                obj["batt_v"] = self.U16((data[i + 1] << 8) | (data[i + 2])) / 1000
-                obj["batt_mv"] = self.U16((data[i + 1] << 8) | (data[i + 2]))
-                i += 2
-
-            elif data[i] == ENLINK_RX_RSSI:
-                obj["rx_rssi"] = self.S16((data[i + 1] << 8) | (data[i + 2]))
-                i += 2
-
-            elif data[i] == ENLINK_RX_SNR:
-                obj["rx_snr"] = self.S8(data[i + 1])
-                i += 1
-
-            elif data[i] == ENLINK_RX_COUNT:
-                obj["rx_count"] = self.U16((data[i + 1] << 8) | (data[i + 2]))
-                i += 2
-
-            elif data[i] == ENLINK_TX_TIME:
-                obj["tx_time_ms"] = self.U16((data[i + 1] << 8) | (data[i + 2]))
-                i += 2
-
-            elif data[i] == ENLINK_TX_POWER:
-                obj["tx_power_dbm"] = self.S8(data[i + 1])
-                i += 1
-
-            elif data[i] == ENLINK_TX_COUNT:
-                obj["tx_count"] = self.U16((data[i + 1] << 8) | (data[i + 2]))
-                i += 2
-
-            elif data[i] == ENLINK_POWER_UP_COUNT:
-                obj["power_up_count"] = self.U16((data[i + 1] << 8) | (data[i + 2]))
-                i+= 2
-
-            elif data[i] == ENLINK_USB_IN_COUNT:
-                obj["usb_in_count"] = self.U16((data[i + 1] << 8) | (data[i + 2]))
-                i += 2
-
-            elif data[i] == ENLINK_LOGIN_OK_COUNT:
-                obj["login_ok_count"] = self.U16((data[i + 1] << 8) | (data[i + 2]))
-                i += 2
-
-            elif data[i] == ENLINK_LOGIN_FAIL_COUNT:
-                obj["login_fail_count"] = self.U16((data[i + 1] << 8) | (data[i + 2]))
-                i += 2
-
-            elif data[i] == ENLINK_FAN_RUN_TIME:
-                obj["fan_run_time_s"] = self.U32((data[i + 1] << 24) | (data[i + 2] << 16) | (data[i + 3] << 8) | (data[i + 4]))
-                i += 4
-            else: # something is wrong with data
-                obj["error"] = "Error at " + str(i) + " byte value " + str(data[i])
+            type_byte = data[i]
+            field = ENLINK_FIELDS.get(type_byte)
+            try:
+                if field is not None:
+                    layout, names = field
+                    value = self.unpack_f32(data, i + 1) if layout is F32 else layout.unpack_from(data, i + 1)[0]
+                    for (name, scale) in names:
+                        obj[name] = value if scale is None else value / scale
+                    i += 1 + layout.size
+                elif type_byte in ENLINK_SPECIAL_SIZES:
+                    if i + ENLINK_SPECIAL_SIZES[type_byte] >= len(data):
+                        raise IndexError(type_byte)
+                    self.decode_enlink_special(obj, type_byte, data, i)
+                    i += 1 + ENLINK_SPECIAL_SIZES[type_byte]
+                else: # something is wrong with data
+                    obj["error"] = "Error at " + str(i) + " byte value " + str(type_byte)
+                    i = len(data)
+            except (struct.error, IndexError):
+                # truncated value
+                obj["error"] = "Error at " + str(i) + " byte value " + str(type_byte)
                 i = len(data)
 
-            i+=1
-
         return obj
 
+    def decode_enlink_special(self, obj, type_byte, data, i):
+        if type_byte == ENLINK_COUNTER:
+            inputN = data[i + 1]
+            pulseCount = U32.unpack_from(data, i + 2)[0]
+            if (inputN == 0x00): obj["pulse_ip1"] = pulseCount
+            if (inputN == 0x01): obj["pulse_ip2"] = pulseCount
+            if (inputN == 0x02): obj["pulse_ip3"] = pulseCount
+
+        elif type_byte == ENLINK_MB_EXCEPTION: # Modbus Error Code
+            obj.setdefault("mb_ex", []).append([data[i + 1], data[i + 2]])
+
+        elif type_byte == ENLINK_MB_INTERVAL: # Modbus Interval Read
+            obj.setdefault("mb_int_val", []).append([data[i + 1], self.unpack_f32(data, i + 2)])
+
+        elif type_byte == ENLINK_MB_CUMULATIVE: # Modbus Cumulative Read
+            obj.setdefault("mb_cum_val", []).append([data[i + 1], self.unpack_f32(data, i + 2)])
+
+        elif type_byte == ENLINK_COS_STATUS: # Change-of-State U16
+            # Byte 1 = Triggered, Byte 2 = Input state
+            # Transition detected for Closed to Open
+            obj["cos_ip_1_hl"] = 1 if (data[i + 1] & 0x01) else 0
+            obj["cos_ip_2_hl"] = 1 if (data[i + 1] & 0x02) else 0
+            obj["cos_ip_3_hl"] = 1 if (data[i + 1] & 0x04) else 0
+            # Transition detected for Open to Closed
+            obj["cos_ip_1_lh"] = 1 if (data[i + 1] & 0x10) else 0
+            obj["cos_ip_2_lh"] = 1 if (data[i + 1] & 0x20) else 0
+            obj["cos_ip_3_lh"] = 1 if (data[i + 1] & 0x40) else 0
+            # Input State
+            obj["state_ip_1"] = 1 if (data[i + 2] & 0x01) else 0
+            obj["state_ip_2"] = 1 if (data[i + 2] & 0x02) else 0
+            obj["state_ip_3"] = 1 if (data[i + 2] & 0x04) else 0
+
+        elif type_byte == ENLINK_LIQUID_LEVEL_STATUS: # 1 byte U8, 1 or 0, liquid level status
+            obj["liquid_detected"] = True if (data[i + 1]) else False
+
+        elif type_byte == ENLINK_LEAK_DETECT_EVT: # 1 byte U8, Leak status changed
+            obj["leak_detect_event"] = True if (data[i + 1]) else False
+
+        elif type_byte == ENLINK_CPU_TEMP_DEP: # Optional from April 2020
+            obj["cpu_temp_dep"] = data[i + 1] + (round(data[i + 2] * 100 / 256) / 100)
+
+        elif type_byte in (ENLINK_GAS_PPB, ENLINK_GAS_UGM3):
+            gas = GAS_NAMES.get(data[i + 1])
+            if gas is not None:
+                obj[gas + ("_ppb" if type_byte == ENLINK_GAS_PPB else "_ugm3")] = self.unpack_f32(data, i + 2)
+
+        elif type_byte in (ENLINK_CRN_THK, ENLINK_CRN_PERC):
+            # Coupon is either 1 or 2. Bit 7 set for Coupon 2
+            cpn = 1 if (data[i + 1] & 0x80) == 0 else 2
+            metal = self.GetCrnMetal(data[i + 1])
+            # Thickness in nanometres / Corrosion of coupon in percentage from Max(0%) to Min(100%)
+            name = "crn_thk_nm" if type_byte == ENLINK_CRN_THK else "crn_perc"
+            obj.setdefault(name, []).append([cpn, metal, self.unpack_f32(data, i + 2)])
+
+        elif type_byte in (ENLINK_CRN_MIN_THK, ENLINK_CRN_MAX_THK):
+            cpn = 1 if (data[i + 1] & 0x80) == 0 else 2
+            metal = self.GetCrnMetal(data[i + 1])
+            # Minimum / Original thickness of metal
+            name = "crn_min_nm" if type_byte == ENLINK_CRN_MIN_THK else "crn_max_nm"
+            obj.setdefault(name, []).append([cpn, metal, U16.unpack_from(data, i + 2)[0]])
+
+    def unpack_f32(self, data, offset):
+        value = F32.unpack_from(data, offset)[0]
+        if not math.isfinite(value):
+            # keep the historical output of fromF32 for NaN/Inf encodings
+            return self.fromF32(data[offset], data[offset + 1], data[offset + 2], data[offset + 3])
+        return float(round(value, 3))
+
+    def decode_enlink_batch(self, payloads, fields=None):
+        '''
+        Decodes many frm_payloads (base64 strings or bytes) into NumPy columns.
+        Returns {field name: float64 array}, with NaN where a payload does not carry the field.
+        Only scalar numeric fields are returned; fields restricts the output to the given names.
+        '''
+        frames = [base64.b64decode(p) if isinstance(p, str) else bytes(p) for p in payloads]
+        columns, fallback = self.decode_enlink_columns(frames, fields)
+        for row, obj in fallback.items():
+            for name, value in obj.items():
+                if (fields is not None and name not in fields) or isinstance(value, (list, str)):
+                    continue
+                self.enlink_column(columns, name, len(frames))[row] = value
+        return columns
+
+    def decode_enlink_columns(self, frames, fields=None):
+        '''
+        Bulk decoder for the frames (bytes) of a day file.
+        Frames with the same length and type bytes share one layout (usually a whole device model), each
+        layout is decoded at once with a NumPy structured dtype over the stacked frames.
+        Returns (columns, fallback): columns is {field name: float64 array over all frames, NaN where missing},
+        fallback is {frame index: decode_enlink output} for the frames with fields that have no fixed layout
+        (modbus, corrosion, flags, errors).
+        '''
+        columns = dict()
+        fallback = dict()
+        by_length = dict()
+        for row, frame in enumerate(frames):
+            by_length.setdefault(len(frame), []).append(row)
+
+        for length, rows in by_length.items():
+            rows = np.array(rows)
+            block = np.frombuffer(b"".join([frames[row] for row in rows]), dtype=np.uint8).reshape(len(rows), length)
+            pending = np.ones(len(rows), dtype=bool)
+            while pending.any():
+                first = int(np.argmax(pending))
+                layout = self.enlink_layout(frames[rows[first]])
+                if layout is None:
+                    fallback[int(rows[first])] = self.decode_enlink(frames[rows[first]])
+                    pending[first] = False
+                    continue
+                # frames with the same type bytes at the same offsets have the same layout
+                match = pending.copy()
+                for (offset, type_byte, gas_byte) in layout:
+                    match &= block[:, offset] == type_byte
+                    if gas_byte is not None: match &= block[:, offset + 1] == gas_byte
+                pending &= ~match
+                self.decode_enlink_group(columns, len(frames), rows[match], block[match], layout, fields)
+
+        return columns, fallback
+
+    def enlink_layout(self, frame):
+        '''
+        Returns the fields of a frame as ((type byte offset, type byte, gas byte or None), ...),
+        or None if the frame has a field without a fixed layout or can not be fully decoded.
+        '''
+        layout = []
+        i = 0
+        while i < len(frame):
+            type_byte = frame[i]
+            field = ENLINK_FIELDS.get(type_byte)
+            if field is not None:
+                layout.append((i, type_byte, None))
+                i += 1 + field[0].size
+            elif type_byte in (ENLINK_GAS_PPB, ENLINK_GAS_UGM3) and i + 1 < len(frame) and frame[i + 1] in GAS_NAMES:
+                layout.append((i, type_byte, frame[i + 1]))
+                i += 1 + ENLINK_SPECIAL_SIZES[type_byte]
+            else:
+                return None
+        # the last value is truncated
+        if i != len(frame): return None
+        return tuple(layout)
+
+    def decode_enlink_group(self, columns, n_frames, rows, block, layout, fields=None):
+        dtype_fields = {"names": [], "formats": [], "offsets": [], "itemsize": block.shape[1]}
+        outputs = []
+        for k, (offset, type_byte, gas_byte) in enumerate(layout):
+            if gas_byte is None:
+                value_layout, names = ENLINK_FIELDS[type_byte]
+                value_offset = offset + 1
+            else:
+                value_layout, names = F32, ((GAS_NAMES[gas_byte] + ("_ppb" if type_byte == ENLINK_GAS_PPB else "_ugm3"), None),)
+                value_offset = offset + 2
+            dtype_fields["names"].append("f" + str(k))
+            dtype_fields["formats"].append(ENLINK_NP_FORMATS[value_layout.format])
+            dtype_fields["offsets"].append(value_offset)
+            outputs.append((value_layout, value_offset, names))
+
+        if not outputs: return
+        records = np.frombuffer(np.ascontiguousarray(block), dtype=np.dtype(dtype_fields))
+        # fields repeated in a frame keep the last value, as in decode_enlink
+        for k, (value_layout, value_offset, names) in enumerate(outputs):
+            if fields is not None and not any(name in fields for (name, _) in names):
+                continue
+            with np.errstate(invalid="ignore"):
+                values = records["f" + str(k)].astype(np.float64)
+            if value_layout is F32:
+                values = np.round(values, 3)
+                for j in np.flatnonzero(~np.isfinite(values)):
+                    values[j] = self.unpack_f32(block[j].tobytes(), value_offset)
+            for (name, scale) in names:
+                if fields is not None and name not in fields:
+                    continue
+                self.enlink_column(columns, name, n_frames)[rows] = values if scale is None else values / scale
+
+    def enlink_column(self, columns, name, n_frames):
+        column = columns.get(name)
+        if column is None:
+            column = columns[name] = np.full(n_frames, np.nan)
+        return column
+
+
     # Convert binary value bit to Signed 8 bit
     def S8(self, binary):
         num = binary & 0xFF
@@ -4,13 +4,12 @@ import sys
 import pathlib
 import json
 from datetime import datetime
-from tabulate import tabulate
-import pandas as pd
 #sys.path.append(os.path.join(pathlib.Path(__file__).parent.absolute(), 'lib/'))
 import lib.iolibs as io
 from etl.RTManager import RTManager
 from etl.DBManager import DBManager
 from etl.decoders.decoder import Decoder
+from lib.pipelineStats import PipelineStats
 
 
 class ETL:
@@ -24,6 +23,8 @@ class ETL:
     def init_etl(self):
         self.rt_manager = RTManager(self.cfg["rt_cfg"], self, self.basic_cfg["sensor_parameters_path"], logger=self.logger)
         self.db_manager = DBManager(self.cfg["db_cfg"], self.basic_cfg["sensor_parameters_path"], logger=self.logger)
+        #live messages are counted per stage instead of logged one by one
+        self.stats = PipelineStats("ETL", logger=self.logger, report_sec=self.basic_cfg.get("stats_report_sec", 60), sample_sec=self.basic_cfg.get("stats_sample_sec", 10))
         self.logger.info("==== Starting ETL ====")
         self.logger.info(self.cfg["db_cfg"])
         self.logger.info("======================")
@@ -35,6 +36,18 @@ class ETL:
         #To Do: store df somewhere for access, or use it for something.
         return df
         
+    def close(self):
+        #writes the stored messages still queued
+        self.db_manager.close()
+
+    def read_batch(self, query):
+        #same as read for a list of acp_ids, returns acp_id -> df
+        return self.db_manager.read_batch(query)
+
+    def read_iter(self, query):
+        #same as read, yielding the data in chunks
+        return self.db_manager.read_iter(query)
+        
     def subscribe(self, query):
         self.logger.info("======= Starting subscriptions =======")
         #query = {"sensors": [ {"acp_id": "enl-iaqco3-081622", "parameters": ["all"]},  {"acp_id": "elsys-co2-058b19", "parameters": ["all"]} ]}
@@ -58,25 +71,28 @@ class ETL:
         return partitionedData
 
     def publish(self, data):
-        self.logger.info("===> Message to publish\n" + str(data) + "\n=====")
+        self.stats.sample("published", "%s", data)
+        self.stats.count("published")
         self.rt_manager.publish(data)
         
 
     def handle_message(self, msg, topic=None):
-        self.logger.info("-----------------------------------")
+        self.stats.count("received")
         #self.logger.info("Handling new message : " + str(msg))
         transformed_msg=Decoder.transform(msg, topic)
         if(transformed_msg):
             #self.logger.info("Transformed Message: " + str(transformed_msg))
             filtered_msg=self.rt_manager.filterParametersFromSensorMessage(transformed_msg)
             #self.logger.info("Filtered Message: " + str(filtered_msg))
-            
-            df=pd.DataFrame([filtered_msg])
-            self.logger.info("Handling new message\n"+str(tabulate(df, headers='keys', tablefmt='psql')))
-            #To Do: store df somewhere for access, or use it for something.
-            #self.db_manager.store(transformed_msg)
+            self.stats.count("decoded")
+            self.stats.sample("decoded", "%s", filtered_msg)
+            #written behind in batches by the database (if it persists live messages)
+            self.db_manager.store(transformed_msg, msg)
+            if(transformed_msg["sensor"] and "acp_id" in transformed_msg["sensor"]):
+                self.db_manager.invalidate(transformed_msg["sensor"]["acp_id"])
             if(not self.owner is None):
                 predictions=self.owner.handle_reading(filtered_msg)
-                self.logger.info("Predictions: " + str(predictions))
+                self.stats.sample("predictions", "%s", predictions)
                 for p in predictions: self.publish(predictions[p])
+        else: self.stats.count("dropped")
             
@@ -0,0 +1,53 @@
+'''
+Back-fills the SQL store (SQLManager) from the day-file archive (fs_data_paths), one day file per transaction.
+Readings already imported are replaced, so an interrupted import can be run again.
+
+    python -m etl.sqlImport --cfg ./cfg/basic.cfg [--sensors enl-iaqc-085e9a ...] [--from 01/01/2023] [--to 31/01/2023]
+
+The archive paths and the SQL settings (sql_path, ...) are read from the db_cfg of etl_default.
+'''
+import sys
+import time
+import logging
+import argparse
+from bisect import bisect_left, bisect_right
+import lib.iolibs as io
+from etl.FileManager import FileManager, decode_day_file
+from etl.SQLManager import SQLManager
+
+
+def backfill(db_cfg, sensor_parameters, sensors=None, dt_range=None, logger=logging.getLogger()):
+    file_manager=FileManager(dict(db_cfg, fs_cache_path=None), logger=logger)
+    sql_manager=SQLManager(db_cfg, logger=logger)
+    dt_from, dt_to = file_manager.getTimeRange(dt_range or dict())
+    total=0
+    for acp_id in (sensors or file_manager.sensor_list):
+        sensor_type="-".join(acp_id.split("-")[:2])
+        if(sensor_type not in sensor_parameters):
+            logger.warning("sqlImport - No parameters for sensor type " + sensor_type + ", skipping " + acp_id)
+            continue
+        parameters=["acp_id", "acp_ts"]+sensor_parameters[sensor_type]
+        dates, fp_data_files = file_manager.file_index.get(acp_id, ([], []))
+        first, last = bisect_left(dates, file_manager.day_start(dt_from)), bisect_right(dates, dt_to)
+        start, count = time.time(), 0
+        for fpath in fp_data_files[first:last]:
+            count+=sql_manager.store_frame(acp_id, decode_day_file(fpath, parameters, file_manager.fast_reader, logger=logger))
+        logger.info("sqlImport - " + acp_id + ": " + str(count) + " readings from " + str(last-first) + " day files in " + str(round(time.time()-start, 1)) + "s")
+        total+=count
+    sql_manager.close()
+    return total
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    argParser = argparse.ArgumentParser(description="Back-fills the SQL store from the day-file archive")
+    argParser.add_argument("-c", "--cfg", default="./cfg/basic.cfg", help="Configuration file path")
+    argParser.add_argument("-s", "--sensors", nargs="*", help="acp_ids to import (default: all sensors in the archive)")
+    argParser.add_argument("--from", dest="dt_from", help="First day to import (DD/MM/YYYY or ISO)")
+    argParser.add_argument("--to", dest="dt_to", help="Last day to import (DD/MM/YYYY or ISO)")
+    args = argParser.parse_args(sys.argv[1:])
+
+    basic_cfg = io.getBasicConfig(args.cfg)
+    dt_range = {k: v for k, v in (("from", args.dt_from), ("to", args.dt_to)) if v is not None}
+    total = backfill(basic_cfg["etl_default"]["db_cfg"], io.readJSON(basic_cfg["sensor_parameters_path"]), args.sensors, dt_range)
+    logging.info("sqlImport - " + str(total) + " readings imported")
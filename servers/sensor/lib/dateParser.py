@@ -0,0 +1,57 @@
+import re
+from datetime import datetime
+import dateutil.parser
+
+DMY = re.compile(r"(\d{1,2})/(\d{1,2})/(\d{4})(?:[ T](\d{1,2}):(\d{2})(?::(\d{2})(?:\.(\d{1,6}))?)?)?")
+ISO_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+def parse_datetime(value, end_of_day=False):
+    '''
+    Naive local datetime of a query bound: DD/MM/YYYY[ HH:MM[:SS[.ffffff]]], ISO 8601 (offsets are converted
+    to local time), epoch seconds (int or float) or a datetime. Other strings fall back to dateutil (day first).
+    A date without time is the start of the day, or its last microsecond with end_of_day (inclusive "to" bounds).
+    Raises ValueError if the value can not be parsed.
+    '''
+    if (isinstance(value, datetime)): return value
+    if (isinstance(value, (int, float)) and not isinstance(value, bool)):
+        try:
+            return datetime.fromtimestamp(value)
+        except (OverflowError, OSError) as e:
+            raise ValueError("Epoch not valid: " + str(value)) from e
+
+    text = str(value).strip()
+    match = DMY.fullmatch(text)
+    if (match is not None):
+        day, month, year = int(match.group(1)), int(match.group(2)), int(match.group(3))
+        date_only = match.group(4) is None
+        if (date_only): dt = datetime(year, month, day)
+        else:
+            dt = datetime(year, month, day, int(match.group(4)), int(match.group(5)), int(match.group(6) or 0),
+                          int((match.group(7) or "0").ljust(6, "0")))
+    elif (ISO_DATE.match(text)):
+        dt = datetime.fromisoformat(text)
+        date_only = len(text) == 10
+        if (dt.tzinfo is not None): dt = dt.astimezone().replace(tzinfo=None)
+    else:
+        try:
+            dt = dateutil.parser.parse(text, dayfirst=True)
+        except OverflowError as e:
+            raise ValueError("Date not valid: " + text) from e
+        date_only = False
+        if (dt.tzinfo is not None): dt = dt.astimezone().replace(tzinfo=None)
+
+    if (end_of_day and date_only): return dt.replace(hour=23, minute=59, second=59, microsecond=999999)
+    return dt
+
+
+def parse_file_date(file_name):
+    '''
+    Date of a day file named acp_id_YYYY-MM-DD.txt, None if the name does not end with a date.
+    '''
+    file_date_str = file_name.rsplit("_", 1)[-1].split(".")[0]
+    if (len(file_date_str) != 10 or not ISO_DATE.fullmatch(file_date_str)): return None
+    try:
+        return datetime(int(file_date_str[0:4]), int(file_date_str[5:7]), int(file_date_str[8:10]))
+    except ValueError:
+        return None
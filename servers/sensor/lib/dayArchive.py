@@ -0,0 +1,143 @@
+import os
+import io
+import gzip
+import json
+
+#zstd compressed day files are only listed (and written) if zstandard is installed
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIONS = {".gz": "gz", ".zst": "zst"}
+INDEX_SUFFIX = ".idx"
+GZIP_LEVEL = 6
+
+
+def compression(fpath):
+    #"gz", "zst" or None for a plain day file
+    return COMPRESSIONS.get(os.path.splitext(fpath)[1])
+
+
+def is_day_file(file_name):
+    #block indexes and files being written are not day files
+    if (file_name.endswith((INDEX_SUFFIX, ".tmp"))): return False
+    return compression(file_name) != "zst" or zstandard is not None
+
+
+def compress_block(data, method):
+    if (method == "zst"): return zstandard.ZstdCompressor().compress(data)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def decompress_block(data, method):
+    if (method == "zst"): return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def open_text(fpath):
+    #text stream of a day file, compressed blocks (gzip members, zstd frames) are read as one stream
+    method = compression(fpath)
+    if (method == "gz"): return gzip.open(fpath, "rt", encoding="utf-8", errors="replace")
+    if (method == "zst"):
+        reader = zstandard.ZstdDecompressor().stream_reader(open(fpath, "rb"), read_across_frames=True, closefd=True)
+        return io.TextIOWrapper(reader, encoding="utf-8", errors="replace")
+    return open(fpath, "r")
+
+
+def read_bytes(fpath):
+    #whole (decompressed) content of a day file
+    method = compression(fpath)
+    if (method == "gz"):
+        with gzip.open(fpath, "rb") as day_file: return day_file.read()
+    if (method == "zst"):
+        with zstandard.ZstdDecompressor().stream_reader(open(fpath, "rb"), read_across_frames=True, closefd=True) as day_file:
+            return day_file.read()
+    with open(fpath, "rb") as day_file: return day_file.read()
+
+
+def read_index(fpath):
+    '''
+    Blocks [offset, length, ts_min, ts_max] of a compressed day file from its <fpath>.idx,
+    None if the file is not compressed or has no index matching its size.
+    '''
+    if (compression(fpath) is None): return None
+    try:
+        with open(fpath + INDEX_SUFFIX, "r") as index_file:
+            index = json.load(index_file)
+        if (index["size"] != os.path.getsize(fpath)): return None
+        return index["blocks"]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def block_in_range(block, ts_from=None, ts_to=None):
+    #blocks without any timestamp are only read in full reads
+    if (ts_from is None and ts_to is None): return True
+    if (block[2] is None): return False
+    return (ts_from is None or block[3] >= ts_from) and (ts_to is None or block[2] <= ts_to)
+
+
+def read_blocks(fpath, blocks, ts_from=None, ts_to=None, reverse=False):
+    #decompressed data of the blocks overlapping [ts_from, ts_to] (epoch), each block holds whole lines
+    method = compression(fpath)
+    selected = [block for block in blocks if block_in_range(block, ts_from, ts_to)]
+    with open(fpath, "rb") as archive_file:
+        for offset, length, _, _ in (reversed(selected) if reverse else selected):
+            archive_file.seek(offset)
+            yield decompress_block(archive_file.read(length), method)
+
+
+def read_lines(fpath, ts_from=None, ts_to=None):
+    '''
+    Lines of a day file. With ts_from/ts_to, a compressed file with a block index only decompresses the blocks
+    overlapping the range: every line in range is yielded, along with the other lines of its block.
+    '''
+    blocks = read_index(fpath) if (ts_from is not None or ts_to is not None) else None
+    if (blocks is None):
+        with open_text(fpath) as day_file:
+            yield from day_file
+        return
+    for data in read_blocks(fpath, blocks, ts_from, ts_to):
+        yield from data.decode("utf-8", errors="replace").splitlines(keepends=True)
+
+
+def reversed_lines(fpath, ts_to=None):
+    #lines of a compressed day file from the last one, only the blocks needed are decompressed if it has an index
+    #(from the last block starting before ts_to)
+    blocks = read_index(fpath)
+    chunks = read_blocks(fpath, blocks, ts_to=ts_to, reverse=True) if blocks is not None else [read_bytes(fpath)]
+    for data in chunks:
+        for line in reversed(data.split(b"\n")):
+            if (line.strip()): yield line.decode("utf-8", errors="replace")
+
+
+def write_archive(fpath, lines, timestamps, method="gz", block_size=131072):
+    '''
+    Writes lines (bytes ending with a newline) as a compressed day file made of independent blocks of about
+    block_size bytes of lines, so a block can be decompressed on its own and the file is still one gzip/zstd
+    stream. The block index [offset, length, ts_min, ts_max] is written to <fpath>.idx.
+    :param timestamps: acp_ts (epoch) of each line, None if unknown
+    :return: the blocks
+    '''
+    blocks = list()
+    tmp_path = fpath + "." + str(os.getpid()) + ".tmp"
+    with open(tmp_path, "wb") as archive_file:
+        start = 0
+        while (start < len(lines)):
+            end, size = start, 0
+            while (end < len(lines) and (end == start or size + len(lines[end]) <= block_size)):
+                size += len(lines[end])
+                end += 1
+            data = compress_block(b"".join(lines[start:end]), method)
+            block_ts = [ts for ts in timestamps[start:end] if ts is not None]
+            blocks.append([archive_file.tell(), len(data), min(block_ts) if block_ts else None, max(block_ts) if block_ts else None])
+            archive_file.write(data)
+            start = end
+    index_tmp_path = fpath + INDEX_SUFFIX + "." + str(os.getpid()) + ".tmp"
+    with open(index_tmp_path, "w") as index_file:
+        json.dump({"compression": method, "size": os.path.getsize(tmp_path), "blocks": blocks}, index_file)
+    #the index is checked against the file size, a reader never uses the index of another version of the file
+    os.replace(tmp_path, fpath)
+    os.replace(index_tmp_path, fpath + INDEX_SUFFIX)
+    return blocks
@@ -0,0 +1,71 @@
+import os
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+import lib.iolibs as io
+
+
+class DayCache:
+    def __init__(self, cache_path, logger=logging.getLogger()):
+        """
+        Sidecar cache of decoded day files, stored as one NumPy .npz per sensor-day and parameter set.
+        An entry is only valid while the source day file keeps the same mtime and size.
+        :param cache_path: Directory where the cache files are written
+        """
+        self.logger=logger
+        self.cache_path=io.getFullPath(cache_path)
+
+    def cache_file(self, fpath, parameters, variant=None):
+        #expected fpath format .../acp_id/acp_id_YYYY-MM-DD.txt
+        #variant tells apart other frames derived from the same day (e.g., rollups)
+        fname=os.path.basename(fpath)
+        acp_id=fname.rsplit("_", 1)[0]
+        key=",".join(parameters if parameters else []) + ("|" + variant if variant else "")
+        params_key=hashlib.md5(key.encode()).hexdigest()[:12]
+        return os.path.join(self.cache_path, acp_id, fname + "." + params_key + ".npz")
+
+    def load(self, fpath, parameters, variant=None):
+        cfile=self.cache_file(fpath, parameters, variant)
+        if(not os.path.isfile(cfile)): return None
+        try:
+            stat=os.stat(fpath)
+            with np.load(cfile, allow_pickle=False) as npz:
+                meta=npz["__meta__"]
+                if(int(meta[0])!=stat.st_mtime_ns or int(meta[1])!=stat.st_size): return None
+                columns=[str(c) for c in npz["__columns__"]]
+                df=pd.DataFrame({c: npz["c" + str(i)] for i, c in enumerate(columns)}, columns=columns)
+        except (OSError, ValueError, KeyError) as e:
+            self.logger.warning("DayCache.load - Ignoring unreadable cache file " + cfile + ": " + str(e))
+            return None
+
+        if ("dp_ts" in df.columns): df.index = df["dp_ts"]
+        return df
+
+    def store(self, fpath, parameters, df, stat, variant=None):
+        #stat: os.stat of fpath taken before df was decoded, lines appended meanwhile then invalidate the entry
+        if(stat is None): return False
+        arrays=dict()
+        for i, c in enumerate(df.columns):
+            values=df[c].to_numpy()
+            if(values.dtype==object):
+                #only plain string columns (e.g., acp_id) can be stored without pickling
+                if(pd.api.types.infer_dtype(values, skipna=False)!="string"):
+                    self.logger.debug("DayCache.store - Column " + str(c) + " not cacheable in " + fpath)
+                    return False
+                values=values.astype(str)
+            arrays["c" + str(i)]=values
+
+        cfile=self.cache_file(fpath, parameters, variant)
+        try:
+            os.makedirs(os.path.dirname(cfile), exist_ok=True)
+            #write to a temporary file first so concurrent readers never see a partial entry
+            tmp_file=cfile + "." + str(os.getpid()) + ".tmp"
+            with open(tmp_file, "wb") as out_file:
+                np.savez(out_file, __meta__=np.array([stat.st_mtime_ns, stat.st_size], dtype=np.int64),
+                         __columns__=np.array([str(c) for c in df.columns], dtype=str), **arrays)
+            os.replace(tmp_file, cfile)
+        except OSError as e:
+            self.logger.warning("DayCache.store - Could not write cache file " + cfile + ": " + str(e))
+            return False
+        return True
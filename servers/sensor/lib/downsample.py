@@ -0,0 +1,97 @@
+import re
+import numpy as np
+import pandas as pd
+
+BUCKET_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+DAY_SEC = 86400
+AGGREGATIONS = ("mean", "min", "max", "last")
+
+
+def parse_bucket(bucket):
+    '''
+    Bucket length in seconds from strings like 30s, 1m, 15m, 1h or 1d (numbers are taken as seconds).
+    Only lengths that divide a day are valid: the set of buckets (and of rollups cached per day file) is bounded.
+    Buckets are aligned to the epoch, so they may still span two (local) day files, see aggregate_chunks.
+    '''
+    if (isinstance(bucket, (int, float))): seconds = bucket
+    else:
+        match = re.fullmatch(r"\s*(\d+)\s*([smhd]?)\s*", str(bucket))
+        if (match is None): raise ValueError("Bucket not valid: " + str(bucket))
+        seconds = int(match.group(1)) * BUCKET_UNITS[match.group(2) or "s"]
+    if (seconds <= 0 or DAY_SEC % seconds != 0): raise ValueError("Bucket not valid (it must divide a day): " + str(bucket))
+    return seconds
+
+
+def aggregate(df, bucket_sec, agg="mean", ts_column="acp_ts"):
+    '''
+    Aggregates the readings of each time bucket into one row, timestamped at the start of the bucket.
+    Numeric columns use agg (mean, min, max or last), other columns keep their last value; missing values are skipped.
+    '''
+    if (agg not in AGGREGATIONS): raise ValueError("Aggregation not valid: " + str(agg))
+    if (df.empty or ts_column not in df.columns): return df
+    buckets = np.floor(df[ts_column].to_numpy(dtype=np.float64) / bucket_sec) * bucket_sec
+    columns = [c for c in df.columns if c != ts_column]
+    numeric = [c for c in columns if pd.api.types.is_numeric_dtype(df[c])]
+    others = [c for c in columns if c not in numeric]
+
+    grouped = df.groupby(buckets, sort=True)
+    out = grouped[numeric].agg(agg) if numeric else pd.DataFrame(index=grouped.size().index)
+    if (others): out[others] = grouped[others].last()
+    out[ts_column] = out.index.to_numpy()
+    return out[list(df.columns)].reset_index(drop=True)
+
+
+def aggregate_chunks(frames, bucket_sec, agg="mean", ts_column="acp_ts"):
+    '''
+    Aggregates consecutive frames sorted by time (e.g., one per day file) as they come: the rows of the last bucket
+    of a frame are carried to the next one, so a bucket spanning two frames is aggregated once.
+    Frames already aggregated with the same bucket are left as they are.
+    '''
+    carry = None
+    for df in frames:
+        if (df.empty or ts_column not in df.columns): continue
+        if (carry is not None): df = pd.concat([carry, df])
+        ts = df[ts_column].to_numpy(dtype=np.float64)
+        done = ts < np.floor(ts.max() / bucket_sec) * bucket_sec
+        carry = df[~done]
+        if (done.any()): yield aggregate(df[done], bucket_sec, agg, ts_column)
+    if (carry is not None): yield aggregate(carry, bucket_sec, agg, ts_column)
+
+
+def lttb_indices(x, y, n_out):
+    '''
+    Largest-Triangle-Three-Buckets: positions of the n_out points of (x, y) that best keep the shape of the line.
+    '''
+    n = len(x)
+    if (n_out >= n or n_out < 3): return np.arange(n)
+    #n_out-2 buckets between the first and the last point, which are always kept
+    edges = np.floor(np.linspace(1, n - 1, n_out - 1)).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        if (i < n_out - 3):
+            avg_x, avg_y = x[end:edges[i + 2]].mean(), y[end:edges[i + 2]].mean()
+        else:
+            avg_x, avg_y = x[n - 1], y[n - 1]
+        areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected
+
+
+def lttb(df, max_points, ts_column="acp_ts"):
+    '''
+    Reduces df to at most max_points rows with LTTB. Each numeric column gets an equal share of the points
+    and the rows selected for any column are kept, so every parameter keeps its peaks. With less than 3 points
+    per column, evenly spaced rows are kept instead.
+    '''
+    if (len(df) <= max_points or ts_column not in df.columns): return df
+    numeric = [c for c in df.columns if c != ts_column and pd.api.types.is_numeric_dtype(df[c])]
+    share = max_points // len(numeric) if numeric else 0
+    if (share < 3):
+        return df.iloc[np.unique(np.linspace(0, len(df) - 1, max_points).astype(np.int64))]
+    x = df[ts_column].to_numpy(dtype=np.float64)
+    selected = [lttb_indices(x, df[c].to_numpy(dtype=np.float64), share) for c in numeric]
+    return df.iloc[np.unique(np.concatenate(selected))]
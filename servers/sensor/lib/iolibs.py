@@ -6,7 +6,6 @@
 
 import sys
 import csv
-import pandas as pd
 #import xlrd
 import json
 import traceback
@@ -111,6 +110,14 @@ def getBasicConfig(basic_cfg_file_path="./cfg/basic.cfg"):
         basic_cfg = {
 	    "logging_dirpath" : "./log/",
 	    "sensor_parameters_path": "etl/static/sensor_parameters.json",
+	    "stats_report_sec": 60,
+	    "stats_sample_sec": 10,
+	    "api": {
+	    	"ws_queue_size": 100,
+	    	"read_workers": 4,
+	    	"max_concurrent_reads": 8,
+	    	"read_timeout_sec": 30
+	    },
 	    "etl_default": {
                 "rt_cfg": {
 		    "rt_type" : "mqtt",
@@ -127,7 +134,20 @@ def getBasicConfig(basic_cfg_file_path="./cfg/basic.cfg"):
 		},
 		"db_cfg" : {
 		    "db_type" : "file", 
-		    "fs_data_paths" : ["/media/acp/mqtt_csn/sensors/", "/media/acp/mqtt_ttn/sensors/", "/media/acp/mqtt_acp/sensors/"]
+		    "fs_data_paths" : ["/media/acp/mqtt_csn/sensors/", "/media/acp/mqtt_ttn/sensors/", "/media/acp/mqtt_acp/sensors/"],
+		    "fs_cache_path" : "./cache/",
+		    "fs_read_workers" : 4,
+		    "fs_read_chunksize" : 2,
+		    "fs_parallel_min_files" : 4,
+		    "query_cache_bytes" : 268435456,
+		    "query_cache_ttl_sec" : 60,
+		    "sql_path" : "./db/readings.sqlite",
+		    "fs_store_path" : "",
+		    "fs_ring_path" : "",
+		    "fs_ring_records" : 8640,
+		    "store_queue_size" : 10000,
+		    "store_batch_size" : 500,
+		    "store_flush_sec" : 5
                 }
 	    }
         }
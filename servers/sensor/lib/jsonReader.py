@@ -1,51 +1,65 @@
+import re
 import json
+import base64
+import numpy as np
 import pandas as pd
 import logging
 import lib.iolibs as io
+import lib.dayArchive as archive
 import sys
 import os
 import pathlib
 #sys.path.append(os.path.join(pathlib.Path(__file__).parent.absolute(), 'etl/'))
 from etl.decoders.decoder import Decoder
+from etl.decoders.decoder_ttn import ENLINK_INTEGER_FIELDS
+
+#optional faster JSON backend for archive reads
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+#timestamp of a raw line without decoding it: acp_ts, or the (first) received_at of TTN messages
+TS_PROBE = re.compile(rb'"acp_ts": ?"?(-?[0-9.]+)|"received_at": ?"([^"]+)"')
+#the probed timestamp may be a few seconds off acp_ts (e.g., TTN received_at), windows are widened by this margin
+PROBE_MARGIN_SEC = 60
 
 class JSONReader:
-    def __init__(self, dpath, parameters = None, logger=logging.getLogger()):
+    def __init__(self, dpath, parameters = None, logger=logging.getLogger(), fast=True):
         """
         Loads the json file in a dataframe and collects all sensor types available
         :param path: Path to the json file
+        :param fast: Use the archive fast path (read_archive_line) instead of the full Decoder.transform
         """
         self.logger=logger
         self.dpath = dpath
         self.parameters = parameters #filter monitoring parameters (if none load everything)
+        self.fast = fast
         #self.logger.debug(parameters)
     """
     loads the data from the json file
     :return:
     """
-    def read_day_file(self):
-        
+    def read_day_file(self, ts_from=None, ts_to=None):
+        """
+        loads the day file, plain or compressed (lib.dayArchive)
+        :param ts_from, ts_to: epoch range, only the lines around it are decoded (window_lines, or the blocks in range
+        of compressed files). Lines close to the range are loaded as well, the caller trims the rows by acp_ts
+        """
         json_message_list = []
         message = None
     
+        if (self.fast):
+            self.df = self.read_archive_lines(self.read_lines(ts_from, ts_to))
+            if ("dp_ts" in self.df.columns): self.df.index = self.df["dp_ts"]
+            return
+
         #sensor files are massive, so we need to account for memory.
-        with open(self.dpath, 'r') as openfile:
-            for line in openfile:
-                #reset the message
-                message = None
-                try:
-                    #load the message in a json object
-                    #message=self.read_message(io.deserialiseJSON2Dict(line))
-                    transformed_msg=Decoder.transform(line, logger=self.logger)
-                    #self.logger.info(transformed_msg)
-                    if(transformed_msg):
-                        message=self.filter_message(transformed_msg)
-                        #self.logger.info(message)
-                    if (not message is None):
-                        json_message_list.append(message)
-                    
-                except json.JSONDecodeError as je:
-                    #this means one of the lines could not be converted to a json object
-                    continue
+        for line in self.read_lines(ts_from, ts_to):
+            message = self.read_line(line)
+            if (not message is None):
+                json_message_list.append(message)
         #self.logger.info(json_message_list)        
         #Transform into dataframe
         self.df = pd.DataFrame(json_message_list)
@@ -53,17 +67,222 @@ class JSONReader:
 
         if ("dp_ts" in self.df.columns): self.df.index = self.df["dp_ts"]
 
+    def read_day_file_tail(self, n=1, ts_from=None, block_size=8192, ts_to=None):
+        '''
+        Loads only the last n valid messages of the day file, reading blocks backwards from the end of the file.
+        The dataframe keeps the file order (oldest first).
+        :param n: Number of messages to load (None for no limit)
+        :param ts_from: Stop at the first message with an acp_ts older than this epoch
+        :param ts_to: Skip the messages newer than this epoch, the lines after it are not decoded (window_lines)
+        :return: True if the reading stopped at ts_from
+        '''
+        json_message_list = []
+        reached_ts_from = False
+        if (n is None or n > 0):
+            for line in self.reversed_lines(block_size, ts_to):
+                message = self.read_line(line)
+                if (message is None): continue
+                if (ts_from is not None and message.get("acp_ts") is not None and float(message["acp_ts"]) < ts_from):
+                    reached_ts_from = True
+                    break
+                if (ts_to is not None and message.get("acp_ts") is not None and float(message["acp_ts"]) > ts_to): continue
+                json_message_list.append(message)
+                if (n is not None and len(json_message_list) >= n): break
+        json_message_list.reverse()
+        self.df = pd.DataFrame(json_message_list)
+
+        if ("dp_ts" in self.df.columns): self.df.index = self.df["dp_ts"]
+        return reached_ts_from
+
+    def reversed_lines(self, block_size=8192, ts_to=None):
+        #yields the lines of the file from the last one (the last one around ts_to), only the blocks needed are read
+        if (archive.compression(self.dpath) is not None):
+            yield from archive.reversed_lines(self.dpath, ts_to)
+            return
+        with open(self.dpath, 'rb') as openfile:
+            position = openfile.seek(0, os.SEEK_END)
+            if (ts_to is not None): position = self.line_offset(openfile, position, ts_to + PROBE_MARGIN_SEC, strict=True)
+            head = b""
+            while (position > 0):
+                read_size = min(block_size, position)
+                position -= read_size
+                openfile.seek(position)
+                lines = (openfile.read(read_size) + head).split(b"\n")
+                #the first line may be cut by the block boundary, it is completed with the previous block
+                head = lines[0]
+                for line in reversed(lines[1:]):
+                    if (line.strip()): yield line.decode("utf-8", errors="replace")
+            if (head.strip()): yield head.decode("utf-8", errors="replace")
+
+    def read_lines(self, ts_from=None, ts_to=None):
+        #lines of the day file around [ts_from, ts_to], all of them without range
+        if ((ts_from is None and ts_to is None) or archive.compression(self.dpath) is not None):
+            return archive.read_lines(self.dpath, ts_from, ts_to)
+        return self.window_lines(ts_from, ts_to)
+
+    def window_lines(self, ts_from=None, ts_to=None):
+        '''
+        Lines of a plain day file between ts_from and ts_to (epoch), widened by PROBE_MARGIN_SEC. The lines are in
+        time order, so the offsets of the first and last lines are found by binary search, probing one line per step.
+        Files whose first lines can not be probed are read in full.
+        '''
+        with open(self.dpath, 'rb') as openfile:
+            size = openfile.seek(0, os.SEEK_END)
+            openfile.seek(0)
+            if (not any(self.probe_ts(openfile.readline()) is not None for _ in range(10))):
+                start, end = 0, size
+            else:
+                start = 0 if ts_from is None else self.line_offset(openfile, size, ts_from - PROBE_MARGIN_SEC)
+                end = size if ts_to is None else self.line_offset(openfile, size, ts_to + PROBE_MARGIN_SEC, strict=True)
+            openfile.seek(start)
+            data = openfile.read(max(end - start, 0))
+        for line in data.splitlines():
+            if (line.strip()): yield line.decode("utf-8", errors="replace")
+
+    def line_offset(self, openfile, size, ts, strict=False):
+        #offset of the first line probed at or after ts (after ts if strict), size if there is none
+        #lines that can not be probed take the timestamp of the next line that can
+        low, high = 0, size
+        while (low < high):
+            middle = (low + high) // 2
+            start = self.line_start(openfile, middle)
+            line_ts = None
+            while (line_ts is None and openfile.tell() < size):
+                line_ts = self.probe_ts(openfile.readline())
+            if (start >= high or line_ts is None or (line_ts > ts if strict else line_ts >= ts)): high = middle
+            else: low = openfile.tell()
+        return self.line_start(openfile, low)
+
+    def line_start(self, openfile, offset):
+        #moves to the start of the first line at or after offset
+        openfile.seek(max(offset - 1, 0))
+        if (offset > 0): openfile.readline()
+        return openfile.tell()
+
+    def probe_ts(self, line):
+        #acp_ts of a raw line (bytes) from TS_PROBE, None if it has none
+        match = TS_PROBE.search(line)
+        if (match is None): return None
+        try:
+            if (match.group(1) is not None): return float(match.group(1))
+            return Decoder.get_decoder("ttn", logger=self.logger).ttnts2epoch(match.group(2).decode())
+        except (ValueError, UnicodeDecodeError):
+            return None
+
+    def read_line(self, line):
+        #decodes one line of a day file, None if it does not carry any requested data
+        if (self.fast): return self.read_archive_line(line)
+        try:
+            #load the message in a json object
+            #message=self.read_message(io.deserialiseJSON2Dict(line))
+            transformed_msg=Decoder.transform(line, logger=self.logger)
+            #self.logger.info(transformed_msg)
+            if(transformed_msg):
+                return self.filter_message(transformed_msg)
+        except json.JSONDecodeError as je:
+            #this means one of the lines could not be converted to a json object
+            pass
+        return None
+
+    def read_archive_lines(self, lines):
+        '''
+        Fast path over the lines of a day file. The Enlink payloads are collected and decoded in bulk
+        (Decoder_TTN.decode_enlink_columns) once all the lines are read, then merged as columns.
+        :return: dataframe with the same rows and values as the per-line decoding
+        '''
+        messages = []
+        enlink_rows = []
+        enlink_frames = []
+        for line in lines:
+            message = self.read_archive_line(line, enlink_frames)
+            if (message is None): continue
+            if (len(enlink_frames) > len(enlink_rows)): enlink_rows.append(len(messages))
+            messages.append(message)
+        if (not enlink_frames): return pd.DataFrame(messages)
+
+        columns, fallback = Decoder.get_decoder("ttn", logger=self.logger).decode_enlink_columns(enlink_frames, self.parameters)
+        for k, obj in fallback.items():
+            messages[enlink_rows[k]].update({key: obj[key] for key in self.parameters if key in obj})
+        df = pd.DataFrame(messages, index=pd.RangeIndex(len(messages)))
+        enlink_rows = np.array(enlink_rows)
+        for name, values in columns.items():
+            column = np.full(len(messages), np.nan)
+            column[enlink_rows] = values
+            if (name in df.columns):
+                #the payload values override the decoded_payload ones, as in the per-line decoding
+                column = df[name].mask(~np.isnan(column), column)
+            df[name] = column
+            if (name in ENLINK_INTEGER_FIELDS and not df[name].isna().any()): df[name] = df[name].astype("int64")
+
+        #messages without any requested parameter are dropped, columns follow their first appearance
+        present = df.notna().to_numpy()
+        df = df[present.any(axis=1)].reset_index(drop=True)
+        if (df.empty): return pd.DataFrame()
+        present = df.notna().to_numpy()
+        order = {key: i for i, key in enumerate(self.parameters)}
+        first_row = present.argmax(axis=0)
+        df = df[sorted(df.columns, key=lambda c: (first_row[df.columns.get_loc(c)], order.get(c, len(order))))]
+        return df
+
+    def read_archive_line(self, line, enlink_frames=None):
+        '''
+        Fast path for archived lines: only extracts acp_ts and the requested parameters.
+        TTN (Enlink) messages skip the gateway and data connector extraction of Decoder.transform,
+        other messages go through the decoders without parsing the line twice.
+        :param enlink_frames: if given, the Enlink payload is appended to it for bulk decoding instead of decoded here
+        '''
+        if (not self.parameters): return None
+        try:
+            message = json_loads(line)
+            if (not isinstance(message, dict) or not message): return None
+            if ("msg_type" in message and message["msg_type"]=="rt_data" and "request_data" in message):
+                message = message["request_data"][0]
+
+            if ("end_device_ids" not in message):
+                sensor_data, gateway_data, data_connector_data, service_data = Decoder.extractData(message, logger=self.logger)
+                if (not sensor_data and not gateway_data and not data_connector_data and not service_data): return None
+                return self.filter_message({"sensor": sensor_data, "gateway": gateway_data, "data_connector": data_connector_data, "service": service_data})
+
+            ttn_decoder = Decoder.get_decoder("ttn", logger=self.logger)
+            uplink = message["uplink_message"]
+            sensor = dict()
+            sensor["sensor_id"] = sensor["acp_id"] = message["end_device_ids"]["device_id"]
+            sensor["sensor_ts"] = sensor["acp_ts"] = ttn_decoder.ttnts2epoch(uplink["received_at"])
+            sensor["encoded_payload"] = uplink["frm_payload"]
+            if ("sensor_singal_strength" in self.parameters or "gateway_id" in self.parameters):
+                sensor["sensor_singal_strength"] = float(uplink["rx_metadata"][0]["rssi"])
+                sensor["gateway_id"] = uplink["rx_metadata"][0]["gateway_ids"]["gateway_id"]
+            if ("data_connector_id" in self.parameters):
+                sensor["data_connector_id"] = message["end_device_ids"]["application_ids"]["application_id"]
+
+            decoded_payload = uplink.get("decoded_payload")
+            if (decoded_payload is not None):
+                sensor.update(decoded_payload["data"] if "data" in decoded_payload else decoded_payload)
+            frame = base64.b64decode(uplink["frm_payload"])
+            if (enlink_frames is None): sensor.update(ttn_decoder.decode_enlink(frame))
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            #includes json.JSONDecodeError, this means the line could not be converted to a message
+            return None
+
+        filter_dict = {key: sensor[key] for key in self.parameters if key in sensor}
+        if (enlink_frames is not None):
+            enlink_frames.append(frame)
+            return filter_dict
+        return filter_dict if filter_dict else None
+
     def filter_message(self, message_dict):
         filter_dict = dict()
         #self.logger.info(message_dict)
         if ((not message_dict is None) and ("sensor" in message_dict)):
             try:
-                if("data" in message_dict["sensor"]["decoded_payload"]):
-                    for (k,v) in message_dict["sensor"]["decoded_payload"]["data"].items():
-                        message_dict["sensor"][k]=v
-                elif("decoded_payload" in message_dict["sensor"]):
-                    for (k,v) in message_dict["sensor"]["decoded_payload"].items():
-                        message_dict["sensor"][k]=v
+                #TTN messages do not always carry a decoded_payload, the cooked_payload must still be merged
+                if("decoded_payload" in message_dict["sensor"]):
+                    if("data" in message_dict["sensor"]["decoded_payload"]):
+                        for (k,v) in message_dict["sensor"]["decoded_payload"]["data"].items():
+                            message_dict["sensor"][k]=v
+                    else:
+                        for (k,v) in message_dict["sensor"]["decoded_payload"].items():
+                            message_dict["sensor"][k]=v
                 if("cooked_payload" in message_dict["sensor"]):
                     for (k,v) in message_dict["sensor"]["cooked_payload"].items():
                         message_dict["sensor"][k]=v
@@ -0,0 +1,49 @@
+import time
+import logging
+import threading
+
+
+class PipelineStats:
+    def __init__(self, name, logger=logging.getLogger(), report_sec=60, sample_sec=10, level=logging.INFO):
+        """
+        Per-stage message counters for the live pipeline, logged as one summary line every report_sec,
+        plus message dumps limited to one per stage every sample_sec.
+        Messages are only formatted if they are actually logged.
+        :param name: Prefix of the log lines (e.g., ETL, API)
+        """
+        self.name=name
+        self.logger=logger
+        self.report_sec=report_sec
+        self.sample_sec=sample_sec
+        self.level=level
+        self.lock=threading.Lock()
+        self.totals=dict()
+        self.window=dict()
+        self.last_samples=dict()
+        self.window_start=time.time()
+
+    def count(self, stage, n=1):
+        with self.lock:
+            self.totals[stage]=self.totals.get(stage, 0)+n
+            self.window[stage]=self.window.get(stage, 0)+n
+            now=time.time()
+            if(now-self.window_start < self.report_sec): return
+            window, elapsed = self.window, now-self.window_start
+            self.window=dict()
+            self.window_start=now
+        if(self.logger.isEnabledFor(self.level)):
+            self.logger.log(self.level, "%s stats (last %.0fs): %s", self.name, elapsed,
+                            ", ".join(stage + "=" + str(n) for stage, n in window.items()))
+
+    def sample(self, stage, message, *args):
+        #message and args follow the logging %-format and are not formatted if the sample is skipped
+        if(not self.logger.isEnabledFor(self.level)): return
+        now=time.time()
+        with self.lock:
+            if(now-self.last_samples.get(stage, 0) < self.sample_sec): return
+            self.last_samples[stage]=now
+        self.logger.log(self.level, "%s %s sample: " + message, self.name, stage, *args)
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.totals)
@@ -0,0 +1,77 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+
+class QueryCache:
+    def __init__(self, max_bytes, ttl_sec=60, logger=logging.getLogger()):
+        """
+        LRU cache of query results (dataframes) bounded by their total memory usage.
+        Entries of windows ending in the past never change; live entries (windows covering today) expire
+        after ttl_sec and are invalidated when new data of their sensor arrives.
+        :param max_bytes: Maximum total size of the cached dataframes
+        """
+        self.logger=logger
+        self.max_bytes=max_bytes
+        self.ttl_sec=ttl_sec
+        self.lock=threading.Lock()
+        self.entries=OrderedDict() #key -> (df, nbytes, acp_id, expires_at or None)
+        self.live_keys=dict() #acp_id -> keys of its live entries
+        self.generations=dict() #acp_id -> number of invalidations, to reject results read before new data arrived
+        self.nbytes=0
+        self.counters={"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, key):
+        with self.lock:
+            entry=self.entries.get(key)
+            if(entry is not None and entry[3] is not None and entry[3] < time.time()):
+                self.remove(key)
+                entry=None
+            if(entry is None):
+                self.counters["misses"]+=1
+                return None
+            self.entries.move_to_end(key)
+            self.counters["hits"]+=1
+        #callers modify the results, the cached dataframe is never handed out
+        return entry[0].copy()
+
+    def put(self, key, df, acp_id, live=False, generation=None):
+        nbytes=int(df.memory_usage(deep=True).sum())
+        if(nbytes > self.max_bytes): return False
+        df=df.copy()
+        with self.lock:
+            if(live and generation is not None and generation!=self.generations.get(acp_id, 0)): return False
+            if(key in self.entries): self.remove(key)
+            while(self.entries and self.nbytes+nbytes > self.max_bytes):
+                self.remove(next(iter(self.entries)))
+                self.counters["evictions"]+=1
+            self.entries[key]=(df, nbytes, acp_id, time.time()+self.ttl_sec if live else None)
+            self.nbytes+=nbytes
+            if(live): self.live_keys.setdefault(acp_id, set()).add(key)
+        return True
+
+    def invalidate(self, acp_id):
+        #new data of a sensor only changes the live windows
+        with self.lock:
+            self.generations[acp_id]=self.generations.get(acp_id, 0)+1
+            for key in list(self.live_keys.get(acp_id, ())):
+                self.remove(key)
+                self.counters["invalidations"]+=1
+
+    def generation(self, acp_id):
+        #taken before reading a live window, see put
+        return self.generations.get(acp_id, 0)
+
+    def remove(self, key):
+        #the lock must be held
+        entry=self.entries.pop(key)
+        self.nbytes-=entry[1]
+        if(entry[3] is not None):
+            keys=self.live_keys.get(entry[2])
+            keys.discard(key)
+            if(not keys): del self.live_keys[entry[2]]
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, entries=len(self.entries), bytes=self.nbytes, max_bytes=self.max_bytes)
@@ -0,0 +1,111 @@
+import os
+import time
+import json
+import logging
+import numpy as np
+
+MAGIC = b"ACPRING2"
+#seq is odd while the writer is changing the records (seqlock), readers retry until they copy them at an even seq
+HEADER = np.dtype([("magic", "S8"), ("seq", "<i8"), ("count", "<i8"), ("valid_from", "<f8"), ("capacity", "<i8"), ("header_size", "<i8")])
+VALUE_DTYPE = "<f4"
+
+
+class RingBuffer:
+    def __init__(self, fpath, parameters=None, capacity=8640, writer=False, logger=logging.getLogger()):
+        '''
+        Fixed-size memory-mapped ring of the most recent readings of one sensor: packed records of acp_ts (float64)
+        and one float32 per parameter (NaN if missing).
+        The header holds count (records ever written) and valid_from: the ring has every reading received since
+        valid_from (epoch), the start of the ingest or the oldest record left after wrapping. seq is incremented
+        before and after each append, readers copy the records again if it was odd or changed (seqlock).
+        One writer process per file (it creates the file with parameters and capacity), any number of readers.
+        :raise OSError, ValueError: if a reader can not open the file
+        '''
+        self.logger=logger
+        self.fpath=fpath
+        self.writer=writer
+        if(writer and (not os.path.exists(fpath) or self.read_parameters(fpath)!=list(parameters))):
+            self.create(fpath, parameters, capacity)
+        self.open()
+        if(writer):
+            #readings received while no writer was running are missing: the ring is only valid from the next one
+            self.header["valid_from"]=np.inf
+
+    @staticmethod
+    def record_dtype(parameters):
+        return np.dtype([("acp_ts", "<f8")] + [("v%d" % i, VALUE_DTYPE) for i in range(len(parameters))])
+
+    @staticmethod
+    def read_parameters(fpath):
+        try:
+            with open(fpath, "rb") as ring_file:
+                header=np.frombuffer(ring_file.read(HEADER.itemsize), dtype=HEADER)[0]
+                if(header["magic"]!=MAGIC): return None
+                return json.loads(ring_file.read(int(header["header_size"])-HEADER.itemsize).decode().strip())
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def create(self, fpath, parameters, capacity):
+        names=json.dumps(list(parameters)).encode()
+        header_size=HEADER.itemsize + len(names)
+        header_size+=-header_size % 8
+        header=np.zeros(1, dtype=HEADER)
+        header[0]=(MAGIC, 0, 0, np.inf, capacity, header_size)
+        os.makedirs(os.path.dirname(fpath) or ".", exist_ok=True)
+        #written aside and moved into place, readers never see a partial file
+        tmp_path=fpath + ".tmp"
+        with open(tmp_path, "wb") as ring_file:
+            ring_file.write(header.tobytes() + names.ljust(header_size-HEADER.itemsize))
+            ring_file.truncate(header_size + capacity*self.record_dtype(parameters).itemsize)
+        os.replace(tmp_path, fpath)
+
+    def open(self):
+        self.parameters=self.read_parameters(self.fpath)
+        if(self.parameters is None): raise ValueError("Not a ring file: " + self.fpath)
+        mode="r+" if self.writer else "r"
+        self.header=np.memmap(self.fpath, dtype=HEADER, mode=mode, shape=(1,))[0]
+        self.capacity=int(self.header["capacity"])
+        self.records=np.memmap(self.fpath, dtype=self.record_dtype(self.parameters), mode=mode,
+                               offset=int(self.header["header_size"]), shape=(self.capacity,))
+        self.columns={name: i for i, name in enumerate(self.parameters)}
+        #a writer replacing the file (e.g., new parameters) creates a new inode, readers then reopen it
+        self.inode=os.stat(self.fpath).st_ino
+
+    def append(self, rows):
+        #rows of (acp_ts, {parameter: value}), written between two increments of seq
+        if(not rows): return
+        seq=int(self.header["seq"])
+        self.header["seq"]=seq+1
+        count=int(self.header["count"])
+        for acp_ts, values in rows:
+            #values that are not numbers (or missing) are stored as NaN
+            self.records[count % self.capacity]=(acp_ts,) + tuple(values[name] if isinstance(values.get(name), (int, float)) else np.nan for name in self.parameters)
+            count+=1
+        if(np.isinf(self.header["valid_from"])): self.header["valid_from"]=min(acp_ts for acp_ts, _ in rows)
+        if(count > self.capacity):
+            #the oldest record left, the older ones were overwritten
+            self.header["valid_from"]=max(self.header["valid_from"], self.records[count % self.capacity]["acp_ts"])
+        self.header["count"]=count
+        self.header["seq"]=seq+2
+
+    def read(self, ts_from, ts_to, retries=10):
+        '''
+        Copy of the records between ts_from and ts_to (epoch) sorted by acp_ts, and valid_from.
+        Returns (None, valid_from) if the records kept changing while they were copied.
+        '''
+        for _ in range(retries):
+            seq=int(self.header["seq"])
+            if(seq % 2):
+                #the writer is appending
+                time.sleep(0.001)
+                continue
+            count=int(self.header["count"])
+            valid_from=float(self.header["valid_from"])
+            records=np.array(self.records[:min(count, self.capacity)])
+            if(int(self.header["seq"])==seq):
+                records=records[(records["acp_ts"] >= ts_from) & (records["acp_ts"] <= ts_to)]
+                return np.sort(records, order="acp_ts", kind="stable"), valid_from
+        return None, float(self.header["valid_from"])
+
+    def values(self, records, name):
+        return records["v%d" % self.columns[name]]
@@ -0,0 +1,72 @@
+import logging
+import threading
+from collections import deque
+
+
+class WriteBehind:
+    def __init__(self, write, queue_size=10000, batch_size=500, flush_sec=5, logger=logging.getLogger()):
+        """
+        Write-behind buffer: put only queues the item, a background thread writes the queued items in batches
+        when batch_size of them are queued or flush_sec after the last flush. The queue is bounded, items put
+        while it is full are dropped (and counted) instead of blocking the caller. close drains the queue.
+        :param write: function writing a list of items, called from one thread at a time
+        """
+        self.logger=logger
+        self.write=write
+        self.queue_size=queue_size
+        self.batch_size=batch_size
+        self.flush_sec=flush_sec
+        self.lock=threading.Lock()
+        self.flush_lock=threading.Lock()
+        self.wakeup=threading.Event()
+        self.queue=deque()
+        self.closed=False
+        self.counters={"queued": 0, "written": 0, "batches": 0, "dropped": 0, "failed": 0}
+        self.thread=threading.Thread(target=self.run, name="write-behind", daemon=True)
+        self.thread.start()
+
+    def put(self, item):
+        with self.lock:
+            if(self.closed or len(self.queue) >= self.queue_size):
+                self.counters["dropped"]+=1
+                return False
+            self.queue.append(item)
+            self.counters["queued"]+=1
+            full=len(self.queue) >= self.batch_size
+        if(full): self.wakeup.set()
+        return True
+
+    def run(self):
+        while(not self.closed):
+            self.wakeup.wait(self.flush_sec)
+            self.wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        #writes everything queued so far, in batches of batch_size
+        with self.flush_lock:
+            while True:
+                with self.lock:
+                    batch=[self.queue.popleft() for _ in range(min(self.batch_size, len(self.queue)))]
+                if(not batch): return
+                try:
+                    self.write(batch)
+                    with self.lock:
+                        self.counters["written"]+=len(batch)
+                        self.counters["batches"]+=1
+                except Exception as e:
+                    #the writer thread must survive a failed write, the batch is lost
+                    self.logger.error("WriteBehind.flush - Could not write " + str(len(batch)) + " items: " + str(e))
+                    with self.lock: self.counters["failed"]+=len(batch)
+
+    def close(self, timeout=None):
+        with self.lock:
+            if(self.closed): return
+            self.closed=True
+        self.wakeup.set()
+        self.thread.join(timeout)
+        self.flush()
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, pending=len(self.queue))
@@ -1,17 +1,111 @@
 import asyncio
+import functools
+import json
 import logging
 import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union
 
 import uvicorn
-from fastapi import FastAPI, WebSocket
+from fastapi import FastAPI, HTTPException, WebSocket
 
 from api.providers import ApiProvider, Client
-from api.validators import HistoricalDataRequestBody
+from api.validators import (BatchHistoricalDataRequestBody,
+                            HistoricalDataRequestBody)
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 import os
 
 api_provider = ApiProvider()
 
+# History reads (file I/O, decoding, pandas) block, so they run in a bounded
+# thread pool instead of on the event loop that serves the websockets
+read_pool = ThreadPoolExecutor(
+    max_workers=api_provider.api_config.get("read_workers", 4),
+    thread_name_prefix="history")
+read_slots = asyncio.Semaphore(
+    api_provider.api_config.get("max_concurrent_reads", 8))
+read_timeout = api_provider.api_config.get("read_timeout_sec", 30)
+
+
+def release_when_done(future, loop):
+    """Releases a read slot once the read in future ends. A read that timed
+    out keeps running in its thread, so it keeps its slot until then."""
+    def release(_):
+        try:
+            loop.call_soon_threadsafe(read_slots.release)
+        except RuntimeError:
+            pass  # the loop is closed (shutdown)
+    future.add_done_callback(release)
+
+
+async def run_read(func, *args, **kwargs):
+    """Runs a blocking read in the read pool, at most max_concurrent_reads
+    at a time, and fails with 504 after read_timeout_sec (including the wait
+    for a free slot)."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + read_timeout
+    try:
+        await asyncio.wait_for(read_slots.acquire(), read_timeout)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="History read timed out")
+    try:
+        future = read_pool.submit(functools.partial(func, *args, **kwargs))
+    except BaseException:
+        read_slots.release()
+        raise
+    release_when_done(future, loop)
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future),
+                                      max(0, deadline - loop.time()))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="History read timed out")
+
+
+async def stream_read(chunks):
+    """Streams a blocking generator, producing each chunk in the read pool.
+    Like run_read, the stream waits for one of the max_concurrent_reads slots
+    and fails with 504 after read_timeout_sec; it keeps the slot until it
+    ends (or the chunk being produced ends). A chunk taking longer than
+    read_timeout_sec ends the stream with an error line."""
+    stream = stream_chunks(chunks)
+    # runs the stream up to its slot, before the response starts: a started
+    # stream is closed (and its slot released) even if it is never iterated
+    await stream.__anext__()
+    return stream
+
+
+async def stream_chunks(chunks):
+    loop = asyncio.get_running_loop()
+    try:
+        await asyncio.wait_for(read_slots.acquire(), read_timeout)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="History read timed out")
+    future = None
+    try:
+        yield None  # the slot is taken
+        while True:
+            future = read_pool.submit(next, chunks, None)
+            try:
+                chunk = await asyncio.wait_for(asyncio.wrap_future(future),
+                                               read_timeout)
+            except asyncio.TimeoutError:
+                logging.error("History stream timed out")
+                # the lines already sent are complete, the client is told
+                # the rest is missing
+                yield (json.dumps({"error": "History read timed out"})
+                       + "\n").encode()
+                return
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        if future is None or future.done():
+            read_slots.release()
+        else:
+            release_when_done(future, loop)
+
+
 app = FastAPI()
 origins = ["*"]
 
@@ -24,6 +118,18 @@ app.add_middleware(
 )
 
 
+@app.on_event("startup")
+async def startup():
+    # the MQTT thread hands live messages over to this loop
+    api_provider.hub.bind(asyncio.get_running_loop())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    # drain the live messages queued for the history database
+    await asyncio.get_running_loop().run_in_executor(None, api_provider.close)
+
+
 @app.get("/")  # GET /
 async def root():
     return {"message": "Hello World"}
@@ -31,17 +137,73 @@ async def root():
 
 @app.post("/history/")  # POST /history/ with HistoricalDataRequestBody
 async def historical_data(req_body: HistoricalDataRequestBody):
-    return api_provider.get_historical_data(
+    if req_body.format == "ndjson":
+        return StreamingResponse(await stream_read(
+            api_provider.stream_historical_data(
+                req_body.acp_id,
+                *req_body.time_range(),
+                limit=req_body.limit,
+                order=req_body.order,
+                bucket=req_body.bucket,
+                agg=req_body.agg)),
+            media_type="application/x-ndjson")
+
+    if req_body.format in ("columnar", "binary"):
+        content = await run_read(
+            api_provider.get_historical_data,
+            req_body.acp_id,
+            *req_body.time_range(),
+            return_type=req_body.format,
+            limit=req_body.limit,
+            order=req_body.order,
+            bucket=req_body.bucket,
+            agg=req_body.agg,
+            max_points=req_body.max_points)
+        return Response(
+            content, media_type="application/json"
+            if req_body.format == "columnar" else "application/octet-stream")
+
+    return await run_read(
+        api_provider.get_historical_data,
         req_body.acp_id,
-        req_body.start_time,
-        req_body.end_time,
-        return_type="dict"
+        *req_body.time_range(),
+        return_type="dict",
+        limit=req_body.limit,
+        order=req_body.order,
+        bucket=req_body.bucket,
+        agg=req_body.agg,
+        max_points=req_body.max_points
     )
 
 
-@app.get("/latest/")  # GET /latest/
-async def latest_data():
-    return api_provider.get_latest_data()
+# POST /history/batch/ with BatchHistoricalDataRequestBody
+@app.post("/history/batch/")
+async def batch_historical_data(req_body: BatchHistoricalDataRequestBody):
+    data = await run_read(
+        api_provider.get_batch_historical_data,
+        req_body.acp_ids,
+        *req_body.time_range(),
+        return_type="columnar" if req_body.format == "columnar" else "dict",
+        limit=req_body.limit,
+        order=req_body.order,
+        bucket=req_body.bucket,
+        agg=req_body.agg,
+        max_points=req_body.max_points)
+    if req_body.format == "columnar":
+        return Response(data, media_type="application/json")
+    return data
+
+
+# GET /latest/ | max_age (s) skips stale readings, staleness=true adds their age
+@app.get("/latest/")
+async def latest_data(max_age: Union[float, None] = None,
+                      staleness: bool = False):
+    return api_provider.get_latest_data(max_age, staleness)
+
+
+@app.get("/stats/")  # GET /stats/ | query cache hits/misses and live counters
+async def stats():
+    return api_provider.get_stats()
 
 
 @app.websocket("/ws/")  # WebSocket /ws/
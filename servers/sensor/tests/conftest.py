@@ -0,0 +1,58 @@
+import os
+import sys
+import json
+import base64
+import struct
+from datetime import datetime, timezone
+import pytest
+
+#modules are imported as in main.py (lib.*, etl.*, api.*), from servers/sensor
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ACP_ID = "enl-iaqco3-000001"
+
+
+def enlink_frame(temperature=None, humidity=None, co2_ppm=None):
+    #Enlink payload (see etl.decoders.decoder_ttn) with the readings given
+    frame = b""
+    if (temperature is not None): frame += b"\x01" + struct.pack(">h", round(temperature * 10))
+    if (humidity is not None): frame += b"\x02" + struct.pack(">B", humidity)
+    if (co2_ppm is not None): frame += b"\x08" + struct.pack(">H", co2_ppm)
+    return frame
+
+
+def ttn_line(acp_ts, frame, acp_id=ACP_ID, decoded_payload=None):
+    received_at = datetime.fromtimestamp(acp_ts, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+    #TTN v3 uplink as archived by the MQTT client
+    uplink = {"end_device_ids": {"device_id": acp_id, "application_ids": {"application_id": "app"}, "dev_eui": "0011"},
+              "received_at": received_at,
+              "uplink_message": {"frm_payload": base64.b64encode(frame).decode(), "received_at": received_at,
+                                 "rx_metadata": [{"gateway_ids": {"gateway_id": "gw1"}, "rssi": -90, "timestamp": 123}],
+                                 "settings": {"timestamp": 123}}}
+    if (decoded_payload is not None): uplink["uplink_message"]["decoded_payload"] = decoded_payload
+    return json.dumps(uplink) + "\n"
+
+
+@pytest.fixture
+def archive_path(tmp_path):
+    '''
+    Writes day files <tmp_path>/data/<acp_id>/<acp_id>_YYYY-MM-DD.txt from (acp_ts, frame) readings, returns the file paths.
+    '''
+    data_path = tmp_path / "data"
+
+    def write(readings, acp_id=ACP_ID):
+        days = dict()
+        for acp_ts, frame in readings:
+            day = datetime.fromtimestamp(acp_ts).strftime("%Y-%m-%d")
+            days.setdefault(day, []).append(ttn_line(acp_ts, frame, acp_id))
+        fpaths = list()
+        for day, lines in sorted(days.items()):
+            fpath = data_path / acp_id / (acp_id + "_" + day + ".txt")
+            fpath.parent.mkdir(parents=True, exist_ok=True)
+            fpath.write_text("".join(lines))
+            fpaths.append(str(fpath))
+        return fpaths
+
+    data_path.mkdir()
+    write.path = str(data_path)
+    return write
@@ -0,0 +1,181 @@
+import os
+from datetime import datetime
+import numpy as np
+import pytest
+from conftest import ACP_ID, enlink_frame, ttn_line
+import etl.FileManager
+from etl.FileManager import FileManager
+from etl.decoders.decoder import Decoder
+
+PARAMETERS = ["acp_id", "acp_ts", "temperature", "co2_ppm", "humidity"]
+DAY = datetime(2023, 3, 1)
+
+
+def day_readings():
+    #a reading a minute, only humidity in the first hour, so columns appear in another order than in the parameters
+    start = DAY.timestamp()
+    readings = list()
+    for i in range(24 * 60):
+        if (i < 60): readings.append((start + i * 60, enlink_frame(humidity=40)))
+        else: readings.append((start + i * 60, enlink_frame(temperature=20 + (i % 50) / 10, humidity=40 + i % 7, co2_ppm=400 + i)))
+    return readings
+
+
+def file_manager(archive_path, tmp_path, **cfg):
+    return FileManager(dict({"fs_data_paths": [archive_path.path], "fs_cache_path": str(tmp_path / "cache")}, **cfg))
+
+
+def test_window_rows(archive_path, tmp_path):
+    archive_path(day_readings())
+    fm = file_manager(archive_path, tmp_path)
+    df = fm.read({"acp_id": ACP_ID, "from": "2023-03-01T12:00:00", "to": "2023-03-01T12:30:00", "parameters": list(PARAMETERS)})
+    assert len(df) == 31
+    assert df["acp_ts"].min() == datetime(2023, 3, 1, 12).timestamp()
+    assert df["acp_ts"].max() == datetime(2023, 3, 1, 12, 30).timestamp()
+    assert df["co2_ppm"].tolist() == list(range(400 + 720, 400 + 751))
+
+
+@pytest.mark.parametrize("hours, rows", [((12, 13), 61), ((0, 1), 61), ((0.5, 1.5), 61)])
+def test_window_same_with_or_without_cached_day(archive_path, tmp_path, hours, rows):
+    fpath, = archive_path(day_readings())
+    fm = file_manager(archive_path, tmp_path)
+    window = (DAY.timestamp() + hours[0] * 3600, DAY.timestamp() + hours[1] * 3600)
+    decoded = fm.read_day_file(fpath, DAY, PARAMETERS, window=window)
+    whole_day = fm.read_day_file(fpath, DAY, PARAMETERS)
+    #the whole day is now cached, the window is trimmed from it
+    assert fm.day_cache.load(fpath, PARAMETERS) is not None
+    cached = fm.read_day_file(fpath, DAY, PARAMETERS, window=window)
+    assert list(whole_day.columns) == ["acp_id", "acp_ts", "humidity", "temperature", "co2_ppm"]
+    assert list(decoded.columns) == list(cached.columns) == [name for name in PARAMETERS if name in decoded.columns]
+    assert decoded.equals(cached)
+    assert len(decoded) == rows
+
+
+def test_window_rollup_same_with_or_without_cached_day(archive_path, tmp_path):
+    fpath, = archive_path(day_readings())
+    fm = file_manager(archive_path, tmp_path)
+    window = (datetime(2023, 3, 1, 0, 30).timestamp(), datetime(2023, 3, 1, 2).timestamp())
+    decoded = fm.read_day_file(fpath, DAY, PARAMETERS, rollup=(900, "mean"), window=window)
+    fm.read_day_file(fpath, DAY, PARAMETERS)
+    cached = fm.read_day_file(fpath, DAY, PARAMETERS, rollup=(900, "mean"), window=window)
+    assert decoded.equals(cached)
+    assert len(decoded) == 7
+    assert np.isnan(decoded["co2_ppm"].iloc[0])
+
+
+def two_days():
+    return [(DAY.timestamp() + day * 86400 + i * 600, enlink_frame(temperature=20, humidity=40, co2_ppm=400 + i)) for day in range(2) for i in range(10)]
+
+
+QUERIES = [{}, {"limit": 15}, {"limit": 5, "order": "desc"}, {"bucket": "1h"}]
+
+
+@pytest.mark.parametrize("options", QUERIES)
+@pytest.mark.parametrize("read_workers", [0, 2])
+def test_day_file_removed_after_indexing(archive_path, tmp_path, options, read_workers):
+    first, second = archive_path(two_days())
+    fm = file_manager(archive_path, tmp_path, fs_read_workers=read_workers, fs_parallel_min_files=1)
+    os.remove(first)
+    df = fm.read(dict({"acp_id": ACP_ID, "from": "01/03/2023", "to": "02/03/2023", "parameters": list(PARAMETERS)}, **options))
+    assert df["acp_ts"].min() >= DAY.timestamp() + 86400
+    #the 5 newest readings are all in the second day, the first one is not opened
+    if ("order" not in options): assert fm.file_index[ACP_ID][1] == [second]
+
+
+@pytest.mark.parametrize("options", QUERIES)
+def test_day_file_renamed_after_indexing(archive_path, tmp_path, options):
+    #e.g., moved into a subdirectory of the sensor: the day is read from its new path
+    first, _ = archive_path(two_days())
+    fm = file_manager(archive_path, tmp_path, fs_cache_path=None)
+    query = dict({"acp_id": ACP_ID, "from": "01/03/2023", "to": "02/03/2023", "parameters": list(PARAMETERS)}, **options)
+    expected = fm.read(dict(query))
+    moved = os.path.join(os.path.dirname(first), "2023", os.path.basename(first))
+    os.makedirs(os.path.dirname(moved))
+    os.rename(first, moved)
+    assert fm.read(dict(query)).equals(expected)
+    if ("order" not in options): assert moved in fm.file_index[ACP_ID][1]
+
+
+def test_broken_read_pool_is_shut_down(archive_path, tmp_path):
+    archive_path(two_days())
+    fm = file_manager(archive_path, tmp_path, fs_cache_path=None, fs_read_workers=2, fs_parallel_min_files=1)
+    query = {"acp_id": ACP_ID, "from": "01/03/2023", "to": "02/03/2023", "parameters": list(PARAMETERS)}
+    expected = fm.read(dict(query))
+    pool = fm.read_pool
+    assert pool._mp_context.get_start_method() == "forkserver"
+    shutdown = list()
+    pool_shutdown = pool.shutdown
+    pool.shutdown = lambda *args, **kwargs: shutdown.append(kwargs) or pool_shutdown(*args, **kwargs)
+    for process in pool._processes.values():
+        process.kill()
+    #the days are decoded sequentially, the broken pool is shut down and a new one started by the next read
+    assert fm.read(dict(query)).equals(expected)
+    assert fm.read_pool is None and shutdown == [{"wait": False, "cancel_futures": True}]
+    assert fm.read(dict(query)).equals(expected)
+    assert fm.read_pool is not pool
+
+
+def test_lines_appended_during_decode_are_not_hidden_by_the_cache(archive_path, tmp_path, monkeypatch):
+    #a late uplink appended to a closed day while it is decoded: the cached frame misses it, so it must not be valid
+    fpath, = archive_path(day_readings()[:100])
+    fm = file_manager(archive_path, tmp_path)
+    decode = etl.FileManager.decode_day_file
+
+    def decode_then_append(*args, **kwargs):
+        df = decode(*args, **kwargs)
+        with open(fpath, "a") as day_file: day_file.write(ttn_line(DAY.timestamp() + 100 * 60, enlink_frame(co2_ppm=999)))
+        return df
+
+    monkeypatch.setattr(etl.FileManager, "decode_day_file", decode_then_append)
+    assert len(fm.read_day_file(fpath, DAY, PARAMETERS)) == 100
+    monkeypatch.setattr(etl.FileManager, "decode_day_file", decode)
+    df = fm.read_day_file(fpath, DAY, PARAMETERS)
+    assert len(df) == 101 and df["co2_ppm"].iloc[-1] == 999
+
+
+def ring_file_managers(archive_path, tmp_path):
+    #live messages stored in the day files and in the ring, every other one without temperature and co2
+    readings = [(DAY.timestamp() + i * 60, enlink_frame(humidity=40) if i % 2 else enlink_frame(temperature=21, co2_ppm=400 + i)) for i in range(24 * 60)]
+    lines = [ttn_line(acp_ts, frame) for acp_ts, frame in readings]
+    cfg = {"fs_data_paths": [archive_path.path], "fs_store_path": archive_path.path, "fs_ring_path": str(tmp_path / "rings")}
+    writer = FileManager(dict(cfg), sensor_parameters={"enl-iaqco3": ["temperature", "humidity", "co2_ppm"]})
+    writer.store_many([Decoder.transform(line, "v3/app/devices/" + ACP_ID + "/up") for line in lines], lines)
+    #read with and without the ring
+    return FileManager(dict(cfg)), FileManager({"fs_data_paths": [archive_path.path]})
+
+
+RING_QUERIES = [{}, {"limit": 5, "order": "desc"}, {"bucket": "15m", "agg": "max"}]
+
+
+def ring_query(**options):
+    return dict({"acp_id": ACP_ID, "from": "2023-03-01T06:00:00", "to": "2023-03-01T07:00:00", "parameters": ["acp_id", "acp_ts", "temperature", "co2_ppm"]}, **options)
+
+
+def assert_same_readings(df, expected):
+    df, expected = df.reset_index(drop=True), expected.reset_index(drop=True)
+    assert list(df.columns) == list(expected.columns)
+    assert len(df) == len(expected) > 0
+    for name in df.columns[1:]:
+        assert df[name].astype(float).tolist() == pytest.approx(expected[name].astype(float).tolist(), nan_ok=True)
+
+
+def test_ring_reads_as_the_day_files(archive_path, tmp_path):
+    ring_fm, file_fm = ring_file_managers(archive_path, tmp_path)
+    assert ring_fm.read_ring(ACP_ID, datetime(2023, 3, 1, 6), datetime(2023, 3, 1, 7), ring_query()["parameters"]) is not None
+    for options in RING_QUERIES:
+        assert_same_readings(ring_fm.read(ring_query(**options)), file_fm.read(ring_query(**options)))
+
+
+@pytest.mark.parametrize("options", RING_QUERIES)
+def test_read_batch_reads_the_ring_first(archive_path, tmp_path, monkeypatch, options):
+    ring_fm, file_fm = ring_file_managers(archive_path, tmp_path)
+    expected = file_fm.read(ring_query(**options))
+
+    def no_day_files(*args, **kwargs):
+        raise AssertionError("day files read for a window in the ring")
+
+    monkeypatch.setattr(ring_fm, "read_day_files", no_day_files)
+    monkeypatch.setattr(ring_fm, "read_tail", no_day_files)
+    df = ring_fm.read_batch([ring_query(**options)])[ACP_ID]
+    assert_same_readings(df, expected)
+    assert_same_readings(df, ring_fm.read(ring_query(**options)))
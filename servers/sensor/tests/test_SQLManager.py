@@ -0,0 +1,121 @@
+import sqlite3
+from datetime import datetime
+import pytest
+from conftest import ACP_ID, enlink_frame, ttn_line
+from etl.decoders.decoder import Decoder
+from etl.FileManager import FileManager
+from etl.SQLManager import SQLManager
+from etl.sqlImport import backfill
+
+PARAMETERS = ["acp_id", "acp_ts", "temperature", "humidity", "co2_ppm"]
+START = datetime(2023, 3, 1).timestamp()
+
+
+def readings(days=2):
+    #a reading every 10 minutes, co2 missing from some of them
+    return [(START + i * 600, enlink_frame(temperature=20 + i % 30 / 10, humidity=40 + i % 20, co2_ppm=None if i % 9 == 0 else 400 + i))
+            for i in range(days * 144)]
+
+
+QUERIES = [
+    {"from": "01/03/2023", "to": "02/03/2023"},
+    {"from": "2023-03-01T10:00:00", "to": "2023-03-02T02:00:00"},
+    {"from": "01/03/2023", "to": "02/03/2023", "limit": 5, "order": "desc"},
+    {"from": "01/03/2023", "to": "02/03/2023", "bucket": "1h", "agg": "max"},
+    {"from": "01/03/2023", "to": "02/03/2023", "bucket": "15m", "agg": "mean", "limit": 3},
+]
+
+
+def query(**options):
+    return dict({"acp_id": ACP_ID, "parameters": list(PARAMETERS)}, **options)
+
+
+def assert_same_frame(sql_df, file_df):
+    sql_df, file_df = sql_df.reset_index(drop=True), file_df.reset_index(drop=True)
+    assert list(sql_df.columns) == list(file_df.columns)
+    assert len(sql_df) == len(file_df) > 0
+    for name in sql_df.columns:
+        if(name=="acp_id"): assert sql_df[name].tolist() == file_df[name].tolist()
+        else: assert sql_df[name].astype(float).tolist() == pytest.approx(file_df[name].astype(float).tolist(), nan_ok=True)
+
+
+@pytest.fixture
+def stores(archive_path, tmp_path):
+    #the same readings in the day files and, stored as live messages, in the SQL store
+    archive_path(readings())
+    file_manager = FileManager({"fs_data_paths": [archive_path.path]})
+    sql_manager = SQLManager({"sql_path": str(tmp_path / "readings.sqlite")})
+    messages = [Decoder.transform(ttn_line(acp_ts, frame), "v3/app/devices/" + ACP_ID + "/up") for acp_ts, frame in readings()]
+    for start in range(0, len(messages), 100):
+        sql_manager.store_many(messages[start:start + 100])
+    yield file_manager, sql_manager
+    sql_manager.close()
+
+
+@pytest.mark.parametrize("options", QUERIES)
+def test_live_messages_read_as_the_day_files(stores, options):
+    file_manager, sql_manager = stores
+    assert_same_frame(sql_manager.read(query(**options)), file_manager.read(query(**options)))
+
+
+def test_read_iter_as_the_day_files(stores):
+    file_manager, sql_manager = stores
+    for options in QUERIES[:2] + QUERIES[3:4]:
+        options = {k: v for k, v in options.items() if k not in ("limit", "order")}
+        sql_chunks, file_chunks = list(sql_manager.read_iter(query(**options))), list(file_manager.read_iter(query(**options)))
+        assert [len(chunk) for chunk in sql_chunks] == [len(chunk) for chunk in file_chunks]
+        for sql_df, file_df in zip(sql_chunks, file_chunks):
+            assert_same_frame(sql_df, file_df)
+
+
+def test_store_again_replaces_readings(stores):
+    _, sql_manager = stores
+    before = sql_manager.read(query(**QUERIES[0]))
+    sql_manager.store(Decoder.transform(ttn_line(START, enlink_frame(temperature=30)), "v3/app/devices/" + ACP_ID + "/up"))
+    after = sql_manager.read(query(**QUERIES[0]))
+    assert len(after) == len(before)
+    assert after["temperature"].iloc[0] == 30
+
+
+def test_gateways_and_data_connectors(stores):
+    _, sql_manager = stores
+    connection = sqlite3.connect(sql_manager.db_path)
+    assert connection.execute("SELECT gateway_id, acp_id FROM gateways").fetchall() == [("gw1", ACP_ID)]
+    assert connection.execute("SELECT data_connector_id, data_connector_dev_eui, acp_id FROM data_connectors").fetchall() == [("app", "0011", ACP_ID)]
+    connection.close()
+
+
+def test_backfill_from_the_archive(archive_path, tmp_path):
+    archive_path(readings())
+    db_cfg = {"fs_data_paths": [archive_path.path], "sql_path": str(tmp_path / "readings.sqlite")}
+    sensor_parameters = {"enl-iaqco3": ["temperature", "humidity", "co2_ppm"]}
+    assert backfill(db_cfg, sensor_parameters) == 288
+    #an interrupted import can run again
+    assert backfill(db_cfg, sensor_parameters) == 288
+    file_manager, sql_manager = FileManager({"fs_data_paths": [archive_path.path]}), SQLManager(db_cfg)
+    for options in QUERIES:
+        assert_same_frame(sql_manager.read(query(**options)), file_manager.read(query(**options)))
+    sql_manager.close()
+
+
+def test_store_again_keeps_the_other_parameters(stores):
+    _, sql_manager = stores
+    #the same reading stored again with co2 only (e.g., a second frame), temperature and humidity are kept
+    sql_manager.store(Decoder.transform(ttn_line(START + 600, enlink_frame(co2_ppm=999)), "v3/app/devices/" + ACP_ID + "/up"))
+    df = sql_manager.read(query(**QUERIES[0])).set_index("acp_ts")
+    assert df.loc[START + 600, "co2_ppm"] == 999
+    assert df.loc[START + 600, "temperature"] == pytest.approx(20.1)
+    assert df.loc[START + 600, "humidity"] == 41
+
+
+def test_readings_without_the_requested_parameters_as_the_day_files(archive_path, tmp_path):
+    #every other reading has co2 only, none of the parameters requested below
+    day = [(START + i * 600, enlink_frame(co2_ppm=400 + i) if i % 2 else enlink_frame(temperature=20, humidity=40)) for i in range(144)]
+    archive_path(day)
+    file_manager = FileManager({"fs_data_paths": [archive_path.path]})
+    sql_manager = SQLManager({"sql_path": str(tmp_path / "readings.sqlite")})
+    sql_manager.store_many([Decoder.transform(ttn_line(acp_ts, frame), "v3/app/devices/" + ACP_ID + "/up") for acp_ts, frame in day])
+    for options in QUERIES:
+        q = dict(query(**options), parameters=["acp_id", "acp_ts", "temperature", "humidity"])
+        assert_same_frame(sql_manager.read(q), file_manager.read(dict(q, parameters=list(q["parameters"]))))
+    sql_manager.close()
@@ -0,0 +1,116 @@
+import os
+from datetime import datetime
+import pytest
+import lib.dayArchive as archive
+from conftest import ACP_ID, enlink_frame, ttn_line
+from etl.archiveCompact import compact_day
+from etl.FileManager import FileManager
+
+START = datetime(2023, 3, 1).timestamp()
+
+
+def lines(n, start=START):
+    return [ttn_line(start + i * 60, enlink_frame(co2_ppm=400 + i)).encode() for i in range(n)]
+
+
+@pytest.mark.parametrize("method", ["gz"] + (["zst"] if archive.zstandard is not None else []))
+def test_write_archive_round_trip(tmp_path, method):
+    fpath = str(tmp_path / ("day.txt." + method))
+    day_lines = lines(300)
+    blocks = archive.write_archive(fpath, day_lines, [START + i * 60 for i in range(300)], method, block_size=4096)
+    assert len(blocks) > 5
+    assert archive.read_index(fpath) == blocks
+    assert archive.read_bytes(fpath) == b"".join(day_lines)
+    assert [line.encode() for line in archive.read_lines(fpath)] == day_lines
+    #only the blocks of the range are read, each block holds whole lines
+    ranged = [line.encode() for line in archive.read_lines(fpath, START + 100 * 60, START + 110 * 60)]
+    assert set(day_lines[100:111]) <= set(ranged)
+    assert len(ranged) < len(day_lines) / 2
+    #from the last line of the block holding ts_to back to the first line
+    reversed_lines = [line.encode() + b"\n" for line in archive.reversed_lines(fpath, ts_to=START + 20 * 60)]
+    assert 21 <= len(reversed_lines) < len(day_lines)
+    assert reversed_lines == day_lines[:len(reversed_lines)][::-1]
+
+
+def test_index_of_another_file_version_is_ignored(tmp_path):
+    fpath = str(tmp_path / "day.txt.gz")
+    archive.write_archive(fpath, lines(10), [None] * 10)
+    with open(fpath, "ab") as archive_file: archive_file.write(b"\0")
+    assert archive.read_index(fpath) is None
+
+
+def test_is_day_file():
+    assert archive.is_day_file(ACP_ID + "_2023-03-01.txt")
+    assert archive.is_day_file(ACP_ID + "_2023-03-01.txt.gz")
+    assert not archive.is_day_file(ACP_ID + "_2023-03-01.txt.gz.idx")
+    assert not archive.is_day_file(ACP_ID + "_2023-03-01.txt.123.compact.tmp")
+
+
+def read_all(data_path):
+    fm = FileManager({"fs_data_paths": [data_path]})
+    return fm.read({"acp_id": ACP_ID, "from": "01/03/2023", "to": "01/03/2023", "parameters": ["acp_id", "acp_ts", "co2_ppm"]})
+
+
+def test_compact_day_merges_late_lines(archive_path):
+    readings = [(START + i * 60, enlink_frame(co2_ppm=400 + i)) for i in range(200)]
+    fpath, = archive_path(readings[:150])
+    compact_day(fpath)
+    assert not os.path.exists(fpath)
+    assert os.path.exists(fpath + ".gz") and os.path.exists(fpath + ".gz.idx")
+    #late lines (out of order) go to a new plain file, merged by the next run
+    archive_path(readings[150:] + readings[100:101])
+    compact_day(fpath)
+    df = read_all(archive_path.path)
+    assert len(df) == 201
+    assert df["acp_ts"].is_monotonic_increasing
+
+
+def test_compact_day_keeps_lines_appended_meanwhile(archive_path, monkeypatch):
+    fpath, = archive_path([(START + i * 60, enlink_frame(co2_ppm=400 + i)) for i in range(100)])
+    write_archive = archive.write_archive
+    appended = list()
+
+    def write_archive_while_appending(*args, **kwargs):
+        blocks = write_archive(*args, **kwargs)
+        if (not appended):
+            #a writer that opened the day file before it was moved, and a new one
+            compacting, = [os.path.join(os.path.dirname(fpath), name) for name in os.listdir(os.path.dirname(fpath)) if name.endswith(".compact.tmp")]
+            with open(compacting, "ab") as day_file: day_file.write(lines(1, START + 100 * 60)[0])
+            with open(fpath, "ab") as day_file: day_file.write(lines(1, START + 101 * 60)[0])
+            appended.append(True)
+        return blocks
+
+    monkeypatch.setattr(archive, "write_archive", write_archive_while_appending)
+    compact_day(fpath)
+    assert os.path.exists(fpath)
+    assert len(archive.read_bytes(fpath + ".gz").splitlines()) == 101
+    assert len(read_all(archive_path.path)) == 102
+
+
+def test_compact_day_restores_the_plain_file_on_error(archive_path, monkeypatch):
+    fpath, = archive_path([(START + i * 60, enlink_frame(co2_ppm=400 + i)) for i in range(10)])
+    content = open(fpath, "rb").read()
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(archive, "write_archive", fail)
+    with pytest.raises(OSError):
+        compact_day(fpath)
+    assert open(fpath, "rb").read() == content
+    assert [name for name in os.listdir(os.path.dirname(fpath)) if name.endswith(".tmp")] == []
+
+
+@pytest.mark.parametrize("options", [{}, {"limit": 10, "order": "desc"}, {"from": "2023-03-01T01:00:00", "to": "2023-03-01T02:00:00"}, {"bucket": "1h"}])
+@pytest.mark.parametrize("cache", [False, True])
+def test_day_compacted_between_two_reads(archive_path, tmp_path, options, cache):
+    #the index of the FileManager still lists the plain file when the second read runs
+    fpath, = archive_path([(START + i * 60, enlink_frame(co2_ppm=400 + i)) for i in range(300)])
+    fm = FileManager({"fs_data_paths": [archive_path.path], "fs_cache_path": str(tmp_path / "cache") if cache else None})
+    query = dict({"acp_id": ACP_ID, "from": "01/03/2023", "to": "01/03/2023", "parameters": ["acp_id", "acp_ts", "co2_ppm"]}, **options)
+    before = fm.read(dict(query))
+    compact_day(fpath)
+    after = fm.read(dict(query))
+    assert len(after) == len(before) > 0
+    assert after["co2_ppm"].tolist() == before["co2_ppm"].tolist()
+    assert fm.file_index[ACP_ID][1] == [fpath + ".gz"]
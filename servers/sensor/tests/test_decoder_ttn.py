@@ -0,0 +1,76 @@
+import os
+import json
+import math
+import numpy as np
+import pytest
+from etl.decoders.decoder_ttn import Decoder_TTN
+
+#Enlink frames with the output of decode_enlink before the table-driven rewrite ("baseline", or the exception it
+#raised) and the output expected now. They only differ where the baseline raised, and for DIVERGENCES.
+with open(os.path.join(os.path.dirname(__file__), "fixtures", "enlink_golden.json")) as golden_file:
+    GOLDEN = json.load(golden_file)
+
+#a gas value with an unknown gas byte was skipped without reading it, even if the frame ended before it
+DIVERGENCES = {"truncated gas ppb unknown gas"}
+
+
+def encode(obj):
+    #NaN compares equal to itself once encoded
+    return json.dumps(obj, sort_keys=True, allow_nan=True)
+
+
+@pytest.fixture(scope="module")
+def decoder():
+    return Decoder_TTN()
+
+
+@pytest.mark.parametrize("case", GOLDEN, ids=[case["name"] for case in GOLDEN])
+def test_decode_enlink_golden(decoder, case):
+    decoded = decoder.decode_enlink(bytes.fromhex(case["frame"]))
+    assert encode(decoded) == encode(case["expected"])
+    if ("raises" not in case["baseline"] and case["name"] not in DIVERGENCES):
+        assert encode(case["expected"]) == encode(case["baseline"])
+
+
+@pytest.mark.parametrize("case", [case for case in GOLDEN if case["baseline"].get("raises") == "IndexError"], ids=lambda case: case["name"])
+def test_truncated_frames_keep_the_fields_before(decoder, case):
+    #the baseline raised IndexError, the fields decoded before the truncated value are kept with an error entry
+    frame = bytes.fromhex(case["frame"])
+    decoded = decoder.decode_enlink(frame)
+    offset = int(decoded["error"].split()[2])
+    assert decoded["error"] == "Error at " + str(offset) + " byte value " + str(frame[offset])
+    assert {k: v for k, v in decoded.items() if k != "error"} == decoder.decode_enlink(frame[:offset])
+
+
+def test_truncated_gas_with_unknown_gas_byte_is_an_error(decoder):
+    case, = [case for case in GOLDEN if case["name"] in DIVERGENCES]
+    assert case["baseline"] == {}
+    assert decoder.decode_enlink(bytes.fromhex(case["frame"])) == {"error": "Error at 0 byte value 97"}
+    #a whole value with an unknown gas byte is still skipped
+    assert decoder.decode_enlink(bytes.fromhex("6199") + bytes(4)) == {}
+
+
+def test_special_sizes(decoder):
+    #values ending exactly at the end of the frame are whole
+    assert decoder.decode_enlink(bytes.fromhex("0e01") + (7).to_bytes(4, "big")) == {"pulse_ip2": 7}
+    assert decoder.decode_enlink(bytes.fromhex("0f0102")) == {"mb_ex": [[1, 2]]}
+    assert decoder.decode_enlink(bytes.fromhex("4021800241")) == {"cpu_temp_dep": 33.5, "humidity": 65}
+    assert "error" in decoder.decode_enlink(bytes.fromhex("0e0100000007")[:-1])
+
+
+def test_batch_matches_decode_enlink(decoder):
+    frames = [bytes.fromhex(case["frame"]) for case in GOLDEN]
+    columns = decoder.decode_enlink_batch(frames)
+    for row, frame in enumerate(frames):
+        decoded = decoder.decode_enlink(frame)
+        for name, column in columns.items():
+            value = decoded.get(name)
+            if (not isinstance(value, (int, float))):
+                #missing, or a list (modbus, corrosion) or the error
+                assert np.isnan(column[row]), (name, row)
+            elif (math.isnan(value)):
+                assert np.isnan(column[row])
+            else:
+                assert column[row] == value, (name, row)
+        scalars = {name for name, value in decoded.items() if isinstance(value, (int, float))}
+        assert scalars <= set(columns)
@@ -0,0 +1,39 @@
+import os
+import copy
+import pandas as pd
+import pytest
+import lib.iolibs as io
+from conftest import enlink_frame, ttn_line
+from etl.etl import ETL
+
+START = 1677628800 #2023-03-01T00:00:00Z
+
+
+@pytest.fixture
+def etl(tmp_path, monkeypatch):
+    #the ETL of basic.cfg, storing the live messages in a day archive and a ring in tmp_path (no broker connection)
+    monkeypatch.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    basic_cfg = copy.deepcopy(io.getBasicConfig("./cfg/basic.cfg"))
+    etl_cfg = basic_cfg["etl_default"]
+    etl_cfg["db_cfg"] = dict(etl_cfg["db_cfg"], fs_data_paths=[str(tmp_path)], fs_cache_path="", fs_store_path=str(tmp_path),
+                             fs_ring_path=str(tmp_path / "rings"), query_cache_bytes=0)
+    etl = ETL(basic_cfg, etl_cfg)
+    yield etl
+    etl.close()
+
+
+def test_live_messages_build_no_dataframe(etl, tmp_path, monkeypatch):
+    #live messages are counted and stored, pandas is only used by the reads
+    def no_dataframe(*args, **kwargs):
+        raise AssertionError("DataFrame built on the live path")
+
+    monkeypatch.setattr(pd, "DataFrame", no_dataframe)
+    etl.rt_manager.subscribe_query({"sensors": [{"acp_id": "enl-iaqco3-000001", "parameters": ["all"]}]})
+    topic = "v3/app/devices/enl-iaqco3-000001/up"
+    for i in range(20):
+        etl.handle_message(ttn_line(START + i * 60, enlink_frame(temperature=21.5, co2_ppm=400 + i)), topic)
+    etl.handle_message("not a message", topic)
+    etl.db_manager.flush()
+    assert etl.stats.snapshot() == {"received": 21, "decoded": 20, "dropped": 1}
+    day_file = tmp_path / "enl-iaqco3-000001" / "enl-iaqco3-000001_2023-03-01.txt"
+    assert len(day_file.read_text().splitlines()) == 20
@@ -0,0 +1,48 @@
+import struct
+from datetime import datetime
+import pytest
+from conftest import enlink_frame, ttn_line
+from lib.jsonReader import JSONReader
+
+START = datetime(2023, 3, 1).timestamp()
+PARAMETERS = ["acp_id", "acp_ts", "temperature", "humidity", "co2_ppm", "bvoc", "O3_ppb", "mb_int_val", "pressure_mbar", "error"]
+
+
+def day_lines():
+    #frames of several layouts, frames decoded one by one (modbus, truncated), decoded_payload values and bad lines
+    lines = list()
+    for i in range(300):
+        acp_ts = START + i * 60
+        if (i % 7 == 0): frame = enlink_frame(temperature=20 + i / 100)
+        elif (i % 11 == 0): frame = enlink_frame(humidity=i % 90) + b"\x12" + struct.pack(">f", i / 7) + b"\x61\x23" + struct.pack(">f", i / 3)
+        elif (i % 13 == 0): frame = b"\x10\x01" + struct.pack(">f", 2.5) + enlink_frame(co2_ppm=500)
+        elif (i % 17 == 0): frame = enlink_frame(humidity=50) + b"\x08\x01"
+        else: frame = enlink_frame(temperature=21.5, humidity=40 + i % 9, co2_ppm=400 + i)
+        decoded_payload = {"data": {"pressure_mbar": 1000 + i}} if i % 5 == 0 else ({"co2_ppm": 1} if i % 19 == 0 else None)
+        lines.append(ttn_line(acp_ts, frame, decoded_payload=decoded_payload))
+        if (i % 50 == 0): lines.append("not json\n")
+    return lines
+
+
+@pytest.mark.parametrize("parameters", [PARAMETERS, ["acp_id", "acp_ts", "co2_ppm"], ["humidity", "acp_ts"]])
+def test_bulk_decode_matches_line_decode(tmp_path, parameters):
+    fpath = tmp_path / "day.txt"
+    fpath.write_text("".join(day_lines()))
+    fast, slow = JSONReader(str(fpath), list(parameters)), JSONReader(str(fpath), list(parameters), fast=False)
+    fast.read_day_file()
+    slow.read_day_file()
+    assert list(fast.df.columns) == list(slow.df.columns)
+    assert fast.df.dtypes.equals(slow.df.dtypes)
+    assert fast.df.equals(slow.df)
+    assert len(fast.df) > 250
+
+
+def test_bulk_decode_window(tmp_path):
+    fpath = tmp_path / "day.txt"
+    fpath.write_text("".join(day_lines()))
+    reader = JSONReader(str(fpath), list(PARAMETERS))
+    reader.read_day_file(START + 3600, START + 7200)
+    acp_ts = reader.df["acp_ts"].astype(float)
+    #the lines around the window are decoded too, the caller trims them
+    assert acp_ts.min() <= START + 3600 and acp_ts.max() >= START + 7200
+    assert len(reader.df) < 150
@@ -0,0 +1,83 @@
+import multiprocessing
+import numpy as np
+import pytest
+from lib.ringBuffer import RingBuffer
+
+PARAMETERS = ["co2_ppm", "temperature"]
+
+
+def rows(start, n):
+    return [(float(ts), {"co2_ppm": ts * 2, "temperature": "n/a"}) for ts in range(start, start + n)]
+
+
+def test_round_trip(tmp_path):
+    fpath = str(tmp_path / "sensor.ring")
+    writer = RingBuffer(fpath, PARAMETERS, capacity=16, writer=True)
+    writer.append(rows(100, 10))
+    reader = RingBuffer(fpath)
+    assert reader.parameters == PARAMETERS
+    records, valid_from = reader.read(102, 105)
+    assert valid_from == 100
+    assert records["acp_ts"].tolist() == [102, 103, 104, 105]
+    assert reader.values(records, "co2_ppm").tolist() == [204, 206, 208, 210]
+    #values that are not numbers are NaN
+    assert np.isnan(reader.values(records, "temperature")).all()
+
+
+def test_wrap_moves_valid_from(tmp_path):
+    fpath = str(tmp_path / "sensor.ring")
+    writer = RingBuffer(fpath, PARAMETERS, capacity=16, writer=True)
+    writer.append(rows(0, 40))
+    records, valid_from = RingBuffer(fpath).read(0, 100)
+    assert records["acp_ts"].tolist() == list(range(24, 40))
+    assert valid_from == 24
+
+
+def test_writer_restart_and_new_parameters(tmp_path):
+    fpath = str(tmp_path / "sensor.ring")
+    RingBuffer(fpath, PARAMETERS, capacity=16, writer=True).append(rows(0, 4))
+    #readings received while no writer ran may be missing
+    restarted = RingBuffer(fpath, PARAMETERS, capacity=16, writer=True)
+    assert restarted.read(0, 100)[1] == np.inf
+    restarted.append(rows(10, 2))
+    assert RingBuffer(fpath).read(0, 100)[1] == 10
+    #other parameters recreate the file
+    RingBuffer(fpath, ["humidity"], capacity=16, writer=True)
+    assert RingBuffer(fpath).read(0, 100)[0].size == 0
+
+
+def test_reader_rejects_other_files(tmp_path):
+    fpath = tmp_path / "sensor.ring"
+    fpath.write_bytes(b"ACPRING1" + bytes(64))
+    with pytest.raises(ValueError):
+        RingBuffer(str(fpath))
+
+
+def append_forever(fpath, stop):
+    writer = RingBuffer(fpath, PARAMETERS, capacity=32, writer=True)
+    ts = 0
+    while (not stop.is_set()):
+        writer.append(rows(ts, 16))
+        ts += 16
+
+
+def test_reads_are_consistent_while_appending(tmp_path):
+    #records read while another process wraps the ring are whole, contiguous and match their acp_ts
+    fpath = str(tmp_path / "sensor.ring")
+    RingBuffer(fpath, PARAMETERS, capacity=32, writer=True)
+    stop = multiprocessing.Event()
+    process = multiprocessing.Process(target=append_forever, args=(fpath, stop))
+    process.start()
+    reader, reads = RingBuffer(fpath), 0
+    try:
+        for _ in range(20000):
+            records, _ = reader.read(0, np.inf)
+            if (records is None or records.size == 0): continue
+            reads += 1
+            ts = records["acp_ts"]
+            assert (np.diff(ts) == 1).all()
+            assert (reader.values(records, "co2_ppm") == ts * 2).all()
+    finally:
+        stop.set()
+        process.join()
+    assert reads > 0
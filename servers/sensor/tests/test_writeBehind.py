@@ -0,0 +1,110 @@
+import os
+import threading
+from datetime import datetime
+import pytest
+from conftest import ACP_ID, enlink_frame, ttn_line
+from etl.decoders.decoder import Decoder
+from etl.DBManager import DBManager
+from lib.writeBehind import WriteBehind
+
+SENSOR_PARAMETERS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "etl", "static", "sensor_parameters.json")
+START = datetime(2023, 3, 1).timestamp()
+TOPIC = "v3/app/devices/" + ACP_ID + "/up"
+
+
+def readings(n=300):
+    return [(START + i * 600, enlink_frame(temperature=20 + i % 40 / 10, humidity=40 + i % 20, co2_ppm=400 + i)) for i in range(n)]
+
+
+def test_close_writes_everything_in_batches():
+    batches = list()
+    write_behind = WriteBehind(batches.append, batch_size=10, flush_sec=60)
+    for i in range(25):
+        assert write_behind.put(i)
+    write_behind.close()
+    assert [item for batch in batches for item in batch] == list(range(25))
+    assert max(len(batch) for batch in batches) == 10
+    assert write_behind.stats() == {"queued": 25, "written": 25, "batches": len(batches), "dropped": 0, "failed": 0, "pending": 0}
+    #nothing is queued once closed
+    assert not write_behind.put(25)
+    assert write_behind.stats()["dropped"] == 1
+
+
+def test_full_batch_is_written_before_flush_sec():
+    written = threading.Event()
+    write_behind = WriteBehind(lambda batch: written.set(), batch_size=5, flush_sec=60)
+    for i in range(5):
+        write_behind.put(i)
+    assert written.wait(5)
+    write_behind.close()
+
+
+def test_full_queue_drops_instead_of_blocking():
+    batches = list()
+    write_behind = WriteBehind(batches.append, queue_size=5, batch_size=100, flush_sec=60)
+    assert [write_behind.put(i) for i in range(8)] == [True] * 5 + [False] * 3
+    write_behind.close()
+    assert [item for batch in batches for item in batch] == list(range(5))
+    assert write_behind.stats()["dropped"] == 3
+
+
+def test_failed_write_is_counted_and_the_next_ones_written():
+    batches = list()
+
+    def write(batch):
+        if (not batches):
+            batches.append(None)
+            raise OSError("disk full")
+        batches.append(batch)
+
+    write_behind = WriteBehind(write, batch_size=2, flush_sec=60)
+    for i in range(2):
+        write_behind.put(i)
+    write_behind.flush()
+    for i in range(2, 4):
+        write_behind.put(i)
+    write_behind.close()
+    assert batches == [None, [2, 3]]
+    assert write_behind.stats()["failed"] == 2 and write_behind.stats()["written"] == 2
+
+
+@pytest.mark.parametrize("store", ["file", "sql"])
+def test_stored_messages_read_back_after_close(store, archive_path, tmp_path):
+    #live messages stored through DBManager (written behind) read back as the day files of the same uplinks
+    archive_path(readings())
+    if (store == "file"):
+        db_cfg = {"db_type": "file", "fs_data_paths": [str(tmp_path / "store")], "fs_store_path": str(tmp_path / "store"), "fs_cache_path": None}
+    else:
+        db_cfg = {"db_type": "sql", "sql_path": str(tmp_path / "readings.sqlite")}
+    db_cfg.update(store_batch_size=50, store_flush_sec=60)
+    db_manager = DBManager(db_cfg, sensor_parameters_path=SENSOR_PARAMETERS_PATH)
+    for acp_ts, frame in readings():
+        line = ttn_line(acp_ts, frame)
+        db_manager.store(Decoder.transform(line, TOPIC), line)
+    db_manager.close()
+    assert db_manager.store_stats()["written"] == 300 and db_manager.store_stats()["pending"] == 0
+
+    query = {"acp_id": ACP_ID, "from": "01/03/2023", "to": "03/03/2023", "parameters": ["temperature", "humidity", "co2_ppm"]}
+    stored = DBManager(db_cfg, sensor_parameters_path=SENSOR_PARAMETERS_PATH)
+    archived = DBManager({"db_type": "file", "fs_data_paths": [archive_path.path], "fs_cache_path": None}, sensor_parameters_path=SENSOR_PARAMETERS_PATH)
+    stored_df, archived_df = stored.read(dict(query)), archived.read(dict(query))
+    stored.close()
+    assert len(stored_df) == len(archived_df) == 300
+    for name in ["acp_ts", "temperature", "humidity", "co2_ppm"]:
+        assert stored_df[name].astype(float).tolist() == pytest.approx(archived_df[name].astype(float).tolist())
+
+
+def test_write_behind_thread_started_by_the_first_store(tmp_path):
+    #a DBManager that only reads (e.g., the websocket ETL) starts no write-behind thread
+    def writers():
+        return [thread for thread in threading.enumerate() if thread.name == "write-behind"]
+
+    before = len(writers())
+    db_manager = DBManager({"db_type": "sql", "sql_path": str(tmp_path / "readings.sqlite")}, sensor_parameters_path=SENSOR_PARAMETERS_PATH)
+    assert db_manager.write_behind is None and db_manager.store_stats() is None and len(writers()) == before
+    line = ttn_line(START, enlink_frame(temperature=21))
+    db_manager.store(Decoder.transform(line, TOPIC), line)
+    db_manager.store(Decoder.transform(line, TOPIC), line)
+    assert len(writers()) == before + 1
+    db_manager.close()
+    assert db_manager.store_stats()["written"] == 2